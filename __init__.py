@@ -45,6 +45,8 @@ class Supernova_Paths(astrocats.Paths):
         # cached datafiles
         self.EXTINCT = os.path.join(
             self.CACHE, 'extinctions.json')
+        self.FETCH_VALIDATORS = os.path.join(
+            self.CACHE, 'fetch-validators.json')
 
     def get_repo_years(self):
         """Return an array of years based upon output repositories."""
@@ -0,0 +1,182 @@
+"""Run import tasks concurrently, level by level, into staging shards.
+
+Active tasks are grouped into *levels* of equal `priority`; each level is a
+barrier, i.e. no task of a level starts before every task of the previous
+level has been merged into the catalog.  Within a level, tasks marked
+``"parallel": true`` in `input/tasks.json` are executed concurrently, each
+one into its own staging shard (a shallow copy of the catalog with an empty
+`entries` dict).  Shards are then merged into `catalog.entries`, and the
+remaining (serial) tasks of the level are run, in the same order a serial run
+would have used, so the final catalog does not depend on thread timing.
+
+A task should only be marked parallel if it does not depend on data added by
+other tasks of its own level, and does not iterate over `catalog.entries`
+(e.g. `do_tns_photo`), since a shard only holds what its own task added.
+For the same reason, names are resolved against the aliases of the shard
+(and of the catalog as it was before the level) only.  An event added by
+two parallel tasks of a level under different names, which a serial run
+would have merged when the second task looked up the aliases of the first,
+is merged when the shards are merged instead: a shard entry is merged into
+the catalog entry that any of its aliases resolves to.
+
+The auxiliary lookup dicts that tasks write to (`SHARD_DICTS`) are deep
+copied into every shard, so threads never write to the same dict, and what
+each task added to them is merged back into the catalog with its entries.
+"""
+import copy
+import importlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+__all__ = ['task_levels', 'run_task_level']
+
+# Catalog lookup dicts that tasks may modify
+SHARD_DICTS = ['bibauthor_dict', 'biberror_dict', 'extinctions_dict',
+               'nedd_dict']
+
+
+def task_levels(tasks):
+    """Split an ordered dict of `Task` objects into lists of equal priority.
+
+    Inactive tasks are dropped; the order of `tasks` is preserved.  As in
+    a serial run, a `RuntimeError` is raised if a (positive) priority is
+    lower than that of the previous task.
+    """
+    levels = []
+    prev_task = None
+    for task_obj in tasks.values():
+        if not task_obj.active:
+            continue
+        if (prev_task is not None and
+                0 < task_obj.priority < prev_task.priority):
+            raise RuntimeError("Priority for '{}': '{}', less than prev,"
+                               "'{}': '{}'.\n{}".format(
+                                   task_obj.name, task_obj.priority,
+                                   prev_task.name, prev_task.priority,
+                                   task_obj))
+        prev_task = task_obj
+        if levels and levels[-1][0].priority == task_obj.priority:
+            levels[-1].append(task_obj)
+        else:
+            levels.append([task_obj])
+    return levels
+
+
+def _task_function(task_obj):
+    mod = importlib.import_module(task_obj.module)
+    return getattr(mod, task_obj.function)
+
+
+def _make_shard(catalog, task_obj):
+    """Create a staging copy of `catalog` that `task_obj` will fill."""
+    shard = copy.copy(catalog)
+    shard.entries = OrderedDict()
+    if hasattr(catalog, 'aliases'):
+        shard.aliases = {}
+    shard.shard_dicts = {}
+    for attr in SHARD_DICTS:
+        if hasattr(catalog, attr):
+            shard.shard_dicts[attr] = copy.deepcopy(getattr(catalog, attr))
+            setattr(shard, attr, copy.deepcopy(shard.shard_dicts[attr]))
+    shard.shard_parent = catalog
+    shard.current_task = task_obj
+    return shard
+
+
+def _run_in_shard(catalog, task_obj):
+    shard = _make_shard(catalog, task_obj)
+    _task_function(task_obj)(shard)
+    return shard
+
+
+def _merge_name(catalog, name, entry):
+    """Name under which the shard entry `entry` is merged into `catalog`.
+
+    The first of its name and aliases that is the name or an alias of a
+    catalog entry, as a serial run looking any of them up would have found;
+    its own name if none is.
+    """
+    for alias in [name] + entry.get_aliases():
+        found = catalog.get_name_for_entry_or_alias(alias)
+        if found is not None:
+            return found
+    return name
+
+
+def _merge_shard(catalog, shard):
+    """Copy every entry of `shard` into `catalog`, in insertion order.
+
+    The merged entries are journaled once the task is finished, as those of
+    a serial task.
+    """
+    for name, entry in shard.entries.items():
+        newname = catalog.add_entry(_merge_name(catalog, name, entry))
+        catalog.copy_entry_to_entry(entry, catalog.entries[newname])
+    shard.entries = OrderedDict()
+    for attr, base in shard.shard_dicts.items():
+        _merge_dict(getattr(catalog, attr), getattr(shard, attr), base)
+
+
+def _merge_dict(target, source, base):
+    """Apply to `target` what a task changed in `source` since `base`.
+
+    Lists the task only appended to have the new items appended to their
+    value in `target`; other new or changed values replace it.
+    """
+    for key, val in source.items():
+        old = base.get(key)
+        if old == val:
+            continue
+        if (isinstance(old, list) and isinstance(val, list) and
+                val[:len(old)] == old and isinstance(target.get(key), list)):
+            target[key].extend(val[len(old):])
+        else:
+            target[key] = val
+
+
+def _finish_task(catalog):
+    num_events, num_stubs = catalog.count()
+    catalog.log.warning("Task finished.  Events: {},  Stubs: {}".format(
+        num_events, num_stubs))
+    catalog.journal_entries()
+    num_events, num_stubs = catalog.count()
+    catalog.log.warning("Journal finished.  Events: {}, Stubs: {}".format(
+        num_events, num_stubs))
+
+
+def run_task_level(catalog, level, max_workers=4):
+    """Run all tasks of one priority `level` and merge their results.
+
+    Parallel tasks are only run concurrently if at least two of them are in
+    the level; a lone parallel task runs directly on the catalog.
+    """
+    parallel = [tt for tt in level if catalog.task_is_parallel(tt.name)]
+    if len(parallel) < 2 or max_workers < 2:
+        parallel = []
+
+    futures = OrderedDict()
+    if parallel:
+        catalog.log.warning("Running tasks concurrently: {}".format(
+            ', '.join(tt.name for tt in parallel)))
+        executor = ThreadPoolExecutor(
+            max_workers=min(max_workers, len(parallel)))
+        for task_obj in parallel:
+            futures[task_obj.name] = executor.submit(
+                _run_in_shard, catalog, task_obj)
+        executor.shutdown(wait=True)
+
+    for task_obj in level:
+        catalog.log.warning("Task: '{}'".format(task_obj.name))
+        catalog.log.debug("\t{}, {}, {}, {}".format(
+            task_obj.nice_name, task_obj.priority, task_obj.module,
+            task_obj.function))
+        catalog.current_task = task_obj
+        if task_obj.name in futures:
+            # Re-raises any exception that occurred in the task
+            shard = futures[task_obj.name].result()
+            _merge_shard(catalog, shard)
+        else:
+            _task_function(task_obj)(catalog)
+        _finish_task(catalog)
+
+    return
@@ -0,0 +1,129 @@
+"""Benchmark photometry deduplication on a `Supernova` entry.
+
+Adds `--num` synthetic points (one in twenty a duplicate of an earlier point,
+from a second source and telescope, which are not compared) to the photometry
+of a `Supernova` entry, once point by point with `add_photometry`, once as
+columns with `add_photometry_many`.  For comparison, `--pairwise` points are
+then added with the `add_photometry` of the astrocats entry class, which
+compares each new point to every stored one; its cost grows quadratically,
+so the run is capped and extrapolated.
+
+    python -m supernovae.scripts.benchdedup --num 100000 --pairwise 5000
+"""
+import argparse
+import logging
+import random
+import sys
+import time
+
+from astrocats.structures.struct import PHOTOMETRY
+
+from supernovae.supernova import Supernova
+
+COLUMNS = [PHOTOMETRY.TIME, PHOTOMETRY.U_TIME, PHOTOMETRY.BAND,
+           PHOTOMETRY.MAGNITUDE, PHOTOMETRY.E_MAGNITUDE,
+           PHOTOMETRY.TELESCOPE, PHOTOMETRY.SOURCE]
+
+
+class _Catalog(object):
+    """The parts of `SupernovaCatalog` read when filling a single entry."""
+
+    def __init__(self, log):
+        self.log = log
+        self.entries = {}
+        self.aliases = {}
+        self.source_syns = {}
+        self.url_redirs = {}
+        self.atels_dict = {}
+        self.cbets_dict = {}
+        self.iaucs_dict = {}
+
+
+def make_entry(catalog, name):
+    entry = Supernova(catalog, name)
+    sources = [entry.add_source(name='Benchmark {}'.format(ii))
+               for ii in (1, 2)]
+    return entry, sources
+
+
+def make_points(num, sources, seed=0):
+    rng = random.Random(seed)
+    points = []
+    for ii in range(num):
+        if ii % 20 == 19:
+            photo = dict(points[rng.randrange(len(points))])
+            photo[PHOTOMETRY.TELESCOPE] = 'Other'
+            photo[PHOTOMETRY.SOURCE] = sources[1]
+        else:
+            photo = {
+                PHOTOMETRY.TIME: '{:.3f}'.format(50000.0 + 0.01 * ii),
+                PHOTOMETRY.U_TIME: 'MJD',
+                PHOTOMETRY.BAND: rng.choice(['B', 'V', 'R', 'I']),
+                PHOTOMETRY.MAGNITUDE: '{:.2f}'.format(rng.uniform(14, 22)),
+                PHOTOMETRY.E_MAGNITUDE: '{:.2f}'.format(rng.uniform(0, 0.3)),
+                PHOTOMETRY.TELESCOPE: 'CCD',
+                PHOTOMETRY.SOURCE: sources[0]
+            }
+        points.append(photo)
+    return points
+
+
+def add_single(entry, points):
+    for photo in points:
+        entry.add_photometry(**photo)
+
+
+def add_columns(entry, points):
+    entry.add_photometry_many(
+        dict((key, [photo[key] for photo in points]) for key in COLUMNS))
+
+
+def add_pairwise(entry, points):
+    for photo in points:
+        super(Supernova, entry).add_photometry(**photo)
+
+
+def timed(catalog, func, num, seed):
+    entry, sources = make_entry(catalog, func.__name__)
+    points = make_points(num, sources, seed)
+    start = time.perf_counter()
+    func(entry, points)
+    secs = time.perf_counter() - start
+    kept = len(entry.get(entry._KEYS.PHOTOMETRY, []))
+    print('{:<13} {:>7} points -> {:>7} kept in {:8.3f} s'.format(
+        func.__name__ + ':', num, kept, secs))
+    return kept, secs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--num', type=int, default=100000)
+    parser.add_argument('--pairwise', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    catalog = _Catalog(logging.getLogger('benchdedup'))
+    kept, _ = timed(catalog, add_single, args.num, args.seed)
+    kept_many, _ = timed(catalog, add_columns, args.num, args.seed)
+    if kept_many != kept:
+        print('warning: add_photometry_many kept a different number of '
+              'points than add_photometry')
+        return 1
+
+    num_pw = min(args.pairwise, args.num)
+    if num_pw:
+        kept_pw, secs_pw = timed(catalog, add_pairwise, num_pw, args.seed)
+        kept_sub, _ = timed(catalog, add_single, num_pw, args.seed)
+        if kept_pw != kept_sub:
+            print('warning: the pairwise comparison kept a different number '
+                  'of points than the hash index')
+            return 1
+        if num_pw < args.num:
+            print('pairwise, extrapolated to {} points: ~{:.0f} s'.format(
+                args.num, secs_pw * (args.num / float(num_pw))**2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""Check the column conversion of counts to magnitudes against the scalar one.
+
+Random count rates, errors, zero points and upper-limit sigmas, written the
+way photometry files write them (any number of decimals, whole numbers,
+negative and empty values, some in scientific notation), are converted row
+by row with `set_pd_mag_from_counts` and all at once with
+`mags_from_counts`, and the photometry of every row is compared.  Rows that
+`set_pd_mag_from_counts` rejects with an exception are left out.
+Mismatches and the time taken by each are printed, and the exit status is
+non-zero if there are any mismatches.
+
+    python -m supernovae.scripts.checkcounts --rows 20000 --seed 0
+"""
+import argparse
+import random
+import sys
+import time
+
+from supernovae.utils import mags_from_counts, set_pd_mag_from_counts
+
+ZERO_POINTS = ['30', '27.5', 25.0, '31.4', 30.0]
+SIGMAS = [5.0, 3.0, '5', 2.5]
+# Mismatching rows printed
+MAX_PRINTED = 10
+
+
+def random_number(rng):
+    """A count rate or error written as it may be found in a file."""
+    if rng.random() < 0.05:
+        return ''
+    val = 10 ** rng.uniform(-3, 6)
+    if rng.random() < 0.1:
+        val = -val
+    text = '{:.{}f}'.format(val, rng.randint(0, 6))
+    if rng.random() < 0.05:
+        text = str(int(round(val)))
+    if rng.random() < 0.02:
+        text = '1e-05'
+    if rng.random() < 0.02:
+        text = '100'
+    return text
+
+
+def make_rows(num, seed):
+    rng = random.Random(seed)
+    return [(random_number(rng), random_number(rng) or '0.5',
+             rng.choice(['', random_number(rng)]),
+             rng.choice(['', random_number(rng)]),
+             rng.choice(ZERO_POINTS), rng.choice(SIGMAS))
+            for _ in range(num)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows, expected = [], []
+    for row in make_rows(args.rows, args.seed):
+        photodict = {}
+        try:
+            set_pd_mag_from_counts(photodict, row[0], ec=row[1], lec=row[2],
+                                   uec=row[3], zp=row[4], sig=row[5])
+        except Exception:
+            continue
+        rows.append(row)
+        expected.append(photodict)
+    secs_scalar = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columns = mags_from_counts(*zip(*rows)) if rows else {}
+    secs_columns = time.perf_counter() - start
+
+    mismatches = 0
+    for ri, (row, photodict) in enumerate(zip(rows, expected)):
+        got = dict((key, col[ri]) for key, col in columns.items()
+                   if col[ri] is not None)
+        if got != photodict:
+            mismatches += 1
+            if mismatches <= MAX_PRINTED:
+                print('{}\n  set_pd_mag_from_counts: {}\n  mags_from_counts: '
+                      '{}'.format(row, photodict, got))
+    print('{} rows, {} mismatches; set_pd_mag_from_counts {:.3f} s, '
+          'mags_from_counts {:.3f} s.'.format(
+              len(rows), mismatches, secs_scalar, secs_columns))
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Check the shared HTTP client against a local HTTP server.
+
+A throwaway server on ``127.0.0.1`` serves a page with an ``ETag``, a page
+that fails with ``503`` a few times before succeeding, a page that always
+fails, and a page that records when it is requested.  `FetchService` is
+checked to
+
+* send the validators of a cached page back and read it from disk on
+  ``304 Not Modified``;
+* retry transient failures, and fall back to the cached copy (not `ok`)
+  once its retries are exhausted;
+* space the requests to a rate-limited host by its interval, even when
+  they are issued concurrently by `fetch_many`;
+* keep a connection pool large enough for the concurrency of `fetch_many`.
+
+Failed checks are printed, and the exit status is non-zero if there are any.
+
+    python -m supernovae.scripts.checkfetch
+"""
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from supernovae.utils.fetch import FetchService
+
+ETAG = '"v1"'
+# Failures of the flaky page before it succeeds
+FLAKY_FAILURES = 2
+# Minimum interval between requests to the rate-limited host, in seconds
+INTERVAL = 0.2
+# Slack allowed on measured intervals, in seconds
+SLACK = 0.02
+
+
+class _Handler(BaseHTTPRequestHandler):
+    counts = {}
+    times = []
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for key, val in (headers or {}).items():
+            self.send_header(key, val)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        with self.lock:
+            count = self.counts[self.path] = self.counts.get(self.path, 0) + 1
+            if self.path.startswith('/timed'):
+                self.times.append(time.time())
+        if self.path == '/etag':
+            if self.headers.get('If-None-Match') == ETAG:
+                self._send(304, headers={'ETag': ETAG})
+            else:
+                self._send(200, b'etag page', {'ETag': ETAG})
+        elif self.path == '/flaky':
+            if count <= FLAKY_FAILURES:
+                self._send(503, headers={'Retry-After': '0'})
+            else:
+                self._send(200, b'flaky page')
+        elif self.path == '/down':
+            self._send(503, headers={'Retry-After': '0'})
+        elif self.path.startswith('/timed'):
+            self._send(200, self.path.encode('utf-8'))
+        else:
+            self._send(404)
+
+
+def _check(failures, ok, message):
+    print('{}: {}'.format('ok' if ok else 'FAILED', message))
+    if not ok:
+        failures.append(message)
+
+
+def main():
+    logging.basicConfig(level=logging.ERROR)
+    log = logging.getLogger('checkfetch')
+    server = HTTPServer(('127.0.0.1', 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host = '127.0.0.1:{}'.format(server.server_port)
+    base = 'http://' + host
+    tmpdir = tempfile.mkdtemp()
+    failures = []
+    try:
+        validators = os.path.join(tmpdir, 'validators.json')
+        fetcher = FetchService(log, max_workers=2, retries=3, backoff=0.01,
+                               host_intervals={}, validators_path=validators,
+                               root=tmpdir)
+        path = os.path.join(tmpdir, 'etag.html')
+        first = fetcher.fetch(base + '/etag', path)
+        _check(failures, os.path.isfile(validators),
+               'validators are saved right after a fetch')
+        second = FetchService(log, validators_path=validators,
+                              root=tmpdir).fetch(base + '/etag', path)
+        _check(failures, first.status == 200 and first.modified and first.ok,
+               'first fetch downloads the page')
+        _check(failures, second.status == 304 and not second.modified and
+               second.ok and second.text == 'etag page',
+               'refetch with stored validators is read from the cache')
+
+        flaky = fetcher.fetch(base + '/flaky', os.path.join(tmpdir, 'flaky'))
+        _check(failures, flaky.status == 200 and
+               _Handler.counts['/flaky'] == FLAKY_FAILURES + 1,
+               'transient failures are retried')
+
+        down_path = os.path.join(tmpdir, 'down')
+        with open(down_path, 'w') as ff:
+            ff.write('cached copy')
+        down = fetcher.fetch(base + '/down', down_path)
+        _check(failures, not down.ok and down.text == 'cached copy' and
+               _Handler.counts['/down'] == fetcher.retries + 1,
+               'exhausted retries fall back to the cached copy')
+
+        limited = FetchService(log, max_workers=2,
+                               host_intervals={host: INTERVAL})
+        urls = [base + '/timed{}'.format(ii) for ii in range(5)]
+        results = limited.fetch_many(
+            urls, [os.path.join(tmpdir, 'timed{}'.format(ii))
+                   for ii in range(5)], max_workers=5)
+        times = sorted(_Handler.times)
+        gaps = [bb - aa for aa, bb in zip(times, times[1:])]
+        _check(failures, all(rr.status == 200 for rr in results) and
+               len(gaps) == 4 and min(gaps) >= INTERVAL - SLACK,
+               'requests to a rate-limited host are spaced by {} s (gaps '
+               '{})'.format(INTERVAL, ', '.join(
+                   '{:.3f}'.format(gg) for gg in gaps)))
+        adapter = limited.session(base)[0].get_adapter(base)
+        _check(failures, adapter._pool_maxsize >= 5,
+               'connection pools grow to the concurrency of fetch_many')
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmpdir)
+    print('{} checks failed.'.format(len(failures)))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Check the shared HTML table extractor against BeautifulSoup.
+
+Every cached page is read both with `extract_rows` and with BeautifulSoup's
+html5lib tree (the way the import tasks used to), and the cells of every row
+are compared: number of ``td`` cells, ``td.text``, the ``href`` of the first
+link and the text of the direct children.  Mismatches are printed, and the
+exit status is non-zero if there are any.
+
+    python -m supernovae.scripts.checktables --repo input/sne-external
+    python -m supernovae.scripts.checktables page01.html page02.html
+"""
+import argparse
+import os
+import sys
+from glob import glob
+
+from bs4 import BeautifulSoup, Tag
+
+from supernovae.utils import extract_rows, fix_html
+
+# Cached pages read by the import tasks, relative to their task repository
+DEFAULT_PATTERNS = [
+    'ASASSN/sn_list.html',
+    'CRTS/*.html',
+    'DES/transients.html',
+    'rochester/*',
+    '3pi/page*.html',
+    '3pi/candidate-*.html'
+]
+
+
+def soup_rows(html):
+    rows = []
+    for tr in BeautifulSoup(fix_html(html), 'html5lib').findAll('tr'):
+        cells = []
+        for td in tr.findAll('td'):
+            link = td.find('a')
+            cells.append((td.text, link.get('href') if link else None,
+                          [xx.text if isinstance(xx, Tag) else str(xx)
+                           for xx in td.contents]))
+        rows.append(cells)
+    return rows
+
+
+def compare(path, verbose=False):
+    """Return the number of mismatched rows of the page at `path`."""
+    with open(path, 'r', errors='replace') as ff:
+        html = ff.read()
+    expected = soup_rows(html)
+    rows = [[(cell.text, cell.href, cell.parts) for cell in row]
+            for row in extract_rows(html)]
+    if len(rows) != len(expected):
+        print('{}: {} rows, expected {}'.format(path, len(rows),
+                                                len(expected)))
+        return max(len(rows), len(expected))
+    bad = 0
+    for ri, (row, exp) in enumerate(zip(rows, expected)):
+        if row == exp:
+            continue
+        bad += 1
+        if verbose or bad == 1:
+            print('{}: row {} differs'.format(path, ri))
+            print('    extractor: {!r}'.format(row))
+            print('    soup:      {!r}'.format(exp))
+    return bad
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='*')
+    parser.add_argument('--repo', default=os.path.join('input',
+                                                       'sne-external'))
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(
+        path for pattern in DEFAULT_PATTERNS
+        for path in glob(os.path.join(args.repo, pattern))
+        if path.endswith('.html') or '.' not in os.path.basename(path))
+    if not paths:
+        print('No cached pages found.')
+        return 1
+    total = 0
+    for path in paths:
+        total += compare(path, args.verbose)
+    print('{} pages checked, {} mismatched rows.'.format(len(paths), total))
+    return 1 if total else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,11 +11,25 @@ from astropy.time import Time as astrotime
 from six import string_types
 
 from .constants import MAX_VISUAL_BANDS
-from .utils import frame_priority, host_clean, radec_clean
+from .utils import frame_priority, host_clean, photometry_key, radec_clean
 
 import pyastroschema as pas
 
 
+def _is_scalar(value):
+    return isinstance(value, string_types) or not hasattr(value, '__len__')
+
+
+def _is_missing(value):
+    return value is None or value is np.ma.masked or (
+        isinstance(value, string_types) and not value)
+
+
+def _to_native(value):
+    """Convert NumPy scalars to the equivalent Python objects."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
 # @struct.set_struct_schema("astroschema_entry", extensions=["astrocats_entry"])
 @struct.set_struct_schema("entry")
 # class Supernova(struct.Entry):
@@ -35,6 +49,18 @@ class Supernova(struct.Entry_New_Adder):
         super(Supernova, self).__init__(catalog, name, stub=stub)
         return
 
+    @classmethod
+    def init_from_file(cls, catalog, name=None, **kwargs):
+        """Construct a new `Supernova` from a file on disk.
+
+        Waits for any background write of `name` still held by the catalog's
+        journal writer, so that a just-journaled entry is never read stale.
+        """
+        if name is not None and hasattr(catalog, 'journal_writer'):
+            catalog.journal_writer.wait(name)
+        return super(Supernova, cls).init_from_file(
+            catalog, name=name, **kwargs)
+
     def _append_additional_tags(self, name, sources, quantity):
         """Append additional bits of data to an existing quantity when a newly
         added quantity is found to be a duplicate
@@ -350,6 +376,135 @@ class Supernova(struct.Entry_New_Adder):
 
         return super(Supernova, self).add_source(**kwargs)
 
+    def _photometry_index(self):
+        """Return the dict of photometry key -> index in `photometry`.
+
+        The index is rebuilt whenever the photometry list was replaced or
+        changed length behind its back (e.g. by a merge); `sanitize`, which
+        sorts the list in place, drops it explicitly.
+        """
+        photometry = self.get(self._KEYS.PHOTOMETRY, [])
+        # Hold on to the list itself: the `id` of a freed list can be reused
+        state = getattr(self, '_phot_index_state', None)
+        if (state is None or state[0] is not photometry or
+                state[1] != len(photometry)):
+            self._phot_index = {}
+            for pi, photo in enumerate(photometry):
+                self._phot_index.setdefault(photometry_key(photo), pi)
+            self._phot_index_state = (photometry, len(photometry))
+        return self._phot_index
+
+    def _add_indexed_photometry(self, index, photodict, compare_to_existing):
+        """Add one point, using `index` to look for a duplicate of it.
+
+        Returns whether a new point was appended.
+        """
+        photometry = self.get(self._KEYS.PHOTOMETRY, [])
+        nphot = len(photometry)
+        super(Supernova, self).add_photometry(
+            compare_to_existing=False, **photodict)
+        photometry = self.get(self._KEYS.PHOTOMETRY, [])
+        if len(photometry) == nphot:
+            # Rejected by validation, reason logged by `add_photometry`
+            return False
+        pkey = photometry_key(photometry[-1])
+        if compare_to_existing and pkey in index:
+            dupe = photometry.pop()
+            photo = photometry[index[pkey]]
+            photo[PHOTOMETRY.SOURCE] = utils.uniq_cdl(
+                photo[PHOTOMETRY.SOURCE].split(',') +
+                dupe[PHOTOMETRY.SOURCE].split(','))
+            added = False
+        else:
+            index[pkey] = len(photometry) - 1
+            added = True
+        self._phot_index_state = (photometry, len(photometry))
+        return added
+
+    def add_photometry(self, compare_to_existing=True, **kwargs):
+        """Add a photometry point unless it duplicates an existing one.
+
+        Duplicates (see `utils.photometry_key`) are found with a hash index
+        of the entry's photometry; the source of a duplicate is merged into
+        the existing point.
+        """
+        self._add_indexed_photometry(
+            self._photometry_index(), kwargs, compare_to_existing)
+        return
+
+    def add_photometry_many(self, columns, source=None,
+                            compare_to_existing=True):
+        """Add a batch of photometry given as columns.
+
+        `columns` maps photometry keys to equal-length sequences; scalar
+        values (and `source`, if given) apply to every point.  `None`, empty
+        and masked values are left out of the point they belong to.  Column
+        lengths and sources are checked once for the whole batch, and
+        duplicates are found with a hash index instead of comparing each new
+        point to every existing one.  Points without a known source are not
+        added, and logged, as `add_photometry` does.  Each point is still
+        built and validated by `add_photometry` of the astrocats entry class,
+        one at a time: this saves the pairwise comparison, not the per-point
+        validation.  Returns the number of points added.
+        """
+        columns = OrderedDict(columns)
+        if source is not None:
+            columns[PHOTOMETRY.SOURCE] = source
+        lengths = set(len(col) for col in columns.values()
+                      if not _is_scalar(col))
+        if len(lengths) > 1:
+            raise ValueError("Photometry columns have different lengths: "
+                             "{}".format(sorted(lengths)))
+        num = lengths.pop() if lengths else 1
+        if not num:
+            return 0
+
+        sources = columns.get(PHOTOMETRY.SOURCE)
+        if sources is None or (_is_scalar(sources) and not sources):
+            self._log.info("'{}' Not adding '{}': no source given.".format(
+                self[self._KEYS.NAME], self._KEYS.PHOTOMETRY))
+            return 0
+        known = set(src[SOURCE.ALIAS]
+                    for src in self.get(self._KEYS.SOURCES, []))
+        unknown = set()
+        for aliases in set([sources] if _is_scalar(sources) else sources):
+            missing = [alias for alias in str(aliases).split(',')
+                       if alias not in known]
+            if missing:
+                self._log.info("'{}' Not adding '{}': unknown source(s) "
+                               "{}.".format(self[self._KEYS.NAME],
+                                            self._KEYS.PHOTOMETRY, missing))
+                unknown.add(aliases)
+        if _is_scalar(sources) and sources in unknown:
+            return 0
+
+        scalars = {}
+        vectors = OrderedDict()
+        for key, col in columns.items():
+            if _is_scalar(col):
+                if not _is_missing(col):
+                    scalars[key] = _to_native(col)
+            else:
+                if isinstance(col, np.ma.MaskedArray):
+                    col = np.ma.filled(col.astype(object), None)
+                vectors[key] = [None if _is_missing(val) else _to_native(val)
+                                for val in col]
+
+        index = self._photometry_index()
+        added = 0
+        for pi in range(num):
+            if not _is_scalar(sources) and sources[pi] in unknown:
+                continue
+            photodict = dict(scalars)
+            for key, vals in vectors.items():
+                if vals[pi] is not None:
+                    photodict[key] = vals[pi]
+            if self._add_indexed_photometry(
+                    index, photodict, compare_to_existing):
+                added += 1
+
+        return added
+
     def priority_prefixes(self):
         """Prefixes to given priority to when merging duplicate entries.
         """
@@ -404,6 +559,8 @@ class Supernova(struct.Entry_New_Adder):
 
     def sanitize(self):
         super(Supernova, self).sanitize()
+        # Photometry was sorted in place, the positions in the index are stale
+        self._phot_index_state = None
         log = self._log
 
         # Calculate some columns based on imported data, sanitize some fields
@@ -1,17 +1,21 @@
 """Supernovae specific catalog class."""
 import codecs
 import json
+import os
+import warnings
 from collections import OrderedDict
 from datetime import datetime
 
-from astrocats.structures.catalog import Catalog
+import psutil
+from astrocats.structures.catalog import Catalog, Task
 from astrocats.structures.struct import QUANTITY
 from astrocats.utils import read_json_arr, read_json_dict
 
 from supernovae import PATHS as _PATHS
 
+from .scheduler import run_task_level, task_levels
 from .supernova import SUPERNOVA, Supernova
-from .utils import name_clean
+from .utils import FetchResult, FetchService, JournalWriter, name_clean
 
 
 class SupernovaCatalog(Catalog):
@@ -22,14 +26,320 @@ class SupernovaCatalog(Catalog):
 
     RAISE_ERROR_ON_ADDITION_FAILURE = False
 
+    # Background journaling: number of writer threads, and how many finished
+    # entries may wait to be written before `journal_entries` blocks.
+    JOURNAL_WORKERS = 4
+    JOURNAL_MAX_PENDING = 64
+
+    # Task scheduling: how many `parallel` tasks of one priority level may run
+    # at once, and the default size of a task's own worker pools (overridden
+    # per task with the `concurrency` key in `input/tasks.json`).  Tasks that
+    # support it only report what they would query when `dry_run` is set.
+    MAX_PARALLEL_TASKS = 4
+    DEFAULT_TASK_CONCURRENCY = 4
+    TASK_OPTIONS = ['parallel', 'concurrency', 'dry_run', 'full_resync']
+
+    # Minimum number of seconds between two requests to the same host
+    FETCH_HOST_INTERVALS = {
+        'wis-tns.weizmann.ac.il': 1.0,
+    }
+    FETCH_RETRIES = 3
+
+    # Set on staging shards created by the task scheduler
+    shard_parent = None
+
     def __init__(self, args, log):
         """Initialize catalog."""
         # Initialize super `astrocats.structures.catalog.Catalog` object
         super(SupernovaCatalog, self).__init__(args, log)
         self.proto = Supernova
+        self.journal_writer = JournalWriter(
+            log, num_workers=self.JOURNAL_WORKERS,
+            max_pending=self.JOURNAL_MAX_PENDING,
+            compress_above=self.COMPRESS_ABOVE_FILESIZE)
+        self._journal_task = None
+        self.fetcher = FetchService(
+            log, max_workers=self.DEFAULT_TASK_CONCURRENCY,
+            retries=self.FETCH_RETRIES,
+            host_intervals=self.FETCH_HOST_INTERVALS,
+            validators_path=self.PATHS.FETCH_VALIDATORS,
+            root=self.PATHS.BASE)
+        self.task_options = {}
         self._load_aux_data()
         return
 
+    def import_data(self):
+        """Run all of the import tasks.
+
+        Tasks are run one priority level at a time (see `scheduler`); tasks
+        flagged `parallel` within a level run concurrently into staging
+        shards that are merged in the order of a serial run.  Raises a
+        `RuntimeError` if the tasks are not ordered by priority.
+        """
+        tasks_list = self.load_task_list()
+        # Connection pools large enough for the most concurrent task
+        self.fetcher.reserve(max(
+            [self.DEFAULT_TASK_CONCURRENCY] +
+            [int(opts['concurrency']) for opts in self.task_options.values()
+             if 'concurrency' in opts]))
+        warnings.filterwarnings(
+            'ignore', r'Warning: converting a masked element to nan.')
+        warnings.filterwarnings('ignore', category=DeprecationWarning)
+
+        # Delete all old (previously constructed) output files
+        if self.args.delete_old:
+            self.log.warning("Deleting all old entry files.")
+            self.delete_old_entry_files()
+
+        # In update mode, load all entry stubs.
+        if self.args.load_stubs or self.args.update:
+            self.load_stubs()
+
+        if self.args.travis:
+            self.log.warning("Running in `travis` mode.")
+
+        try:
+            for level in task_levels(tasks_list):
+                run_task_level(
+                    self, level, max_workers=self.MAX_PARALLEL_TASKS)
+        finally:
+            self.journal_writer.close()
+            self.fetcher.close()
+
+        process = psutil.Process(os.getpid())
+        memory = process.memory_info().rss
+        self.log.warning('Memory used (MBs): '
+                         '{:,}'.format(memory / 1024. / 1024.))
+        return
+
+    def _load_task_list_from_file(self):
+        """Load `Task` objects from the task-list file.
+
+        Scheduling options (`TASK_OPTIONS`) are not `Task` attributes; they
+        are split off into `task_options`, keyed by task name.
+        """
+        self.log.debug(
+            "Loading task-list from '{}'".format(self.PATHS.TASK_LIST))
+        with codecs.open(self.PATHS.TASK_LIST, 'r') as ff:
+            data = json.load(ff)
+        tasks = {}
+        task_names = []
+        self.task_options = {}
+        for key, val in data.items():
+            self.task_options[key] = {
+                opt: val.pop(opt) for opt in self.TASK_OPTIONS if opt in val}
+            tasks[key] = Task(name=key, **val)
+            task_names.append(key)
+        return tasks, task_names
+
+    def task_is_parallel(self, task_name):
+        """Whether the task may run concurrently within its priority level."""
+        return bool(self.task_options.get(task_name, {}).get('parallel'))
+
+    def get_current_task_option(self, option, default=None):
+        """Value of scheduling option `option` of the current task."""
+        task = getattr(self, 'current_task', None)
+        if task is None:
+            return default
+        return self.task_options.get(task.name, {}).get(option, default)
+
+    def get_current_task_concurrency(self):
+        """Number of workers the current task may use for its own pools."""
+        return int(self.get_current_task_option(
+            'concurrency', self.DEFAULT_TASK_CONCURRENCY))
+
+    def add_entry(self, name, load=True, delete=True):
+        """Find an existing entry in, or add a new one to, `entries`.
+
+        In a staging shard entry files are never loaded; a name already known
+        to the parent catalog is adopted so the shard merges onto that entry.
+        """
+        if self.shard_parent is not None:
+            load = False
+            known = self.shard_parent.get_name_for_entry_or_alias(
+                self.clean_entry_name(name))
+            if known is not None:
+                name = known
+        return super(SupernovaCatalog, self).add_entry(
+            name, load=load, delete=delete)
+
+    def get_name_for_entry_or_alias(self, name):
+        """Return the entry name matching `name` or one of its aliases.
+
+        Staging shards also consult their parent catalog (read-only).
+        """
+        found = super(SupernovaCatalog, self).get_name_for_entry_or_alias(name)
+        if found is None and self.shard_parent is not None:
+            found = self.shard_parent.get_name_for_entry_or_alias(name)
+        return found
+
+    def load_url(self, url, fname, repo=None, timeout=120, post=None,
+                 fail=False, write=True, json_sort=None, cache_only=False,
+                 archived_mode=None, archived_task=None, update_mode=None,
+                 verify=False):
+        """Load the given URL, or a cached version of it.
+
+        Same modes and arguments as `Catalog.load_url`, but the download goes
+        through `fetcher`: connections to a host are reused, requests are
+        rate limited and retried, and they are conditional on the validators
+        saved with the cached file, so an unchanged page is not transferred.
+        """
+        if archived_mode is None:
+            archived_mode = self.args.archived
+        if archived_task is None:
+            archived_task = self.current_task.archived
+        if update_mode is None:
+            update_mode = self.args.update
+        if repo is None:
+            repo = self.get_current_task_repo()
+        cached_path = os.path.join(repo, fname)
+
+        # In `archived` mode and task - try to return the cached page
+        if archived_mode or (archived_task and not update_mode):
+            if os.path.isfile(cached_path):
+                with codecs.open(cached_path, 'r', encoding='utf8') as ff:
+                    return ff.read()
+            if cache_only:
+                return None
+            self.log.error("Task {}: Cached file '{}' does not exist.".format(
+                self.current_task.name, cached_path))
+
+        result = self.fetcher.fetch(
+            url, cached_path, timeout=timeout, post=post, verify=verify,
+            write=(write and json_sort is None))
+
+        if result.text is None:
+            err_str = "Both url and file retrieval failed!"
+            if fail:
+                err_str += " `fail` set."
+                self.log.error(err_str)
+                raise RuntimeError(err_str)
+            self.log.warning(err_str)
+            return None
+
+        if not result.ok:
+            if update_mode:
+                self.log.error(
+                    "Cannot check for updates, url download failed.")
+                return None
+            self.log.warning("URL download failed, using cached data.")
+            return result.text
+
+        if write and json_sort is not None and result.modified:
+            self._write_cache_file(result.text, cached_path,
+                                   json_sort=json_sort)
+
+        if update_mode and not result.modified:
+            self.log.info("Skipping file '{}', no changes.".format(
+                cached_path))
+            return None
+
+        return result.text
+
+    def fetch_many(self, urls, paths, repo=None, archived_mode=None,
+                   timeout=120, verify=False):
+        """Fetch several URLs concurrently into cached files.
+
+        `paths` are relative to `repo` (the current task's repository by
+        default).  In archived mode, files already cached are not requested.
+        At most `get_current_task_concurrency()` requests run at once.
+
+        Returns a list of `FetchResult`, in the order of `urls`.
+        """
+        if archived_mode is None:
+            archived_mode = (self.args.archived or (
+                self.current_task.archived and not self.args.update))
+        if repo is None:
+            repo = self.get_current_task_repo()
+        paths = [os.path.join(repo, pp) for pp in paths]
+
+        results = [None] * len(urls)
+        todo = []
+        for ii, (url, path) in enumerate(zip(urls, paths)):
+            if archived_mode and os.path.isfile(path):
+                with codecs.open(path, 'r', encoding='utf8') as ff:
+                    results[ii] = FetchResult(url, path, ff.read(), None,
+                                              False, True)
+            else:
+                todo.append(ii)
+
+        fetched = self.fetcher.fetch_many(
+            [urls[ii] for ii in todo], [paths[ii] for ii in todo],
+            max_workers=self.get_current_task_concurrency(),
+            timeout=timeout, verify=verify)
+        for ii, result in zip(todo, fetched):
+            results[ii] = result
+        return results
+
+    def download_url(self, url, timeout, fail=False, post=None, verify=True):
+        """Download text from the given url through the pooled `fetcher`.
+
+        Returns `None` on failure, or raises `RuntimeError` if `fail`.
+        """
+        try:
+            url_txt = self.fetcher.download(
+                url, timeout=timeout, post=post, verify=verify)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except Exception as err:
+            err_str = ("URL Download of '{}' failed ('{}')."
+                       .format(url, str(err)))
+            if fail:
+                err_str += " and `fail` is set."
+                self.log.error(err_str)
+                raise RuntimeError(err_str)
+            self.log.warning(err_str)
+            return None
+        return url_txt
+
+    def journal_entries(self, clear=True, gz=False, bury=False,
+                        write_stubs=False, final=False):
+        """Write all entries in `entries` to files, and clear.
+
+        Behaves like `Catalog.journal_entries`, but serialization, compression
+        and the file writes are handed to `journal_writer` so that the caller
+        can move on to the next entry.  Entries that are not cleared remain
+        live and are therefore written synchronously.  Writes queued by a
+        previous task are flushed before the first journal of a new task.
+
+        Staging shards keep their entries in memory until they are merged.
+        """
+        if self.shard_parent is not None:
+            return
+
+        task = getattr(self, 'current_task', None)
+        if task is not self._journal_task:
+            self.journal_writer.flush()
+            self._journal_task = task
+
+        for name in list(self.entries.keys()):
+            if self.args.write_entries:
+                # If this is a stub and we aren't writing stubs, skip
+                if self.entries[name]._stub and not write_stubs:
+                    continue
+
+                bury_entry = False
+                save_entry = True
+                if bury:
+                    (bury_entry, save_entry) = self.should_bury(name)
+
+                if save_entry:
+                    entry = self.entries[name]
+                    if final:
+                        entry.sanitize()
+                    outdir, filename = entry._get_save_path(bury=bury_entry)
+                    self.journal_writer.submit(
+                        name, entry, outdir, filename, gz=gz)
+                    if not clear:
+                        self.journal_writer.wait(name)
+
+            if clear:
+                self.entries[name] = self.entries[name].get_stub()
+                self.log.debug(
+                    "Entry for '{}' converted to stub".format(name))
+
+        return
+
     def should_bury(self, name):
         """Determine whether an entry should be "buried".
 
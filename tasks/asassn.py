@@ -7,9 +7,13 @@ from decimal import Decimal
 from astrocats.structures.struct import PHOTOMETRY
 from astrocats.utils import jd_to_mjd, pbar
 from astropy.io.ascii import read
-from bs4 import BeautifulSoup
 
 from ..supernova import SUPERNOVA
+from ..utils import atomic_write, extract_tables, iter_json_array
+
+ATEL_PATH = '/root/better-atel/atels.json.gz'
+# Keys that may hold the number of an ATel record
+ATEL_NUMBER_KEYS = ('num', 'number', 'id')
 
 
 def do_asassn(catalog):
@@ -20,9 +24,8 @@ def do_asassn(catalog):
         catalog.get_current_task_repo(), 'ASASSN/sn_list.html'))
     if not html:
         return
-    bs = BeautifulSoup(html, 'html5lib')
-    trs = bs.find('table').findAll('tr')
-    for tri, tr in enumerate(pbar(trs, task_str)):
+    rows = extract_tables(html)[0]
+    for tri, tds in enumerate(pbar(rows, task_str)):
         name = None
         ra = None
         dec = None
@@ -34,17 +37,12 @@ def do_asassn(catalog):
         typelink = None
         if tri == 0:
             continue
-        tds = tr.findAll('td')
         if not len(tds):
             continue
         for tdi, td in enumerate(tds):
             if tdi == 1:
                 name = catalog.add_entry(td.text.strip())
-                atellink = td.find('a')
-                if atellink:
-                    atellink = atellink['href']
-                else:
-                    atellink = None
+                atellink = td.href
             if tdi == 2:
                 discdate = td.text.replace('-', '/')
             if tdi == 3:
@@ -57,11 +55,7 @@ def do_asassn(catalog):
                 hostoff = td.text
             if tdi == 9:
                 claimedtype = td.text
-                typelink = td.find('a')
-                if typelink:
-                    typelink = typelink['href']
-                else:
-                    typelink = None
+                typelink = td.href
             if tdi == 12:
                 host = td.text
 
@@ -100,52 +94,112 @@ def do_asassn(catalog):
     return
 
 
+def _atel_number(atel):
+    """Number of an ATel record, or `None` if it has none."""
+    for key in ATEL_NUMBER_KEYS:
+        num = atel.get(key)
+        if isinstance(num, int) or (isinstance(num, str) and num.isdigit()):
+            return int(num)
+    return None
+
+
+def _atel_light_curve(atel):
+    """Return the (object name, light-curve URL) exposed in an ATel, if any."""
+    if not ('asas-sn.osu.edu/light_curve' in atel['body'] and
+            'Supernovae' in atel['subjects']):
+        return None
+    matches = re.findall(r'<a\s+[^>]*?href="([^"]*)".*?>(.*?)<\/a>',
+                         atel['body'], re.DOTALL)
+    lcurl = ''
+    objname = ''
+    for match in matches:
+        if 'asas-sn.osu.edu/light_curve' in match[0]:
+            lcurl = match[0]
+            objname = re.findall(r'\bASASSN-[0-9][0-9].*?\b', match[1])
+            if len(objname):
+                objname = objname[0]
+    if objname and lcurl:
+        return objname, lcurl
+    return None
+
+
 def do_asas_atels(catalog):
-    """Import LCs exposed in ASASSN Atels."""
-    import gzip
+    """Import LCs exposed in ASASSN Atels.
 
+    The ATel archive is streamed, one ATel at a time.  `ASASSN/atel-state.json`
+    keeps the number of the last ATel scanned (the watermark) and the light
+    curves found so far, so that only newer ATels are scanned; the light
+    curves already found are only added again outside of update mode, from
+    their cached CSV files.  Light curves are downloaded concurrently.
+    """
+    state_path = os.path.join(catalog.get_current_task_repo(), 'ASASSN',
+                              'atel-state.json')
+    state = {'last_atel': 0, 'light_curves': []}
+    if os.path.isfile(state_path):
+        with open(state_path, 'r') as f:
+            state.update(json.load(f))
+    known = [tuple(lc) for lc in state['light_curves']]
+
+    new = []
+    last_atel = state['last_atel']
     try:
-        with gzip.open('/root/better-atel/atels.json.gz', 'rb') as f:
-            ateljson = json.load(f)
+        for atel in iter_json_array(ATEL_PATH):
+            num = _atel_number(atel)
+            if num is not None and num <= state['last_atel']:
+                continue
+            if num is not None:
+                last_atel = max(last_atel, num)
+            found = _atel_light_curve(atel)
+            if found and found not in known and found not in new:
+                new.append(found)
     except Exception:
         print('ATel data unavailable, skipping ASAS ATel task.')
         return
+    catalog.log.info('{} new ASAS-SN light curves in ATels after #{}.'.format(
+        len(new), state['last_atel']))
+
+    light_curves = new if catalog.args.update else known + new
+    paths = [os.path.join('ASASSN', objname + '.csv')
+             for objname, lcurl in light_curves]
+    fetch = [ii for ii, lc in enumerate(light_curves) if lc in new or
+             not os.path.isfile(os.path.join(
+                 catalog.get_current_task_repo(), paths[ii]))]
+    fetched = dict(zip(fetch, catalog.fetch_many(
+        [light_curves[ii][1] + '.csv' for ii in fetch],
+        [paths[ii] for ii in fetch])))
+
+    for ii, (objname, lcurl) in enumerate(light_curves):
+        if ii in fetched:
+            csv = fetched[ii].text
+        else:
+            with open(os.path.join(catalog.get_current_task_repo(),
+                                   paths[ii]), 'r') as f:
+                csv = f.read()
+        if not csv:
+            continue
+        name, source = catalog.new_entry(
+            objname, name='ASAS-SN Sky Patrol',
+            bibcode='2017arXiv170607060K', url='https://asas-sn.osu.edu')
+        data = read(csv, format='csv')
+        for row in data:
+            mag = str(row['mag'])
+            if float(mag.strip('>')) > 50.0:
+                continue
+            photodict = {
+                PHOTOMETRY.TIME: str(jd_to_mjd(Decimal(str(row['HJD'])))),
+                PHOTOMETRY.MAGNITUDE: mag.strip('>'),
+                PHOTOMETRY.SURVEY: 'ASASSN',
+                PHOTOMETRY.SOURCE: source
+            }
+            if '>' in mag:
+                photodict[PHOTOMETRY.UPPER_LIMIT] = True
+            else:
+                photodict[PHOTOMETRY.E_MAGNITUDE] = str(row['mag_err'])
+            catalog.entries[name].add_photometry(**photodict)
 
-    for entry in ateljson:
-        if ('asas-sn.osu.edu/light_curve' in entry['body'] and
-                'Supernovae' in entry['subjects']):
-            matches = re.findall(r'<a\s+[^>]*?href="([^"]*)".*?>(.*?)<\/a>',
-                                 entry['body'], re.DOTALL)
-            lcurl = ''
-            objname = ''
-            for match in matches:
-                if 'asas-sn.osu.edu/light_curve' in match[0]:
-                    lcurl = match[0]
-                    objname = re.findall(r'\bASASSN-[0-9][0-9].*?\b', match[1])
-                    if len(objname):
-                        objname = objname[0]
-            if objname and lcurl:
-                name, source = catalog.new_entry(
-                    objname, name='ASAS-SN Sky Patrol',
-                    bibcode='2017arXiv170607060K', url='https://asas-sn.osu.edu')
-                csv = catalog.load_url(lcurl + '.csv', os.path.join(
-                    catalog.get_current_task_repo(), os.path.join(
-                        'ASASSN', objname + '.csv')))
-                data = read(csv, format='csv')
-                for row in data:
-                    mag = str(row['mag'])
-                    if float(mag.strip('>')) > 50.0:
-                        continue
-                    photodict = {
-                        PHOTOMETRY.TIME: str(jd_to_mjd(Decimal(str(row['HJD'])))),
-                        PHOTOMETRY.MAGNITUDE: mag.strip('>'),
-                        PHOTOMETRY.SURVEY: 'ASASSN',
-                        PHOTOMETRY.SOURCE: source
-                    }
-                    if '>' in mag:
-                        photodict[PHOTOMETRY.UPPER_LIMIT] = True
-                    else:
-                        photodict[PHOTOMETRY.E_MAGNITUDE] = str(row['mag_err'])
-                    catalog.entries[name].add_photometry(**photodict)
+    state['last_atel'] = last_atel
+    state['light_curves'] = [list(lc) for lc in known + new]
+    atomic_write(state_path, json.dumps(
+        state, indent='\t', separators=(',', ':'), sort_keys=True))
     catalog.journal_entries()
     return
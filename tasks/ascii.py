@@ -19,6 +19,7 @@ from astropy.io.ascii import read
 from astropy.time import Time as astrotime
 
 from ..supernova import SUPERNOVA
+from ..utils import ingest_ascii, read_rows
 from supernovae import utils as sn_utils
 
 READER_KWARGS = dict(delimiter='\t', quotechar='"', skipinitialspace=True)
@@ -73,7 +74,7 @@ def _ascii_1a(catalog):
             photofile = photofile[0]
         else:
             continue
-        tsvin = list(csv.reader(open(photofile, 'r'), delimiter=' ', skipinitialspace=True))
+        tsvin = list(read_rows(photofile, ' '))
         for trow in tsvin:
             if not len(trow) or not trow[0].startswith('OBS:'):
                 continue
@@ -187,53 +188,26 @@ def _ascii_1a(catalog):
 
     catalog.journal_entries()
 
-    # 2000MNRAS.319..223H
-    datafile = os.path.join(task_repo, 'ASCII', '2000MNRAS.319..223H.csv')
-    tsvin = list(csv.reader(open(datafile, 'r'), delimiter=',', skipinitialspace=True))
-    name, source = catalog.new_entry('SN1998bu', bibcode='2000MNRAS.319..223H')
-    for ri, row in enumerate(pbar(tsvin, task_str)):
-        if ri == 0:
-            continue
-        mjd = jd_to_mjd(Decimal('2450000') + Decimal(row[0]))
-        for bi, band in enumerate(['J', 'H', 'K']):
-            photodict = {
-                PHOTOMETRY.TIME: mjd,
-                PHOTOMETRY.U_TIME: 'MJD',
-                PHOTOMETRY.MAGNITUDE: row[2 * bi + 1],
-                PHOTOMETRY.E_MAGNITUDE: row[2 * bi + 2],
-                PHOTOMETRY.BAND: band,
-                PHOTOMETRY.TELESCOPE: row[-2],
-                PHOTOMETRY.OBSERVER: row[-1],
-                PHOTOMETRY.SOURCE: source
-            }
-            catalog.entries[name].add_photometry(**photodict)
-    catalog.journal_entries()
-
-    # 2017ApJ...848....6Y
-    events = {
-        'iPTF15esb': '1704.05061-tab3.tsv',
-        'iPTF16bad': '1704.05061-tab4.tsv'
-    }
-    for ev in events:
-        datafile = os.path.join(task_repo, 'ASCII', events[ev])
-        tsvin = list(csv.reader(open(datafile, 'r'), delimiter='\t', skipinitialspace=True))
-        name, source = catalog.new_entry(ev, bibcode='2017ApJ...848....6Y')
-        for row in pbar(tsvin, task_str):
-            photodict = {
-                PHOTOMETRY.TIME: row[1],
-                PHOTOMETRY.U_TIME: 'MJD',
-                PHOTOMETRY.MAGNITUDE: row[2],
-                PHOTOMETRY.E_MAGNITUDE: row[3],
-                PHOTOMETRY.BAND: row[0],
-                PHOTOMETRY.SYSTEM: 'AB',
-                PHOTOMETRY.SOURCE: source
-            }
-            catalog.entries[name].add_photometry(**photodict)
-    catalog.journal_entries()
+    ingest_ascii(catalog, [
+        # 2000MNRAS.319..223H
+        {'path': 'ASCII/2000MNRAS.319..223H.csv', 'name': 'SN1998bu',
+         'bibcode': '2000MNRAS.319..223H', 'delimiter': ',', 'skip_rows': 1,
+         'layout': 'pairs', 'bands': ['J', 'H', 'K'], 'time_format': 'jd',
+         'time_offset': '2450000',
+         'columns': {PHOTOMETRY.TELESCOPE: -2, PHOTOMETRY.OBSERVER: -1}}
+    ] + [
+        # 2017ApJ...848....6Y
+        {'path': 'ASCII/' + datafile, 'name': ev,
+         'bibcode': '2017ApJ...848....6Y', 'band': 0, 'time': 1,
+         'magnitude': 2, 'e_magnitude': 3,
+         'constants': {PHOTOMETRY.SYSTEM: 'AB'}}
+        for ev, datafile in [('iPTF15esb', '1704.05061-tab3.tsv'),
+                             ('iPTF16bad', '1704.05061-tab4.tsv')]
+    ])
 
     # 2016ApJ...823..147C
     datafile = os.path.join(task_repo, 'ASCII', '2016ApJ...823..147C.csv')
-    tsvin = list(csv.reader(open(datafile, 'r'), delimiter=',', skipinitialspace=True))
+    tsvin = list(read_rows(datafile, ','))
     name, src1 = catalog.new_entry('iPTF13asv', bibcode='2016ApJ...823..147C')
     src2 = catalog.entries[name].add_source(bibcode='2012PASP..124..668Y')
     source = ','.join([src1, src2])
@@ -263,56 +237,6 @@ def _ascii_1b(catalog):
     task_str = catalog.get_current_task_str()
     task_repo = catalog.get_current_task_repo()
 
-    # 2014MNRAS.443.1663C
-    datafile = os.path.join(task_repo, 'ASCII',
-                            '2014MNRAS.443.1663C.tsv')
-    tsvin = list(csv.reader(open(datafile, 'r'), delimiter='\t', skipinitialspace=True))
-    name, source = catalog.new_entry('SN2012dn', bibcode='2014MNRAS.443.1663C')
-    for row in pbar(tsvin, task_str):
-        if row[0].startswith('#'):
-            bands = row[1:]
-            continue
-        for bi, band in enumerate(bands):
-            if row[bi + 1].strip() == '-':
-                continue
-            mag, err = tuple([x.strip() for x in row[bi + 1].split('±')])
-            photodict = {
-                PHOTOMETRY.TIME: jd_to_mjd(Decimal(row[0])),
-                PHOTOMETRY.U_TIME: 'MJD',
-                PHOTOMETRY.MAGNITUDE: mag,
-                PHOTOMETRY.E_MAGNITUDE: err,
-                PHOTOMETRY.BAND: band,
-                PHOTOMETRY.SOURCE: source
-            }
-            catalog.entries[name].add_photometry(**photodict)
-    catalog.journal_entries()
-
-    # 2015ApJ...811...52A
-    datafile = os.path.join(task_repo, 'ASCII', '2015ApJ...811...52A.tsv')
-    tsvin = list(csv.reader(open(datafile, 'r'), delimiter='\t', skipinitialspace=True))
-    name, source = catalog.new_entry('PTF12csy', bibcode='2015ApJ...811...52A')
-    for row in pbar(tsvin, task_str):
-        if row[0].startswith('#'):
-            continue
-        mag = row[1]
-        if mag == '-':
-            continue
-        mag, err = tuple([x.strip() for x in mag.split('±')])
-        photodict = {
-            PHOTOMETRY.TIME: row[0],
-            PHOTOMETRY.U_TIME: 'MJD',
-            PHOTOMETRY.MAGNITUDE: mag,
-            PHOTOMETRY.E_MAGNITUDE: err,
-            PHOTOMETRY.BAND: row[-2],
-            PHOTOMETRY.TELESCOPE: row[-1],
-            PHOTOMETRY.SOURCE: source
-        }
-        catalog.entries[name].add_photometry(**photodict)
-
-    # 2015MNRAS.450.2373B
-    datafile = os.path.join(task_repo, 'ASCII', '2015MNRAS.450.2373B.tsv')
-    tsvin = list(csv.reader(open(datafile, 'r'), delimiter='\t', skipinitialspace=True))
-    name, source = catalog.new_entry('SN2013ab', bibcode='2015MNRAS.450.2373B')
     telkey = {
         '1': 'ST/DFOT',
         '2': 'Faulkes Telescope South',
@@ -320,117 +244,46 @@ def _ascii_1b(catalog):
         '5': '1-m LCOGT',
         '6': 'IAUC'
     }
-    for row in pbar(tsvin, task_str):
-        if row[0].startswith('#'):
-            bands = row[1:]
-            continue
-        for bi, band in enumerate(bands):
-            if row[bi + 1].strip() == '–':
-                continue
-            photodict = {
-                PHOTOMETRY.TIME: jd_to_mjd(Decimal(row[0])),
-                PHOTOMETRY.U_TIME: 'MJD',
-                PHOTOMETRY.BAND: band,
-                PHOTOMETRY.TELESCOPE: '/'.join([telkey[x] for x in row[-1].strip().split(',')]),
-                PHOTOMETRY.SOURCE: source
-            }
-            if '>' in row[bi + 1]:
-                mag = row[bi + 1].strip('>')
-                photodict[PHOTOMETRY.UPPER_LIMIT] = True
-            else:
-                magerr = tuple([x.strip() for x in row[bi + 1].split('±')])
-                if len(magerr) == 2:
-                    mag, err = magerr
-                    photodict[PHOTOMETRY.E_MAGNITUDE] = err
-                else:
-                    mag = magerr[0]
-            photodict[PHOTOMETRY.MAGNITUDE] = mag
-            catalog.entries[name].add_photometry(**photodict)
-    catalog.journal_entries()
-
-    # 2014ApJ...797....5Z
-    datafile = os.path.join(task_repo, 'ASCII', '2014ApJ...797....5Z.tsv')
-    tsvin = list(csv.reader(open(datafile, 'r'), delimiter='\t', skipinitialspace=True))
-    name, source = catalog.new_entry('SN2013am', bibcode='2014ApJ...797....5Z')
-    for row in pbar(tsvin, task_str):
-        if row[0].startswith('#'):
-            bands = row[1:]
-            continue
-        telescope = row[-1]
-        for bi, band in enumerate(bands):
-            if row[bi + 1].strip() == '-':
-                continue
-            mag, err = tuple([x.strip() for x in row[bi + 1].split('(')])
-            err = str(Decimal('0.01') * Decimal(err.strip(')')))
-            photodict = {
-                PHOTOMETRY.TIME: row[0],
-                PHOTOMETRY.U_TIME: 'MJD',
-                PHOTOMETRY.MAGNITUDE: mag,
-                PHOTOMETRY.E_MAGNITUDE: err,
-                PHOTOMETRY.BAND: band,
-                PHOTOMETRY.TELESCOPE: telescope,
-                PHOTOMETRY.SOURCE: source
-            }
-            catalog.entries[name].add_photometry(**photodict)
-    catalog.journal_entries()
-
-    # 2015MNRAS.452..838L
-    datafile = os.path.join(task_repo, 'ASCII', '2015MNRAS.452..838L.tsv')
-    tsvin = list(csv.reader(open(datafile, 'r'), delimiter='\t', skipinitialspace=True))
-    name, source = catalog.new_entry('SN2013en', bibcode='2015MNRAS.452..838L')
-    for row in pbar(tsvin, task_str):
-        if row[0].startswith('#'):
-            bands = row[1:]
-            continue
-        telescope, instrument = tuple(row[-2].split('+'))
-        observer = row[-1]
-        for bi, band in enumerate(bands):
-            if row[bi + 1].strip() == '–':
-                continue
-            mag, err = tuple([x.strip() for x in row[bi + 1].split('(')])
-            err = str(Decimal('0.01') * Decimal(err.strip(')')))
-            photodict = {
-                PHOTOMETRY.TIME: row[0],
-                PHOTOMETRY.U_TIME: 'MJD',
-                PHOTOMETRY.MAGNITUDE: mag,
-                PHOTOMETRY.E_MAGNITUDE: err,
-                PHOTOMETRY.BAND: band,
-                PHOTOMETRY.INSTRUMENT: instrument,
-                PHOTOMETRY.TELESCOPE: telescope,
-                PHOTOMETRY.OBSERVER: observer,
-                PHOTOMETRY.SOURCE: source
-            }
-            catalog.entries[name].add_photometry(**photodict)
-    catalog.journal_entries()
-
-    # 2015MNRAS.452.4307P
-    datafile = os.path.join(task_repo, 'ASCII', '2015MNRAS.452.4307P.tsv')
-    tsvin = list(csv.reader(open(datafile, 'r'), delimiter='\t', skipinitialspace=True))
-    name, source = catalog.new_entry('SN2013dy', bibcode='2015MNRAS.452.4307P')
-    for row in pbar(tsvin, task_str):
-        if row[0].startswith('#'):
-            instrument = row[0].strip('#')
-            bands = row[1:]
-            continue
-        for bi, band in enumerate(bands):
-            if row[bi + 1].strip() == '–':
-                continue
-            mag, err = tuple([x.strip() for x in row[bi + 1].split('±')])
-            photodict = {
-                PHOTOMETRY.TIME: row[0],
-                PHOTOMETRY.U_TIME: 'MJD',
-                PHOTOMETRY.MAGNITUDE: mag,
-                PHOTOMETRY.E_MAGNITUDE: err,
-                PHOTOMETRY.BAND: band,
-                PHOTOMETRY.INSTRUMENT: instrument,
-                PHOTOMETRY.SOURCE: source
-            }
-            catalog.entries[name].add_photometry(**photodict)
-    catalog.journal_entries()
+    ingest_ascii(catalog, [
+        # 2014MNRAS.443.1663C
+        {'path': 'ASCII/2014MNRAS.443.1663C.tsv', 'name': 'SN2012dn',
+         'bibcode': '2014MNRAS.443.1663C', 'layout': 'wide',
+         'error_separator': '±', 'time_format': 'jd'},
+        # 2015ApJ...811...52A
+        {'path': 'ASCII/2015ApJ...811...52A.tsv', 'name': 'PTF12csy',
+         'bibcode': '2015ApJ...811...52A', 'magnitude': 1,
+         'error_separator': '±', 'band': -2,
+         'columns': {PHOTOMETRY.TELESCOPE: -1}},
+        # 2015MNRAS.450.2373B
+        {'path': 'ASCII/2015MNRAS.450.2373B.tsv', 'name': 'SN2013ab',
+         'bibcode': '2015MNRAS.450.2373B', 'layout': 'wide',
+         'error_separator': '±', 'upper_limit': '>', 'time_format': 'jd',
+         'columns': {PHOTOMETRY.TELESCOPE: -1},
+         'transforms': {PHOTOMETRY.TELESCOPE: lambda x: '/'.join(
+             [telkey[tt] for tt in x.split(',')])}},
+        # 2014ApJ...797....5Z
+        {'path': 'ASCII/2014ApJ...797....5Z.tsv', 'name': 'SN2013am',
+         'bibcode': '2014ApJ...797....5Z', 'layout': 'wide',
+         'error_separator': '(', 'e_magnitude_scale': '0.01',
+         'columns': {PHOTOMETRY.TELESCOPE: -1}},
+        # 2015MNRAS.452..838L
+        {'path': 'ASCII/2015MNRAS.452..838L.tsv', 'name': 'SN2013en',
+         'bibcode': '2015MNRAS.452..838L', 'layout': 'wide',
+         'error_separator': '(', 'e_magnitude_scale': '0.01',
+         'columns': {PHOTOMETRY.TELESCOPE: -2, PHOTOMETRY.INSTRUMENT: -2,
+                     PHOTOMETRY.OBSERVER: -1},
+         'transforms': {PHOTOMETRY.TELESCOPE: lambda x: x.split('+')[0],
+                        PHOTOMETRY.INSTRUMENT: lambda x: x.split('+')[1]}},
+        # 2015MNRAS.452.4307P
+        {'path': 'ASCII/2015MNRAS.452.4307P.tsv', 'name': 'SN2013dy',
+         'bibcode': '2015MNRAS.452.4307P', 'layout': 'wide',
+         'error_separator': '±',
+         'header_columns': {PHOTOMETRY.INSTRUMENT: 0}}
+    ])
 
     # 2016MNRAS.461.2003Y
     path = os.path.join(task_repo, 'ASCII', '2016MNRAS.461.2003Y-tab2.txt')
-    tsvin = list(csv.reader(open(path, 'r'), delimiter=',', skipinitialspace=True))
+    tsvin = list(read_rows(path, ','))
     name, source = catalog.new_entry('SN2013ej', bibcode='2016MNRAS.461.2003Y')
     telstring = ','.join(tsvin[-1]).strip('#')
     tels = {}
@@ -458,36 +311,22 @@ def _ascii_1b(catalog):
     catalog.journal_entries()
 
     # 2017arXiv170302402W
-    file_names = glob(os.path.join(task_repo, 'SweetSpot', '*.dat'))
-    for path in pbar(file_names, desc=task_str + ', SweetSpot'):
-        tsvin = list(csv.reader(open(path, 'r'), delimiter=' ', skipinitialspace=True))
-        oname = path.split('/')[-1].split('_')[0]
-        name, source = catalog.new_entry(oname, bibcode='2017arXiv170302402W')
-        for row in tsvin:
-            if not row or row[0][0] == '#':
-                continue
-            inst, band = row[2][:-1], row[2][-1]
-            tel = 'WIYN'
-            zp = '25'
-            c, lec, uec = tuple(row[3:6])
-            photodict = {
-                PHOTOMETRY.TIME: row[1],
-                PHOTOMETRY.U_TIME: 'MJD',
-                PHOTOMETRY.COUNT_RATE: c,
-                PHOTOMETRY.E_LOWER_COUNT_RATE: lec,
-                PHOTOMETRY.E_UPPER_COUNT_RATE: uec,
-                PHOTOMETRY.BAND: band,
-                PHOTOMETRY.INSTRUMENT: inst,
-                PHOTOMETRY.TELESCOPE: tel,
-                PHOTOMETRY.SOURCE: source
-            }
-            sn_utils.set_pd_mag_from_counts(photodict, c, lec=lec, uec=uec, zp=zp, sig=5.0)
-            catalog.entries[name].add_photometry(**photodict)
-    catalog.journal_entries()
+    ingest_ascii(catalog, [
+        {'path': 'SweetSpot/*.dat', 'name_pattern': r'([^_]*)',
+         'bibcode': '2017arXiv170302402W', 'delimiter': ' ', 'time': 1,
+         'counts': {PHOTOMETRY.COUNT_RATE: 3,
+                    PHOTOMETRY.E_LOWER_COUNT_RATE: 4,
+                    PHOTOMETRY.E_UPPER_COUNT_RATE: 5},
+         'zero_point': '25',
+         'columns': {PHOTOMETRY.INSTRUMENT: 2, PHOTOMETRY.BAND: 2},
+         'transforms': {PHOTOMETRY.INSTRUMENT: lambda x: x[:-1],
+                        PHOTOMETRY.BAND: lambda x: x[-1]},
+         'constants': {PHOTOMETRY.TELESCOPE: 'WIYN'}}
+    ])
 
     # 2014ApJ...789..104O
     datafile = os.path.join(task_repo, 'ASCII', '2014ApJ...789..104O-tab1.txt')
-    tsvin = list(csv.reader(open(datafile, 'r'), delimiter='\t', skipinitialspace=True))
+    tsvin = list(read_rows(datafile, '\t'))
     for row in pbar(tsvin[2:], task_str):
         name, source = catalog.new_entry(row[0], bibcode='2014ApJ...789..104O')
         catalog.entries[name].add_quantity(SUPERNOVA.CLAIMED_TYPE, row[1], source)
@@ -623,7 +462,7 @@ def _ascii_2(catalog):
 
     # 2006AJ....132.1126N
     datafile = os.path.join(task_repo, 'ASCII', '2006AJ....132.1126N-tab2.tsv')
-    tsvin = list(csv.reader(open(datafile, 'r'), delimiter='\t', skipinitialspace=True))
+    tsvin = list(read_rows(datafile, '\t'))
     for row in pbar(tsvin, task_str):
         name, source = catalog.new_entry(row[0], bibcode='2006AJ....132.1126N')
         catalog.entries[name].add_quantity(SUPERNOVA.RA, row[1], source)
@@ -637,7 +476,7 @@ def _ascii_2(catalog):
             SUPERNOVA.CLAIMED_TYPE, 'Ia', source, kind='spectroscopic')
 
     datafile = os.path.join(task_repo, 'ASCII', '2006AJ....132.1126N-tab3.tsv')
-    tsvin = list(csv.reader(open(datafile, 'r'), delimiter='\t', skipinitialspace=True))
+    tsvin = list(read_rows(datafile, '\t'))
     for row in pbar(tsvin, task_str):
         name, source = catalog.new_entry(row[0], bibcode='2006AJ....132.1126N')
         catalog.entries[name].add_quantity(SUPERNOVA.RA, row[1], source)
@@ -653,24 +492,15 @@ def _ascii_2(catalog):
     catalog.journal_entries()
 
     # 2007ApJ...669L..17H
-    datafile = os.path.join(task_repo, 'ASCII', '2007ApJ...669L..17H.tsv')
-    tsvin = list(csv.reader(open(datafile, 'r'), delimiter='\t', skipinitialspace=True))
-    name, source = catalog.new_entry('SN2006gz', bibcode='2007ApJ...669L..17H')
-    for row in pbar(tsvin[1:], task_str):
-        photodict = {
-            PHOTOMETRY.MAGNITUDE: row[2],
-            PHOTOMETRY.E_MAGNITUDE: row[3],
-            PHOTOMETRY.TIME: jd_to_mjd(Decimal(row[1])),
-            PHOTOMETRY.U_TIME: 'MJD',
-            PHOTOMETRY.BAND: row[0],
-            PHOTOMETRY.SOURCE: source
-        }
-        catalog.entries[name].add_photometry(**photodict)
-    catalog.journal_entries()
+    ingest_ascii(catalog, [
+        {'path': 'ASCII/2007ApJ...669L..17H.tsv', 'name': 'SN2006gz',
+         'bibcode': '2007ApJ...669L..17H', 'skip_rows': 1, 'band': 0,
+         'time': 1, 'time_format': 'jd', 'magnitude': 2, 'e_magnitude': 3}
+    ])
 
     # 2011ApJ...729...88R
     file_path = os.path.join(task_repo, 'ASCII', '2011ApJ...729...88R-tab1.tsv')
-    tsvin = list(csv.reader(open(file_path, 'r'), delimiter='\t', skipinitialspace=True))
+    tsvin = list(read_rows(file_path, '\t'))
     for ri, row in enumerate(pbar(tsvin, task_str)):
         name, source = catalog.new_entry('SN2003ma', bibcode='2011ApJ...729...88R')
         if ri == 0:
@@ -695,53 +525,17 @@ def _ascii_2(catalog):
             catalog.entries[name].add_photometry(**photodict)
     catalog.journal_entries()
 
-    # 1998A&A...337..207S
-    file_path = os.path.join(task_repo, 'ASCII', '1998A&A...337..207S-tab3.tsv')
-    tsvin = list(csv.reader(open(file_path, 'r'), delimiter='\t', skipinitialspace=True))
-    for ri, row in enumerate(pbar(tsvin, task_str)):
-        name, source = catalog.new_entry('SN1996N', bibcode='1998A&A...337..207S')
-        if ri == 0:
-            bands = row[1:]
-            continue
-        for ci, col in enumerate(row[1:-1:2]):
-            if not is_number(col):
-                continue
-            photodict = {
-                PHOTOMETRY.BAND: bands[ci],
-                PHOTOMETRY.TIME: jd_to_mjd(Decimal(row[0])),
-                PHOTOMETRY.U_TIME: 'MJD',
-                PHOTOMETRY.MAGNITUDE: col,
-                PHOTOMETRY.SOURCE: source
-            }
-            if is_number(row[2 + 2 * ci]):
-                photodict[PHOTOMETRY.E_MAGNITUDE] = row[2 + 2 * ci]
-            catalog.entries[name].add_photometry(**photodict)
-    catalog.journal_entries()
-
-    # 1997ApJ...483..675C
-    file_path = os.path.join(task_repo, 'ASCII',
-                             '1997ApJ...483..675C-tab1.tsv')
-    tsvin = list(csv.reader(open(file_path, 'r'), delimiter='\t', skipinitialspace=True))
-    for ri, row in enumerate(pbar(tsvin, task_str)):
-        name, source = catalog.new_entry('SN1983V', bibcode='1997ApJ...483..675C')
-        if ri == 0:
-            bands = row[1:-2]
-            continue
-        for ci, col in enumerate(row[1:-2:2]):
-            if not is_number(col):
-                continue
-            photodict = {
-                PHOTOMETRY.TELESCOPE: row[-2],
-                PHOTOMETRY.BAND: bands[ci],
-                PHOTOMETRY.TIME: jd_to_mjd(Decimal(row[0])),
-                PHOTOMETRY.U_TIME: 'MJD',
-                PHOTOMETRY.MAGNITUDE: col,
-                PHOTOMETRY.SOURCE: source
-            }
-            if is_number(row[2 + 2 * ci]):
-                photodict[PHOTOMETRY.E_MAGNITUDE] = row[2 + 2 * ci]
-            catalog.entries[name].add_photometry(**photodict)
-    catalog.journal_entries()
+    ingest_ascii(catalog, [
+        # 1998A&A...337..207S
+        {'path': 'ASCII/1998A&A...337..207S-tab3.tsv', 'name': 'SN1996N',
+         'bibcode': '1998A&A...337..207S', 'layout': 'pairs',
+         'header': 'first', 'trailing': 1, 'time_format': 'jd'},
+        # 1997ApJ...483..675C
+        {'path': 'ASCII/1997ApJ...483..675C-tab1.tsv', 'name': 'SN1983V',
+         'bibcode': '1997ApJ...483..675C', 'layout': 'pairs',
+         'header': 'first', 'trailing': 2, 'time_format': 'jd',
+         'columns': {PHOTOMETRY.TELESCOPE: -2}}
+    ])
 
     # 2017ApJ...835...58V
     datafile = os.path.join(
@@ -766,35 +560,18 @@ def _ascii_2(catalog):
     catalog.journal_entries()
 
     # 2012A&A...537A.140T
-    tables = ['2012A&A...537A.140T-' + x + '.tsv' for x in ['tab4', 'tab6']]
-    sns = ['SN2006V', 'SN2006au']
-    for ti, tab in enumerate(tables):
-        file_path = os.path.join(task_repo, 'ASCII', tab)
-        tsvin = list(csv.reader(open(file_path, 'r'), delimiter='\t', skipinitialspace=True))
-        for ri, row in enumerate(pbar(tsvin, task_str)):
-            name, source = catalog.new_entry(sns[ti], bibcode='2012A&A...537A.140T')
-            if ri == 0:
-                bands = row[1:]
-                continue
-            for ci, col in enumerate(row[1:-1:2]):
-                if not is_number(col):
-                    continue
-                photodict = {
-                    PHOTOMETRY.TELESCOPE: row[-1],
-                    PHOTOMETRY.BAND: bands[ci],
-                    PHOTOMETRY.TIME: jd_to_mjd(Decimal(row[0])),
-                    PHOTOMETRY.U_TIME: 'MJD',
-                    PHOTOMETRY.MAGNITUDE: col,
-                    PHOTOMETRY.E_MAGNITUDE: str(float(row[2 + 2 * ci])),
-                    PHOTOMETRY.SOURCE: source
-                }
-                catalog.entries[name].add_photometry(**photodict)
-    catalog.journal_entries()
+    ingest_ascii(catalog, [
+        {'path': 'ASCII/2012A&A...537A.140T-' + tab + '.tsv', 'name': sn,
+         'bibcode': '2012A&A...537A.140T', 'layout': 'pairs',
+         'header': 'first', 'trailing': 1, 'time_format': 'jd',
+         'columns': {PHOTOMETRY.TELESCOPE: -1}}
+        for tab, sn in [('tab4', 'SN2006V'), ('tab6', 'SN2006au')]
+    ])
 
     # 2015MNRAS.449.1215P
     file_path = os.path.join(
         task_repo, 'ASCII', '2015MNRAS.449.1215P.tsv')
-    tsvin = list(csv.reader(open(file_path, 'r'), delimiter='\t', skipinitialspace=True))
+    tsvin = list(read_rows(file_path, '\t'))
     for ri, row in enumerate(pbar(tsvin, task_str)):
         if row[0][0] == '#':
             continue
@@ -822,7 +599,7 @@ def _ascii_2(catalog):
 
     # 2016MNRAS.459.3939V
     file_path = os.path.join(task_repo, 'ASCII', 'Valenti2016_data.txt')
-    tsvin = list(csv.reader(open(file_path, 'r'), delimiter=' ', skipinitialspace=True))
+    tsvin = list(read_rows(file_path, ' '))
     bandsub = {
         'BS': 'B',
         'VS': 'V',
@@ -953,30 +730,17 @@ def _ascii_2(catalog):
         catalog.entries[name].add_photometry(**photodict)
 
     # 2011PhDT........35K
-    datafile = os.path.join(task_repo, 'ASCII',
-                            '2011PhDT........35K-tab2.2.txt')
-
-    tsvin = list(csv.reader(open(datafile, 'r'), delimiter='\t', skipinitialspace=True))
-    name, source = catalog.new_entry('SN2007ax', bibcode='2011PhDT........35K')
-    for row in pbar(tsvin[1:], task_str):
-        if len(row) == 1:
-            continue
-        e_mag = row[4].strip()
-        photodict = {
-            PHOTOMETRY.MAGNITUDE: row[3],
-            PHOTOMETRY.E_MAGNITUDE: e_mag,
-            PHOTOMETRY.TIME: row[0],
-            PHOTOMETRY.U_TIME: 'MJD',
-            PHOTOMETRY.BAND: row[2],
-            PHOTOMETRY.TELESCOPE: row[1],
-            PHOTOMETRY.SOURCE: source
-        }
-        catalog.entries[name].add_photometry(**photodict)
+    ingest_ascii(catalog, [
+        {'path': 'ASCII/2011PhDT........35K-tab2.2.txt', 'name': 'SN2007ax',
+         'bibcode': '2011PhDT........35K', 'skip_rows': 1, 'time': 0,
+         'band': 2, 'magnitude': 3, 'e_magnitude': 4,
+         'columns': {PHOTOMETRY.TELESCOPE: 1}}
+    ])
 
     # 2011ApJ...730..134K
     datafile = os.path.join(task_repo, 'ASCII', '2011ApJ...730..134K-tab2.txt')
 
-    tsvin = list(csv.reader(open(datafile, 'r'), delimiter='\t', skipinitialspace=True))
+    tsvin = list(read_rows(datafile, '\t'))
     name, source = catalog.new_entry('PTF10fqs', bibcode='2011ApJ...730..134K')
     for row in pbar(tsvin[1:], task_str):
         if len(row) == 1:
@@ -1002,7 +766,7 @@ def _ascii_2(catalog):
     # 2012ApJ...755..161K
     datafile = os.path.join(task_repo, 'ASCII', '2012ApJ...755..161K-tab3.txt')
 
-    tsvin = list(csv.reader(open(datafile, 'r'), delimiter='\t', skipinitialspace=True))
+    tsvin = list(read_rows(datafile, '\t'))
     for row in pbar(tsvin[1:], task_str):
         if len(row) == 1:
             name, source = catalog.new_entry(row[0], bibcode='2012ApJ...755..161K')
@@ -1054,7 +818,7 @@ def _ascii_3(catalog):
 
     # 2007ApJ...666.1116S
     file_path = os.path.join(task_repo, '2007ApJ...666.1116S-tab1.csv')
-    tsvin = list(csv.reader(open(file_path, 'r'), delimiter=' ', skipinitialspace=True))
+    tsvin = list(read_rows(file_path, ' '))
     name, source = catalog.new_entry('SN2006gy', bibcode='2007ApJ...666.1116S')
     for ri, row in enumerate(pbar(tsvin, task_str)):
         for ci, col in enumerate(row[1:]):
@@ -1076,7 +840,7 @@ def _ascii_3(catalog):
 
     # 2015ApJ...799...51M
     file_path = os.path.join(task_repo, '2015ApJ...799...51M-tab1.tsv')
-    tsvin = list(csv.reader(open(file_path, 'r'), delimiter='\t', skipinitialspace=True))
+    tsvin = list(read_rows(file_path, '\t'))
     name, source = catalog.new_entry('SN2012ap', bibcode='2015ApJ...799...51M')
     for ri, row in enumerate(pbar(tsvin, task_str)):
         if row[0][0] == '#':
@@ -1099,7 +863,7 @@ def _ascii_3(catalog):
 
     # 2013ApJ...767...57F
     file_path = os.path.join(task_repo, '2013ApJ...767...57F.txt')
-    tsvin = list(csv.reader(open(file_path, 'r'), delimiter=' ', skipinitialspace=True))
+    tsvin = list(read_rows(file_path, ' '))
     for ri, row in enumerate(pbar(tsvin, task_str)):
         name, source = catalog.new_entry(
             row[0], bibcode='2013ApJ...767...57F')
@@ -1107,7 +871,7 @@ def _ascii_3(catalog):
 
     # 2015MNRAS.446.3895F
     file_path = os.path.join(task_repo, '2015MNRAS.446.3895F.txt')
-    tsvin = list(csv.reader(open(file_path, 'r'), delimiter=' ', skipinitialspace=True))
+    tsvin = list(read_rows(file_path, ' '))
     for ri, row in enumerate(pbar(tsvin, task_str)):
         if row[0][0] == '#':
             continue
@@ -1135,7 +899,7 @@ def _ascii_3(catalog):
 
     # 2016ApJ...832..108M
     file_path = os.path.join(task_repo, 'ASCII', '2016ApJ...832..108M.txt')
-    tsvin = list(csv.reader(open(file_path, 'r'), delimiter='/', skipinitialspace=True))
+    tsvin = list(read_rows(file_path, '/'))
     for ri, row in enumerate(pbar(tsvin, task_str)):
         if row[0][0] == '#':
             ct = row[0].lstrip('#')
@@ -1166,7 +930,7 @@ def _ascii_3(catalog):
 
     # 2004ApJ...606..381L
     file_path = os.path.join(task_repo, '2004ApJ...606..381L-table3.txt')
-    tsvin = list(csv.reader(open(file_path, 'r'), delimiter=' ', skipinitialspace=True))
+    tsvin = list(read_rows(file_path, ' '))
     name = 'SN2003dh'
     name, source = catalog.new_entry(name, bibcode='2004ApJ...606..381L')
     instdict = {}
@@ -1215,7 +979,8 @@ def _ascii_3(catalog):
 
     # 2006ApJ...645..841N
     file_path = os.path.join(task_repo, '2006ApJ...645..841N-table3.csv')
-    tsvin = list(csv.reader(open(file_path, 'r'), delimiter=','))
+    with open(file_path, 'r') as ff:
+        tsvin = list(csv.reader(ff, delimiter=','))
     for ri, row in enumerate(pbar(tsvin, task_str)):
         name = 'SNLS-' + row[0]
         name = catalog.add_entry(name)
@@ -1270,7 +1035,8 @@ def _ascii_3(catalog):
     # stromlo
     stromlobands = ['B', 'V', 'R', 'I', 'VM', 'RM']
     file_path = os.path.join(task_repo, 'J_A+A_415_863-1/photometry.csv')
-    tsvin = list(csv.reader(open(file_path, 'r'), delimiter=','))
+    with open(file_path, 'r') as ff:
+        tsvin = list(csv.reader(ff, delimiter=','))
     for row in pbar(tsvin, task_str):
         name = row[0]
         name = catalog.add_entry(name)
@@ -1309,7 +1075,7 @@ def _ascii_3(catalog):
 
     # 2015MNRAS.449..451W
     file_path = os.path.join(task_repo, '2015MNRAS.449..451W.dat')
-    data = list(csv.reader(open(file_path, 'r'), **READER_KWARGS))
+    data = list(read_rows(file_path))
     for rr, row in enumerate(pbar(data, task_str)):
         if rr == 0:
             continue
@@ -1334,7 +1100,7 @@ def _ascii_3(catalog):
 
     # 2016MNRAS.459.1039T
     file_path = os.path.join(task_repo, '2016MNRAS.459.1039T.tsv')
-    data = list(csv.reader(open(file_path, 'r'), **READER_KWARGS))
+    data = list(read_rows(file_path))
     name = catalog.add_entry('LSQ13zm')
     source = catalog.entries[name].add_source(bibcode='2016MNRAS.459.1039T')
     catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, source)
@@ -1368,7 +1134,7 @@ def _ascii_3(catalog):
 
     # 2015ApJ...804...28G
     file_path = os.path.join(task_repo, '2015ApJ...804...28G.tsv')
-    data = list(csv.reader(open(file_path, 'r'), **READER_KWARGS))
+    data = list(read_rows(file_path))
     name = catalog.add_entry('PS1-13arp')
     source = catalog.entries[name].add_source(bibcode='2015ApJ...804...28G')
     catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, source)
@@ -1399,7 +1165,7 @@ def _ascii_3(catalog):
 
     # 2016ApJ...819...35A
     file_path = os.path.join(task_repo, '2016ApJ...819...35A.tsv')
-    data = list(csv.reader(open(file_path, 'r'), **READER_KWARGS))
+    data = list(read_rows(file_path))
     for rr, row in enumerate(pbar(data, task_str)):
         if row[0][0] == '#':
             continue
@@ -1416,7 +1182,7 @@ def _ascii_3(catalog):
 
     # 2014ApJ...784..105W
     file_path = os.path.join(task_repo, '2014ApJ...784..105W.tsv')
-    data = list(csv.reader(open(file_path, 'r'), **READER_KWARGS))
+    data = list(read_rows(file_path))
     for rr, row in enumerate(pbar(data, task_str)):
         if row[0][0] == '#':
             continue
@@ -1443,7 +1209,7 @@ def _ascii_3(catalog):
 
     # 2013MNRAS.432L..90B
     file_path = os.path.join(task_repo, 'ASCII/2013MNRAS.432L..90B.tsv')
-    data = list(csv.reader(open(file_path, 'r'), **READER_KWARGS))
+    data = list(read_rows(file_path))
     for rr, row in enumerate(pbar(data, task_str)):
         if row[0][0] == '#':
             bands = row[2:]
@@ -11,7 +11,7 @@ from astropy.time import Time as astrotime
 from decimal import Decimal
 
 from ..supernova import SUPERNOVA
-from ..utils import clean_snname
+from ..utils import clean_snname, load_spectrum_text, parse_in_pool
 
 ACKN_CFA = ("This research has made use of the CfA Supernova Archive, "
             "which is funded in part by the National Science Foundation "
@@ -170,9 +170,8 @@ def do_cfa_spectra(catalog):
     task_str = catalog.get_current_task_str()
     # II spectra
     oldname = ''
-    file_names = next(os.walk(os.path.join(catalog.get_current_task_repo(), 'CfA_SNII')))[1]
-    for ni, name in enumerate(pbar(file_names, task_str, sort=True)):
-        fullpath = os.path.join(catalog.get_current_task_repo(), 'CfA_SNII/') + name
+    folders, results = _read_spectra(catalog, 'CfA_SNII')
+    for name, fnames in pbar(folders, task_str):
         origname = name
         if name.startswith('sn') and is_number(name[2:6]):
             name = 'SN' + name[2:]
@@ -189,7 +188,7 @@ def do_cfa_spectra(catalog):
         source = catalog.entries[name].add_source(
             name=reference, url=refurl, secondary=True, acknowledgment=ACKN_CFA)
         catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, source)
-        for fi, fname in enumerate(sorted(glob(fullpath + '/*'), key=lambda s: s.lower())):
+        for fi, fname in enumerate(fnames):
             filename = os.path.basename(fname)
             fileparts = filename.split('-')
             if origname.startswith('sn') and is_number(origname[2:6]):
@@ -205,9 +204,7 @@ def do_cfa_spectra(catalog):
             time = str(
                 astrotime(year + '-' + month + '-' + str(floor(float(day)))
                           .zfill(2)).mjd + float(day) - floor(float(day)))
-            f = open(fname, 'r')
-            data = csv.reader(f, delimiter=' ', skipinitialspace=True)
-            data = [list(i) for i in zip(*data)]
+            data = [list(col) for col in next(results)]
             wavelengths = data[0]
             fluxes = data[1]
             errors = data[2]
@@ -228,15 +225,12 @@ def do_cfa_spectra(catalog):
                 source=sources,
                 dereddened=False,
                 deredshifted=False)
-        if catalog.args.travis and ni >= catalog.TRAVIS_QUERY_LIMIT:
-            break
     catalog.journal_entries()
 
     # Ia spectra
     oldname = ''
-    file_names = next(os.walk(os.path.join(catalog.get_current_task_repo(), 'CfA_SNIa')))[1]
-    for ni, name in enumerate(pbar(file_names, task_str, sort=True)):
-        fullpath = os.path.join(catalog.get_current_task_repo(), 'CfA_SNIa/') + name
+    folders, results = _read_spectra(catalog, 'CfA_SNIa')
+    for name, fnames in pbar(folders, task_str):
         origname = name
         if name.startswith('sn') and is_number(name[2:6]):
             name = 'SN' + name[2:]
@@ -255,7 +249,7 @@ def do_cfa_spectra(catalog):
         source = catalog.entries[name].add_source(
             name=reference, url=refurl, secondary=True, acknowledgment=ACKN_CFA)
         catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, source)
-        for fi, fname in enumerate(sorted(glob(fullpath + '/*'), key=lambda s: s.lower())):
+        for fi, fname in enumerate(fnames):
             filename = os.path.basename(fname)
             fileparts = filename.split('-')
             if origname.startswith('sn') and is_number(origname[2:6]):
@@ -272,9 +266,7 @@ def do_cfa_spectra(catalog):
                 astrotime(year + '-' + month + '-' + str(floor(float(day))).zfill(2)).mjd +
                 float(day) - floor(float(day))
             )
-            f = open(fname, 'r')
-            data = csv.reader(f, delimiter=' ', skipinitialspace=True)
-            data = [list(i) for i in zip(*data)]
+            data = [list(col) for col in next(results)]
             wavelengths = data[0]
             fluxes = data[1]
             errors = data[2]
@@ -296,15 +288,12 @@ def do_cfa_spectra(catalog):
                 source=sources,
                 dereddened=False,
                 deredshifted=False)
-        if catalog.args.travis and ni >= catalog.TRAVIS_QUERY_LIMIT:
-            break
     catalog.journal_entries()
 
     # Ibc spectra
     oldname = ''
-    file_names = next(os.walk(os.path.join(catalog.get_current_task_repo(), 'CfA_SNIbc')))[1]
-    for ni, name in enumerate(pbar(file_names, task_str)):
-        fullpath = os.path.join(catalog.get_current_task_repo(), 'CfA_SNIbc/') + name
+    folders, results = _read_spectra(catalog, 'CfA_SNIbc', sort=False)
+    for name, fnames in pbar(folders, task_str):
         if name.startswith('sn') and is_number(name[2:6]):
             name = 'SN' + name[2:]
         # Use existing name if entry already added
@@ -320,7 +309,7 @@ def do_cfa_spectra(catalog):
         source = catalog.entries[name].add_source(
             name=reference, url=refurl, secondary=True, acknowledgment=ACKN_CFA)
         catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, source)
-        for fi, fname in enumerate(sorted(glob(fullpath + '/*'), key=lambda s: s.lower())):
+        for fi, fname in enumerate(fnames):
             filename = os.path.basename(fname)
             fileparts = filename.split('-')
             instrument = None
@@ -333,9 +322,7 @@ def do_cfa_spectra(catalog):
                 astrotime(year + '-' + month + '-' + str(floor(float(day))).zfill(2)).mjd +
                 float(day) - floor(float(day))
             )
-            f = open(fname, 'r')
-            data = csv.reader(f, delimiter=' ', skipinitialspace=True)
-            data = [list(i) for i in zip(*data)]
+            data = [list(col) for col in next(results)]
             wavelengths = data[0]
             fluxes = data[1]
             sources = uniq_cdl(
@@ -357,16 +344,13 @@ def do_cfa_spectra(catalog):
             if instrument is not None:
                 spec[SPECTRUM.INSTRUMENT] = instrument
             catalog.entries[name].add_spectrum(**spec)
-
-        if catalog.args.travis and ni >= catalog.TRAVIS_QUERY_LIMIT:
-            break
     catalog.journal_entries()
 
     # Other spectra
     oldname = ''
-    file_names = next(os.walk(os.path.join(catalog.get_current_task_repo(), 'CfA_Extra')))[1]
-    for ni, name in enumerate(pbar(file_names, task_str, sort=True)):
-        fullpath = os.path.join(catalog.get_current_task_repo(), 'CfA_Extra/') + name
+    folders, results = _read_spectra(
+        catalog, 'CfA_Extra', accept=_is_extra_spectrum)
+    for name, fnames in pbar(folders, task_str):
         if name.startswith('sn') and is_number(name[2:6]):
             name = 'SN' + name[2:]
         # Use existing name if entry already added
@@ -382,13 +366,8 @@ def do_cfa_spectra(catalog):
         source = catalog.entries[name].add_source(
             name=reference, url=refurl, secondary=True, acknowledgment=ACKN_CFA)
         catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, source)
-        for fi, fname in enumerate(sorted(glob(fullpath + '/*'), key=lambda s: s.lower())):
-            if not os.path.isfile(fname):
-                continue
+        for fi, fname in enumerate(fnames):
             filename = os.path.basename(fname)
-            if ((not filename.startswith('sn') or not filename.endswith('flm') or
-                 any(x in filename for x in ['-interp', '-z', '-dered', '-obj', '-gal']))):
-                continue
             fileparts = filename.split('.')[0].split('-')
             instrument = None
             time = None
@@ -401,9 +380,7 @@ def do_cfa_spectra(catalog):
                         instrument = fileparts[-1]
                     time = year + '-' + month + '-' + str(floor(float(day))).zfill(2)
                     time = str(astrotime(time).mjd + float(day) - floor(float(day)))
-            f = open(fname, 'r')
-            data = csv.reader(f, delimiter=' ', skipinitialspace=True)
-            data = [list(i) for i in zip(*data)]
+            data = [list(col) for col in next(results)]
             wavelengths = data[0]
             fluxes = [str(Decimal(x) * Decimal(1.0e-15)) for x in data[1]]
             spec = {
@@ -423,8 +400,39 @@ def do_cfa_spectra(catalog):
                 spec[SPECTRUM.INSTRUMENT] = instrument
             catalog.entries[name].add_spectrum(**spec)
 
-        if catalog.args.travis and ni >= catalog.TRAVIS_QUERY_LIMIT:
-            break
-
     catalog.journal_entries()
     return
+
+
+def _is_extra_spectrum(fname):
+    filename = os.path.basename(fname)
+    return (os.path.isfile(fname) and filename.startswith('sn') and
+            filename.endswith('flm') and not any(
+                x in filename
+                for x in ['-interp', '-z', '-dered', '-obj', '-gal']))
+
+
+def _read_spectra(catalog, folder, sort=True, accept=None):
+    """Event folders of `folder` with their spectrum files, and their data.
+
+    Returns a list of (event folder, spectrum files), sorted by folder name
+    if `sort` and cut after `TRAVIS_QUERY_LIMIT` + 1 folders in Travis mode,
+    and an iterator over the columns of every file (of those `accept`ed),
+    in order, which are read in a pool of processes.
+    """
+    path = os.path.join(catalog.get_current_task_repo(), folder)
+    names = next(os.walk(path))[1]
+    if sort:
+        names = sorted(names, key=lambda s: s.lower())
+    if catalog.args.travis:
+        names = names[:catalog.TRAVIS_QUERY_LIMIT + 1]
+    folders = []
+    for name in names:
+        fnames = sorted(glob(os.path.join(path, name) + '/*'),
+                        key=lambda s: s.lower())
+        if accept is not None:
+            fnames = [fname for fname in fnames if accept(fname)]
+        folders.append((name, fnames))
+    results = parse_in_pool(catalog, load_spectrum_text, [
+        (fname,) for name, fnames in folders for fname in fnames])
+    return folders, results
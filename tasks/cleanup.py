@@ -550,6 +550,7 @@ def do_cleanup(catalog):
         if catalog.args.travis and cleanupcnt >= 1000:
             break
 
+    catalog.journal_writer.flush()
     catalog.save_caches()
 
     return
@@ -2,107 +2,179 @@
 import json
 import os
 from collections import OrderedDict
+from hashlib import md5
 
+from astrocats.structures.struct import PHOTOMETRY
 from astrocats.utils import is_number, pbar, round_sig, uniq_cdl
 
 from ..supernova import SUPERNOVA
+from ..utils import atomic_write
+
+CPCS_URL = 'http://gsaweb.ast.cam.ac.uk/followup/'
+CPCS_HASHTAG = 'JG_530ad9462a0b8785bfb385614bf178c6'
+# Number of alert light curves downloaded per concurrent batch.
+CPCS_FETCH_BATCH = 32
 
 
 def do_cpcs(catalog):
-    """Import data from CPCS."""
+    """Import data from CPCS.
+
+    `CPCS/lc-state.json` keeps, for every alert, a hash of its record of
+    the alert index and a fingerprint of its light curve (number of points,
+    last MJD and a hash of the file).  Only the light curves of new alerts
+    and of alerts whose record changed are downloaded, concurrently; in
+    update mode the other alerts are skipped altogether, and the photometry
+    of alerts whose light curve is unchanged is not added again.  Light
+    curves that fail to download are read from the cache, and their state
+    is left as it was.
+    """
     task_str = catalog.get_current_task_str()
-    cpcs_url = ('http://gsaweb.ast.cam.ac.uk/'
-                'followup/list_of_alerts?format=json&num=100000&'
-                'published=1&observed_only=1'
-                '&hashtag=JG_530ad9462a0b8785bfb385614bf178c6')
+    task_repo = catalog.get_current_task_repo()
+    cpcs_url = (CPCS_URL + 'list_of_alerts?format=json&num=100000&'
+                'published=1&observed_only=1&hashtag=' + CPCS_HASHTAG)
     jsontxt = catalog.load_url(cpcs_url, os.path.join(
-        catalog.get_current_task_repo(), 'CPCS/index.json'))
+        task_repo, 'CPCS/index.json'))
     if not jsontxt:
         return
+    state_path = os.path.join(task_repo, 'CPCS', 'lc-state.json')
+    state = {}
+    if os.path.isfile(state_path):
+        with open(state_path, 'r') as ff:
+            state = json.load(ff)
     alertindex = json.loads(jsontxt, object_pairs_hook=OrderedDict)
-    ids = [xx['id'] for xx in alertindex]
-    for ii, ai in enumerate(pbar(ids, task_str)):
-        name = alertindex[ii]['ivorn'].split('/')[-1].strip()
-        # Skip aa few weird entries
-        if name == 'ASASSNli':
+    pending = []
+    for ii, alert in enumerate(alertindex):
+        ai = str(alert['id'])
+        path = os.path.join('CPCS', 'alert-' + ai.zfill(2) + '.json')
+        fingerprint = md5(json.dumps(alert, sort_keys=True).encode(
+            'utf-8')).hexdigest()
+        if (catalog.args.update and
+                state.get(ai, {}).get('row') == fingerprint and
+                os.path.isfile(os.path.join(task_repo, path))):
             continue
-        # Just use aa whitelist for now since naming seems inconsistent
-        white_list = [
-            'GAIA', 'OGLE', 'ASASSN', 'MASTER', 'OTJ', 'PS1', 'IPTF', 'CSS']
-        if True in [xx in name.upper() for xx in white_list]:
-            name = name.replace('Verif', '').replace('_', ' ')
-            if 'ASASSN' in name and name[6] != '-':
-                name = 'ASASSN-' + name[6:].lower()
-            if 'MASTEROTJ' in name:
-                name = name.replace('MASTEROTJ', 'MASTER OT J')
-            if 'OTJ' in name:
-                name = name.replace('OTJ', 'MASTER OT J')
-            if name.upper().startswith('IPTF'):
-                name = 'iPTF' + name[4:].lower()
-            if name.upper().startswith('PS1'):
-                name = 'PS1' + name[3:].lower()
-            # Only add events that are classified as SN.
-            if catalog.get_name_for_entry_or_alias(name) is None:
-                continue
-            oldname = name
-            name = catalog.add_entry(name)
-        else:
-            continue
-
-        sec_source = catalog.entries[name].add_source(
-            name='Cambridge Photometric Calibration Server',
-            url='http://gsaweb.ast.cam.ac.uk/followup/',
-            secondary=True)
-        catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, oldname,
-                                           sec_source)
-        unit_deg = 'floatdegrees'
-        catalog.entries[name].add_quantity(
-            SUPERNOVA.RA,
-            str(alertindex[ii][SUPERNOVA.RA]),
-            sec_source,
-            u_value=unit_deg)
-        catalog.entries[name].add_quantity(
-            SUPERNOVA.DEC,
-            str(alertindex[ii][SUPERNOVA.DEC]),
-            sec_source,
-            u_value=unit_deg)
-
-        alerturl = ('http://gsaweb.ast.cam.ac.uk/'
-                    'followup/get_alert_lc_data?alert_id=' + str(ai))
-        source = catalog.entries[name].add_source(
-            name='CPCS Alert ' + str(ai), url=alerturl)
-        fname = os.path.join(catalog.get_current_task_repo(),
-                             'CPCS/alert-') + str(ai).zfill(2) + '.json'
-
-        jsonstr = catalog.load_url(
-            alerturl + '&hashtag=JG_530ad9462a0b8785bfb385614bf178c6', fname)
-
-        try:
-            cpcsalert = json.loads(jsonstr)
-        except Exception:
-            catalog.log.warning('Mangled CPCS data for alert {}.'.format(ai))
+        name = _cpcs_name(alert)
+        # Only add events that are classified as SN.
+        if name is None or catalog.get_name_for_entry_or_alias(name) is None:
             continue
-
-        mjds = [round_sig(xx, sig=9) for xx in cpcsalert['mjd']]
-        mags = [round_sig(xx, sig=6) for xx in cpcsalert['mag']]
-        errs = [round_sig(
-            xx, sig=6) if (is_number(xx) and float(xx) > 0.0) else ''
-            for xx in cpcsalert['magerr']]
-        bnds = cpcsalert['filter']
-        obs = cpcsalert['observatory']
-        for mi, mjd in enumerate(mjds):
-            catalog.entries[name].add_photometry(
-                time=mjd,
-                u_time='MJD',
-                magnitude=mags[mi],
-                e_magnitude=errs[mi],
-                band=bnds[mi],
-                observatory=obs[mi],
-                source=uniq_cdl([source, sec_source]))
-        if catalog.args.update:
-            catalog.journal_entries()
+        pending.append((alert, name, path, fingerprint))
         if catalog.args.travis and ii >= catalog.TRAVIS_QUERY_LIMIT:
             break
+    catalog.log.info('{} of {} CPCS alerts to import.'.format(
+        len(pending), len(alertindex)))
 
+    for bi in pbar(range(0, len(pending), CPCS_FETCH_BATCH), task_str):
+        batch = pending[bi:bi + CPCS_FETCH_BATCH]
+        fetch = [ii for ii, (alert, name, path, fingerprint) in enumerate(
+            batch) if state.get(str(alert['id']), {}).get('row') !=
+            fingerprint or not os.path.isfile(os.path.join(task_repo, path))]
+        fetched = dict(zip(fetch, catalog.fetch_many(
+            [_cpcs_alert_url(batch[ii][0]['id']) + '&hashtag=' + CPCS_HASHTAG
+             for ii in fetch], [batch[ii][2] for ii in fetch])))
+        for ii, (alert, name, path, fingerprint) in enumerate(batch):
+            ai = str(alert['id'])
+            current = True
+            if ii in fetched:
+                jsonstr = fetched[ii].text
+                current = fetched[ii].ok
+            else:
+                with open(os.path.join(task_repo, path), 'r') as ff:
+                    jsonstr = ff.read()
+            if jsonstr is None:
+                continue
+            try:
+                cpcsalert = json.loads(jsonstr)
+            except Exception:
+                catalog.log.warning(
+                    'Mangled CPCS data for alert {}.'.format(ai))
+                continue
+            mjds = [xx for xx in cpcsalert['mjd'] if xx is not None]
+            lcstate = {
+                'row': fingerprint,
+                'points': len(cpcsalert['mjd']),
+                'last_mjd': max(mjds) if mjds else None,
+                'hash': md5(jsonstr.encode('utf-8')).hexdigest()
+            }
+            photometry = not (catalog.args.update and state.get(
+                ai, {}).get('hash') == lcstate['hash'])
+            _add_cpcs_alert(catalog, alert, name,
+                            cpcsalert if photometry else None)
+            # A light curve read from the cache after a failed download
+            # may be stale: it is fetched again next time
+            if current:
+                state[ai] = lcstate
+        catalog.journal_entries()
+
+    atomic_write(state_path, json.dumps(
+        state, indent='\t', separators=(',', ':'), sort_keys=True))
     catalog.journal_entries()
     return
+
+
+def _cpcs_alert_url(ai):
+    return CPCS_URL + 'get_alert_lc_data?alert_id=' + str(ai)
+
+
+def _cpcs_name(alert):
+    """Return the name of the supernova of an index record, or `None`."""
+    name = alert['ivorn'].split('/')[-1].strip()
+    # Skip aa few weird entries
+    if name == 'ASASSNli':
+        return None
+    # Just use aa whitelist for now since naming seems inconsistent
+    white_list = [
+        'GAIA', 'OGLE', 'ASASSN', 'MASTER', 'OTJ', 'PS1', 'IPTF', 'CSS']
+    if True not in [xx in name.upper() for xx in white_list]:
+        return None
+    name = name.replace('Verif', '').replace('_', ' ')
+    if 'ASASSN' in name and name[6] != '-':
+        name = 'ASASSN-' + name[6:].lower()
+    if 'MASTEROTJ' in name:
+        name = name.replace('MASTEROTJ', 'MASTER OT J')
+    if 'OTJ' in name:
+        name = name.replace('OTJ', 'MASTER OT J')
+    if name.upper().startswith('IPTF'):
+        name = 'iPTF' + name[4:].lower()
+    if name.upper().startswith('PS1'):
+        name = 'PS1' + name[3:].lower()
+    return name
+
+
+def _add_cpcs_alert(catalog, alert, oldname, cpcsalert):
+    """Add the alert of index record `alert`, and the photometry of its
+    light curve `cpcsalert` if not `None`.
+    """
+    name = catalog.add_entry(oldname)
+    ai = alert['id']
+
+    sec_source = catalog.entries[name].add_source(
+        name='Cambridge Photometric Calibration Server',
+        url=CPCS_URL,
+        secondary=True)
+    catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, oldname, sec_source)
+    unit_deg = 'floatdegrees'
+    catalog.entries[name].add_quantity(
+        SUPERNOVA.RA, str(alert[SUPERNOVA.RA]), sec_source, u_value=unit_deg)
+    catalog.entries[name].add_quantity(
+        SUPERNOVA.DEC, str(alert[SUPERNOVA.DEC]), sec_source,
+        u_value=unit_deg)
+
+    source = catalog.entries[name].add_source(
+        name='CPCS Alert ' + str(ai), url=_cpcs_alert_url(ai))
+    if cpcsalert is None:
+        return
+
+    mjds = [None if xx is None else round_sig(xx, sig=9)
+            for xx in cpcsalert['mjd']]
+    mags = [None if xx is None else round_sig(xx, sig=6)
+            for xx in cpcsalert['mag']]
+    errs = [round_sig(
+        xx, sig=6) if (is_number(xx) and float(xx) > 0.0) else ''
+        for xx in cpcsalert['magerr']]
+    catalog.entries[name].add_photometry_many({
+        PHOTOMETRY.TIME: mjds,
+        PHOTOMETRY.U_TIME: 'MJD',
+        PHOTOMETRY.MAGNITUDE: mags,
+        PHOTOMETRY.E_MAGNITUDE: errs,
+        PHOTOMETRY.BAND: cpcsalert['filter'],
+        PHOTOMETRY.OBSERVATORY: cpcsalert['observatory']
+    }, source=uniq_cdl([source, sec_source]))
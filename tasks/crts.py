@@ -1,20 +1,43 @@
 """Import tasks for the Catalina Real-Time Transient Survey."""
+import json
 import os
 import re
+from hashlib import md5
 
 from astrocats.utils import is_number, pbar
 from astrocats.structures.struct import PHOTOMETRY
-from bs4 import BeautifulSoup
 
 from decimal import Decimal
 
 from ..supernova import SUPERNOVA
+from ..utils import atomic_write, extract_rows
+
+# Number of light-curve pages downloaded per concurrent batch.
+CRTS_FETCH_BATCH = 32
+CRTS_SOURCE = {
+    'name': 'Catalina Sky Survey',
+    'bibcode': '2009ApJ...696..870D',
+    'url': 'http://nesssi.cacr.caltech.edu/catalina/AllSN.html'
+}
 
 
 def do_crts(catalog):
-    """Import data from the Catalina Real-Time Transient Survey."""
+    """Import data from the Catalina Real-Time Transient Survey.
+
+    The light-curve pages of the objects of every listing are downloaded
+    concurrently.  `CRTS/lc-state.json` keeps a fingerprint of the listing
+    row of every object whose light curve was read: objects with an
+    unchanged row have their light curve read from the cache, and are
+    skipped altogether in update mode.
+    """
     crtsnameerrors = ['2011ax']
     task_str = catalog.get_current_task_str()
+    state_path = os.path.join(catalog.get_current_task_repo(), 'CRTS',
+                              'lc-state.json')
+    seen = {}
+    if os.path.isfile(state_path):
+        with open(state_path, 'r') as ff:
+            seen = json.load(ff)
     folders = ['catalina', 'MLS', 'MLS', 'SSS']
     files = ['AllSN.html', 'AllSN.arch.html', 'CRTSII_SN.html', 'AllSN.html']
     for fi, fold in enumerate(pbar(folders, task_str)):
@@ -23,13 +46,11 @@ def do_crts(catalog):
         fpath = os.path.join(catalog.get_current_task_repo(), 'CRTS', fname)
         arch_flag = ('arch' in files[fi])
         html = catalog.load_url(url, fpath, archived_mode=arch_flag)
-        html = html.replace('<ahref=', '<a href=')
         if not html:
             continue
-        bs = BeautifulSoup(html, 'html5lib')
-        trs = bs.findAll('tr')
-        for tri, tr in enumerate(pbar(trs, task_str)):
-            tds = tr.findAll('td')
+        rows = extract_rows(html)
+        pending = []
+        for tri, tds in enumerate(pbar(rows, task_str)):
             if not tds:
                 continue
             # refs = []
@@ -42,20 +63,28 @@ def do_crts(catalog):
             # ctype = ''
             for tdi, td in enumerate(tds):
                 if tdi == 0:
-                    crtsname = td.contents[0].text.strip()
+                    crtsname = td.parts[0].strip()
                 elif tdi == 1:
-                    ra = td.contents[0]
+                    ra = td.parts[0]
                 elif tdi == 2:
-                    dec = td.contents[0]
+                    dec = td.parts[0]
                 elif tdi == (8 if files[fi] == 'CRTSII_SN.html' else 11):
-                    lclink = td.find('a')['onclick']
+                    lclink = td.links[0].attrs['onclick']
                     lclink = lclink.split("'")[1]
                 elif tdi == (10 if files[fi] == 'CRTSII_SN.html' else 13):
-                    aliases = td.contents[-1].strip()
+                    aliases = td.parts[-1].strip()
                     aliases = re.sub('[()]', '', re.sub('<[^<]+?>', '', aliases))
                     aliases = aliases.split(' ')
                     aliases = [xx.strip('; ') for xx in list(filter(None, aliases))]
 
+            lcpath = os.path.join(
+                fold, lclink.split('.')[-2].rstrip('p').split('/')[-1] +
+                '.html')
+            fingerprint = md5('\t'.join(
+                td.text for td in tds).encode('utf-8')).hexdigest()
+            if catalog.args.update and seen.get(lcpath) == fingerprint:
+                continue
+
             name = ''
             hostmag = ''
             hostupper = False
@@ -93,9 +122,7 @@ def do_crts(catalog):
             if not name:
                 name = crtsname
 
-            name, source = catalog.new_entry(
-                name, name='Catalina Sky Survey', bibcode='2009ApJ...696..870D',
-                url='http://nesssi.cacr.caltech.edu/catalina/AllSN.html')
+            name, source = catalog.new_entry(name, **CRTS_SOURCE)
 
             catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, source)
             for alias in validaliases:
@@ -123,55 +150,91 @@ def do_crts(catalog):
                 }
                 catalog.entries[name].add_photometry(**photodict)
 
-            fname2 = (catalog.get_current_task_repo() + '/' + fold + '/' +
-                      lclink.split('.')[-2].rstrip('p').split('/')[-1] +
-                      '.html')
-
-            html2 = catalog.load_url(lclink, fname2)
-            if not html2:
-                continue
-
-            lines = html2.splitlines()
-            teles = 'Catalina Schmidt'
-            for line in lines:
-                if 'javascript:showx' in line:
-                    search = re.search("showx\('(.*?)'\)", line)
-                    if not search:
-                        continue
-                    mjdstr = search.group(1).split('(')[0].strip()
-                    if not is_number(mjdstr):
-                        continue
-                    mjd = str(Decimal(mjdstr) + Decimal(53249.0))
-                else:
-                    continue
-                mag = ''
-                err = ''
-                if 'javascript:showy' in line:
-                    mag = re.search("showy\('(.*?)'\)", line).group(1)
-                if 'javascript:showz' in line:
-                    err = re.search("showz\('(.*?)'\)", line).group(1)
-                if not is_number(mag) or (err and not is_number(err)):
-                    continue
-                photodict = {
-                    PHOTOMETRY.TIME: mjd,
-                    PHOTOMETRY.U_TIME: 'MJD',
-                    PHOTOMETRY.E_TIME: '0.125',  # 3 hr error
-                    PHOTOMETRY.BAND: 'C',
-                    PHOTOMETRY.MAGNITUDE: mag,
-                    PHOTOMETRY.SOURCE: source,
-                    PHOTOMETRY.INCLUDES_HOST: True,
-                    PHOTOMETRY.TELESCOPE: teles
-                }
-                if float(err) > 0.0:
-                    photodict[PHOTOMETRY.E_MAGNITUDE] = err
-                if float(err) == 0.0:
-                    photodict[PHOTOMETRY.UPPER_LIMIT] = True
-                catalog.entries[name].add_photometry(**photodict)
-            if catalog.args.update:
-                catalog.journal_entries()
+            pending.append((name, lclink, lcpath, fingerprint))
 
             if catalog.args.travis and tri > catalog.TRAVIS_QUERY_LIMIT:
                 break
 
+        _add_crts_light_curves(catalog, pending, seen)
+
+    atomic_write(state_path, json.dumps(
+        seen, indent='\t', separators=(',', ':'), sort_keys=True))
     catalog.journal_entries()
     return
+
+
+def _add_crts_light_curves(catalog, pending, seen):
+    """Add the light curves of the (name, link, path, fingerprint) objects
+    in `pending`, downloading the pages of new or changed objects.
+
+    Entries are journaled after every batch, which turns all of them into
+    stubs, including those of later batches: each entry is loaded again
+    before its photometry is added.  Objects whose page could not be
+    downloaded are read from the cache, but their fingerprint is not saved.
+    """
+    task_str = catalog.get_current_task_str()
+    task_repo = catalog.get_current_task_repo()
+    for bi in pbar(range(0, len(pending), CRTS_FETCH_BATCH), task_str,
+                   leave=False):
+        batch = pending[bi:bi + CRTS_FETCH_BATCH]
+        fetch = [ii for ii, obj in enumerate(batch)
+                 if seen.get(obj[2]) != obj[3] or
+                 not os.path.isfile(os.path.join(task_repo, obj[2]))]
+        fetched = dict(zip(fetch, catalog.fetch_many(
+            [batch[ii][1] for ii in fetch], [batch[ii][2] for ii in fetch])))
+        for ii, (name, lclink, lcpath, fingerprint) in enumerate(batch):
+            current = True
+            if ii in fetched:
+                html2 = fetched[ii].text
+                current = fetched[ii].ok
+            else:
+                with open(os.path.join(task_repo, lcpath), 'r') as ff:
+                    html2 = ff.read()
+            if not html2:
+                continue
+            name = catalog.add_entry(name)
+            source = catalog.entries[name].add_source(**CRTS_SOURCE)
+            _add_crts_photometry(catalog, name, source, html2)
+            if current:
+                seen[lcpath] = fingerprint
+        catalog.journal_entries()
+
+
+def _add_crts_photometry(catalog, name, source, html2):
+    """Add the photometry of a CRTS light-curve page."""
+    lines = html2.splitlines()
+    teles = 'Catalina Schmidt'
+    for line in lines:
+        if 'javascript:showx' in line:
+            search = re.search("showx\('(.*?)'\)", line)
+            if not search:
+                continue
+            mjdstr = search.group(1).split('(')[0].strip()
+            if not is_number(mjdstr):
+                continue
+            mjd = str(Decimal(mjdstr) + Decimal(53249.0))
+        else:
+            continue
+        mag = ''
+        err = ''
+        if 'javascript:showy' in line:
+            mag = re.search("showy\('(.*?)'\)", line).group(1)
+        if 'javascript:showz' in line:
+            err = re.search("showz\('(.*?)'\)", line).group(1)
+        if not is_number(mag) or (err and not is_number(err)):
+            continue
+        photodict = {
+            PHOTOMETRY.TIME: mjd,
+            PHOTOMETRY.U_TIME: 'MJD',
+            PHOTOMETRY.E_TIME: '0.125',  # 3 hr error
+            PHOTOMETRY.BAND: 'C',
+            PHOTOMETRY.MAGNITUDE: mag,
+            PHOTOMETRY.SOURCE: source,
+            PHOTOMETRY.INCLUDES_HOST: True,
+            PHOTOMETRY.TELESCOPE: teles
+        }
+        if float(err) > 0.0:
+            photodict[PHOTOMETRY.E_MAGNITUDE] = err
+        if float(err) == 0.0:
+            photodict[PHOTOMETRY.UPPER_LIMIT] = True
+        catalog.entries[name].add_photometry(**photodict)
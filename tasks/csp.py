@@ -1,18 +1,18 @@
 """Imported tasks for the Carnegie Supernova Program."""
 import csv
 import os
-import warnings
 from decimal import Decimal
 from glob import glob
+from itertools import islice
 
-from astropy.utils.exceptions import AstropyUserWarning
 # from astropy.time import Time as astrotime
 
 from astrocats.structures.struct import SPECTRUM
 from astrocats.utils import is_number, jd_to_mjd, pbar, astrotime
 
 from ..supernova import SUPERNOVA
-from ..utils import clean_snname
+from ..utils import (clean_snname, load_spectrum_text, parse_in_pool,
+                     read_fits_spectrum)
 
 
 def do_csp_photo(catalog):
@@ -70,13 +70,16 @@ def do_csp_spectra(catalog):
     """Import CSP spectra."""
     oldname = ''
     task_str = catalog.get_current_task_str()
-    file_names = glob(os.path.join(catalog.get_current_task_repo(), 'CSP/*'))
-    for fi, fname in enumerate(pbar(file_names, task_str, sort=True)):
+    file_names = sorted(glob(os.path.join(catalog.get_current_task_repo(), 'CSP/*')),
+                        key=lambda s: s.lower())
+    if catalog.args.travis:
+        file_names = file_names[:catalog.TRAVIS_QUERY_LIMIT + 1]
+    file_names = [x for x in file_names if os.path.basename(x).split('.')[1] != 'txt']
+    results = parse_in_pool(catalog, _parse_csp_spectrum, [(x,) for x in file_names])
+    for fname, (header, specdata) in zip(file_names, pbar(results, task_str,
+                                                          total=len(file_names))):
         filename = os.path.basename(fname)
-        sfile = filename.split('.')
-        if sfile[1] == 'txt':
-            continue
-        sfile = sfile[0]
+        sfile = filename.split('.')[0]
         fileparts = sfile.split('_')
         name = 'SN20' + fileparts[0][2:]
         # Look for existing name if already added
@@ -93,23 +96,13 @@ def do_csp_spectra(catalog):
             bibcode='2013ApJ...773...53F')
         catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, source)
 
-        data = csv.reader(open(fname, 'r'), delimiter=' ',
-                          skipinitialspace=True)
-        specdata = []
-        for r, row in enumerate(data):
-            if row[0] == '#JDate_of_observation:':
-                jd = row[1].strip()
-                time = str(jd_to_mjd(Decimal(jd)))
-            elif row[0] == '#Redshift:':
-                catalog.entries[name].add_quantity(SUPERNOVA.REDSHIFT,
-                                                   row[1].strip(),
-                                                   source)
-            if r < 7:
-                continue
-            specdata.append(list(filter(None, [x.strip(' ') for x in row])))
-        specdata = [list(i) for i in zip(*specdata)]
-        wavelengths = specdata[0]
-        fluxes = specdata[1]
+        if '#JDate_of_observation:' in header:
+            time = str(jd_to_mjd(Decimal(header['#JDate_of_observation:'])))
+        if '#Redshift:' in header:
+            catalog.entries[name].add_quantity(SUPERNOVA.REDSHIFT,
+                                               header['#Redshift:'], source)
+        wavelengths = specdata[0].tolist()
+        fluxes = specdata[1].tolist()
 
         catalog.entries[name].add_spectrum(
             u_wavelengths='Angstrom', u_fluxes='erg/s/cm^2/Angstrom',
@@ -117,16 +110,12 @@ def do_csp_spectra(catalog):
             time=time, wavelengths=wavelengths, fluxes=fluxes,
             telescope=telescope, instrument=instrument,
             source=source, deredshifted=True, filename=filename)
-        if catalog.args.travis and fi >= catalog.TRAVIS_QUERY_LIMIT:
-            break
 
     catalog.journal_entries()
     return
 
 
 def do_csp_fits_spectra(catalog):
-    from astropy.io import fits
-
     fpath = catalog.get_current_task_repo()
 
     fureps = {'erg/cm2/s/A': 'erg/s/cm^2/Angstrom'}
@@ -135,76 +124,49 @@ def do_csp_fits_spectra(catalog):
     files = []
     for dir in dirs:
         files.extend(glob(os.path.join(dir, '*.fits')))
-    for datafile in pbar(files, task_str):
+    results = parse_in_pool(catalog, read_fits_spectrum, [(x,) for x in files])
+    for datafile, spectrum in zip(files, pbar(results, task_str, total=len(files))):
         filename = datafile.split('/')[-1]
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore", AstropyUserWarning)
-            hdulist = fits.open(datafile)
-        for oi, obj in enumerate(hdulist[0].header):
-            if any(x in ['.', '/'] for x in obj):
-                del (hdulist[0].header[oi])
-        try:
-            hdulist[0].verify('silentfix')
-        except Exception as e:
-            print(e)
-        hdrkeys = list(hdulist[0].header.keys())
-        # print(hdrkeys)
+        if spectrum is None:
+            catalog.log.warning('Skipping FITS spectrum `{}`.'.format(filename))
+            continue
+        if spectrum['verify']:
+            catalog.log.warning(spectrum['verify'])
+        header = spectrum['header']
         name = datafile.split('/')[-2]
         if name[2] == '9':
             name = 'SN19' + name[2:]
         elif name != 'SN210':
             name = 'SN20' + name[2:]
         name, source = catalog.new_entry(name, bibcode='2017ApJ...850...89G')
-        # for key in hdulist[0].header.keys():
-        #     print(key, hdulist[0].header[key])
         mjd = None
-        if hdulist[0].header['SIMPLE']:
-            if 'JD' in hdrkeys:
-                mjd = str(jd_to_mjd(Decimal(str(hdulist[0].header['JD']))))
-            elif 'MJD' in hdrkeys:
-                mjd = str(hdulist[0].header['MJD'])
-            elif 'DATE-OBS' in hdrkeys or 'DATE' in hdrkeys:
-                dkey = 'DATE-OBS' if 'DATE-OBS' in hdrkeys else 'DATE'
-                dval = hdulist[0].header[dkey]
-                if is_number(dval):
-                    dkey = 'DATE' if dkey == 'DATE-OBS' else 'DATE-OBS'
-                    dval = hdulist[0].header[dkey]
-                dateobs = None
-                if 'T' in dval:
-                    dateobs = dval.strip()
-                elif 'UTC-OBS' in hdrkeys:
-                    dateobs = dval.strip(
-                    ) + 'T' + hdulist[0].header['UTC-OBS'].strip()
-                if dateobs is not None:
-                    mjd = astrotime(dateobs, input='isot', output='mjd', to_str=True)
-            # print(hdulist[0].header)
-            if 'CRVAL1' in hdulist[0].header:
-                w0 = hdulist[0].header['CRVAL1']
-            elif hdulist[0].header['CTYPE1'] == 'MULTISPE':
-                w0 = float(hdulist[0].header['WAT2_001'].split(
-                    '"')[-1].split()[3])
-            else:
-                raise ValueError('Unsupported spectrum format.')
-            if hdulist[0].header['NAXIS'] == 1:
-                wd = hdulist[0].header['CDELT1']
-                fluxes = [str(x) for x in list(hdulist[0].data)]
-                errors = False
-            elif hdulist[0].header['NAXIS'] == 3:
-                wd = hdulist[0].header['CD1_1']
-                fluxes = [str(x) for x in list(hdulist[0].data)[0][0]]
-                errors = [str(x) for x in list(hdulist[0].data)[-1][0]]
-            else:
-                print('Warning: Skipping FITS spectrum `{}`.'.format(filename))
-                continue
-            waves = [str(w0 + wd * x) for x in range(0, len(fluxes))]
-        else:
-            raise ValueError('Non-simple FITS import not yet supported.')
-        if 'BUNIT' in hdrkeys:
-            fluxunit = hdulist[0].header['BUNIT']
+        if 'JD' in header:
+            mjd = str(jd_to_mjd(Decimal(str(header['JD']))))
+        elif 'MJD' in header:
+            mjd = str(header['MJD'])
+        elif 'DATE-OBS' in header or 'DATE' in header:
+            dkey = 'DATE-OBS' if 'DATE-OBS' in header else 'DATE'
+            dval = header[dkey]
+            if is_number(dval):
+                dkey = 'DATE' if dkey == 'DATE-OBS' else 'DATE-OBS'
+                dval = header[dkey]
+            dateobs = None
+            if 'T' in dval:
+                dateobs = dval.strip()
+            elif 'UTC-OBS' in header:
+                dateobs = dval.strip() + 'T' + header['UTC-OBS'].strip()
+            if dateobs is not None:
+                mjd = astrotime(dateobs, input='isot', output='mjd', to_str=True)
+        waves = spectrum['wavelengths'].astype(str).tolist()
+        fluxes = spectrum['fluxes'].astype(str).tolist()
+        errors = (spectrum['errors'].astype(str).tolist()
+                  if spectrum['errors'] is not None else False)
+        if 'BUNIT' in header:
+            fluxunit = header['BUNIT']
             if fluxunit in fureps:
                 fluxunit = fureps[fluxunit]
         else:
-            if max([float(x) for x in fluxes]) < 1.0e-5:
+            if spectrum['fluxes'].max() < 1.0e-5:
                 fluxunit = 'erg/s/cm^2/Angstrom'
             else:
                 fluxunit = 'Uncalibrated'
@@ -219,12 +181,12 @@ def do_csp_fits_spectra(catalog):
         if mjd is not None:
             specdict[SPECTRUM.TIME] = mjd
             specdict[SPECTRUM.U_TIME] = 'MJD'
-        if 'TELESCOP' in hdrkeys:
-            specdict[SPECTRUM.TELESCOPE] = str(hdulist[0].header['TELESCOP'])
-        if 'INSTRUME' in hdrkeys:
-            specdict[SPECTRUM.INSTRUMENT] = hdulist[0].header['INSTRUME']
-        if 'AIRMASS' in hdrkeys:
-            airmass = hdulist[0].header['AIRMASS']
+        if 'TELESCOP' in header:
+            specdict[SPECTRUM.TELESCOPE] = str(header['TELESCOP'])
+        if 'INSTRUME' in header:
+            specdict[SPECTRUM.INSTRUMENT] = header['INSTRUME']
+        if 'AIRMASS' in header:
+            airmass = header['AIRMASS']
             try:
                 float(airmass)
             except:
@@ -239,16 +201,26 @@ def do_csp_fits_spectra(catalog):
         if errors:
             specdict[SPECTRUM.ERRORS] = errors
             specdict[SPECTRUM.U_ERRORS] = fluxunit
-        if 'SITENAME' in hdrkeys:
-            specdict[SPECTRUM.OBSERVATORY] = hdulist[0].header['SITENAME']
-        elif 'OBSERVAT' in hdrkeys:
-            specdict[SPECTRUM.OBSERVATORY] = hdulist[0].header['OBSERVAT']
-        if 'OBSERVER' in hdrkeys:
-            obs = hdulist[0].header['OBSERVER']
+        if 'SITENAME' in header:
+            specdict[SPECTRUM.OBSERVATORY] = header['SITENAME']
+        elif 'OBSERVAT' in header:
+            specdict[SPECTRUM.OBSERVATORY] = header['OBSERVAT']
+        if 'OBSERVER' in header:
+            obs = header['OBSERVER']
             if len(obs) > 0:
                 specdict[SPECTRUM.OBSERVER] = obs
 
         catalog.entries[name].add_spectrum(**specdict)
-        hdulist.close()
         catalog.journal_entries()
     return
+
+
+def _parse_csp_spectrum(path):
+    """Header values (by keyword) and columns of a CSP spectrum file."""
+    header = {}
+    with open(path, 'r') as f:
+        for row in csv.reader(islice(f, 7), delimiter=' ',
+                              skipinitialspace=True):
+            if len(row) > 1:
+                header[row[0]] = row[1].strip()
+    return header, load_spectrum_text(path, skip_rows=7)
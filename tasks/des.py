@@ -3,12 +3,11 @@
 import json
 import os
 
-from bs4 import BeautifulSoup
-
 from astrocats.structures.struct import PHOTOMETRY
 from astrocats.utils import pbar
 
 from ..supernova import SUPERNOVA
+from ..utils import extract_tables
 
 
 def do_des(catalog):
@@ -23,25 +22,19 @@ def do_des(catalog):
     html = catalog.load_url(des_trans_url, des_path + 'transients.html')
     if not html:
         return
-    bs = BeautifulSoup(html, 'html5lib')
-    trs = bs.find('tbody').findAll('tr')
-    for tri, tr in enumerate(pbar(trs, task_str)):
+    rows = extract_tables(html, sections=('tbody',))[0]
+    for tri, tds in enumerate(pbar(rows, task_str)):
         name = ''
         # source = ''
         if tri == 0:
             continue
-        tds = tr.findAll('td')
         for tdi, td in enumerate(tds):
             if tdi == 0:
                 name = catalog.add_entry(td.text.strip())
             if tdi == 1:
                 (ra, dec) = [xx.strip() for xx in td.text.split('\xa0')]
             if tdi == 6:
-                atellink = td.find('a')
-                if atellink:
-                    atellink = atellink['href']
-                else:
-                    atellink = ''
+                atellink = td.href or ''
 
         sources = [
             catalog.entries[name].add_source(
@@ -2,6 +2,7 @@
 import csv
 import json
 import os
+from collections import OrderedDict
 from decimal import Decimal
 from glob import glob
 from math import floor, isnan
@@ -12,7 +13,8 @@ from astrocats.utils import (get_sig_digits, is_number, jd_to_mjd,
                              pbar, pretty_num, rep_chars, astrotime)
 from astropy.io.ascii import read
 
-from supernovae import utils as sn_utils
+from ..utils import (mags_from_counts, parse_in_pool, points_to_columns,
+                     read_rows)
 from ..supernova import SUPERNOVA
 
 
@@ -32,36 +34,15 @@ def do_donated_photo(catalog):
         metadict = json.loads(f.read())
     pattern = os.path.join(
         catalog.get_current_task_repo(), 'Donations', 'Ponder-05-12-17', '*.dat')
-    file_names = glob(pattern)
-    for path in file_names:
-        with open(path, 'r') as f:
-            tsvin = list(csv.reader(f, delimiter=' ', skipinitialspace=True))
+    file_names = sorted(glob(pattern))
+    results = parse_in_pool(
+        catalog, _parse_ponder, [(path,) for path in file_names])
+    for path, columns in zip(file_names, pbar(
+            results, task_str + ': Ponder', total=len(file_names))):
         oname = path.split('/')[-1].split('.')[0]
         name, source = catalog.new_entry(oname, bibcode=metadict[oname]['bibcode'])
-        for row in pbar(tsvin, task_str + ': Ponder ' + oname):
-            if row[0][0] == '#' or not is_number(row[-1]):
-                continue
-            mjd = row[1]
-            bandinst = row[2].split('_')
-            band = bandinst[0]
-            inst = ''
-            if len(bandinst) > 1:
-                inst = bandinst[1]
-            mag = row[3]
-            uerr = row[4]
-            lerr = row[5]
-            photodict = {
-                PHOTOMETRY.TIME: mjd,
-                PHOTOMETRY.U_TIME: 'MJD',
-                PHOTOMETRY.BAND: band,
-                PHOTOMETRY.MAGNITUDE: mag,
-                PHOTOMETRY.E_LOWER_MAGNITUDE: lerr,
-                PHOTOMETRY.E_UPPER_MAGNITUDE: uerr,
-                PHOTOMETRY.SOURCE: source
-            }
-            if len(inst) > 0:
-                photodict[PHOTOMETRY.INSTRUMENT] = inst
-            catalog.entries[name].add_photometry(**photodict)
+        columns[PHOTOMETRY.U_TIME] = 'MJD'
+        catalog.entries[name].add_photometry_many(columns, source=source)
 
     # Benetti 03-08-17 donation
     path = os.path.join(catalog.get_current_task_repo(), 'Donations',
@@ -188,7 +169,6 @@ def do_donated_photo(catalog):
     inpname = os.path.basename(datafile).split('.')[0]
     with open(datafile, 'r') as f:
         tsvin = csv.reader(f, delimiter=' ', skipinitialspace=True)
-        host = False
         for ri, row in enumerate(tsvin):
             if ri == 0:
                 continue
@@ -229,77 +209,33 @@ def do_donated_photo(catalog):
     file_names = glob(
         os.path.join(catalog.get_current_task_repo(), 'Donations',
                      'Nugent-01-09-17', '*.dat'))
-    for datafile in pbar(file_names, task_str + ': Nugent-01-09-17', sort=True):
+    file_names = sorted(file_names, key=lambda s: s.lower())
+    results = parse_in_pool(
+        catalog, _parse_nugent, [(path,) for path in file_names])
+    for datafile, columns in zip(file_names, pbar(
+            results, task_str + ': Nugent-01-09-17', total=len(file_names))):
         inpname = os.path.basename(datafile).split('.')[0]
         (name, source) = catalog.new_entry(
             inpname, bibcode='2006ApJ...645..841N')
-        with open(datafile, 'r') as f:
-            tsvin = csv.reader(f, delimiter=' ', skipinitialspace=True)
-            host = False
-            for urow in tsvin:
-                row = list(filter(None, urow))
-                counts = row[2]
-                e_counts = row[3]
-                zp = row[4]
-                photodict = {
-                    PHOTOMETRY.BAND: row[1],
-                    PHOTOMETRY.TIME: row[0],
-                    PHOTOMETRY.U_TIME: 'MJD',
-                    PHOTOMETRY.COUNT_RATE: counts,
-                    PHOTOMETRY.E_COUNT_RATE: e_counts,
-                    PHOTOMETRY.ZERO_POINT: zp,
-                    PHOTOMETRY.TELESCOPE: 'CFHT',
-                    PHOTOMETRY.SURVEY: 'SNLS',
-                    PHOTOMETRY.SOURCE: source
-                }
-                sn_utils.set_pd_mag_from_counts(
-                    photodict, counts, ec=e_counts, zp=zp, sig=5.0)
-                catalog.entries[name].add_photometry(**photodict)
+        columns[PHOTOMETRY.U_TIME] = 'MJD'
+        columns[PHOTOMETRY.TELESCOPE] = 'CFHT'
+        columns[PHOTOMETRY.SURVEY] = 'SNLS'
+        catalog.entries[name].add_photometry_many(columns, source=source)
 
     # Inserra 09-04-16 donation
     file_names = glob(
         os.path.join(catalog.get_current_task_repo(), 'Donations',
                      'Inserra-09-04-16', '*.txt'))
-    for datafile in pbar(file_names, task_str + ': Inserra-09-04-16', sort=True):
+    file_names = sorted(file_names, key=lambda s: s.lower())
+    results = parse_in_pool(
+        catalog, _parse_inserra, [(path,) for path in file_names])
+    for datafile, columns in zip(file_names, pbar(
+            results, task_str + ': Inserra-09-04-16', total=len(file_names))):
         inpname = os.path.basename(datafile).split('.')[0]
         (name, source) = catalog.new_entry(
             inpname, bibcode='2013ApJ...770..128I')
-        with open(datafile, 'r') as f:
-            tsvin = csv.reader(f, delimiter=' ', skipinitialspace=True)
-            host = False
-            for row in tsvin:
-                if row[0][0] == '#':
-                    if row[0] == '#Host':
-                        host = True
-                        continue
-                    host = False
-                    bands = row[3:-1]
-                    continue
-                for bi, ba in enumerate(bands):
-                    mag = row[5 + 2 * bi]
-                    if not is_number(mag):
-                        continue
-                    system = 'AB'
-                    if ba in ['U', 'B', 'V', 'R', 'I', 'J', 'H', 'K']:
-                        system = 'Vega'
-                    photodict = {
-                        PHOTOMETRY.TIME: row[3],
-                        PHOTOMETRY.U_TIME: 'MJD',
-                        PHOTOMETRY.BAND: ba,
-                        PHOTOMETRY.MAGNITUDE: mag.strip('< '),
-                        PHOTOMETRY.SOURCE: source,
-                        PHOTOMETRY.SYSTEM: system
-                    }
-                    if 'ATel' not in row[-1]:
-                        photodict[PHOTOMETRY.TELESCOPE] = row[-1]
-                    if host:
-                        photodict[PHOTOMETRY.HOST] = True
-                    if '<' in mag:
-                        photodict[PHOTOMETRY.UPPER_LIMIT] = True
-                    e_mag = row[5 + 2 * bi + 1].strip('() ')
-                    if is_number(e_mag):
-                        photodict[PHOTOMETRY.E_MAGNITUDE] = e_mag
-                    catalog.entries[name].add_photometry(**photodict)
+        columns[PHOTOMETRY.U_TIME] = 'MJD'
+        catalog.entries[name].add_photometry_many(columns, source=source)
 
     # Nicholl 04-01-16 donation
     with open(
@@ -310,9 +246,14 @@ def do_donated_photo(catalog):
     kcorrected = ['SN2011ke', 'SN2011kf', 'SN2012il', 'PTF10hgi', 'PTF11rks']
     ignorephoto = ['PTF10hgi', 'PTF11rks', 'SN2011ke', 'SN2011kf', 'SN2012il']
 
-    file_names = glob(
-        os.path.join(catalog.get_current_task_repo(), 'Donations', 'Nicholl-04-01-16/*.txt'))
-    for datafile in pbar(file_names, task_str + ': Nicholl-04-01-16', sort=True):
+    file_names = sorted(glob(
+        os.path.join(catalog.get_current_task_repo(), 'Donations', 'Nicholl-04-01-16/*.txt')),
+        key=lambda s: s.lower())
+    results = parse_in_pool(catalog, _parse_nicholl_04_01_16, [
+        (datafile, os.path.basename(datafile).split('_')[0])
+        for datafile in file_names
+        if os.path.basename(datafile).split('_')[0] not in ignorephoto])
+    for datafile in pbar(file_names, task_str + ': Nicholl-04-01-16'):
         inpname = os.path.basename(datafile).split('_')[0]
         isk = inpname in kcorrected
         name = catalog.add_entry(inpname)
@@ -328,82 +269,11 @@ def do_donated_photo(catalog):
         catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, inpname, source)
         if inpname in ignorephoto:
             continue
-        with open(datafile, 'r') as f:
-            tsvin = csv.reader(f, delimiter='\t', skipinitialspace=True)
-            rtelescope = None
-            for r, rrow in enumerate(tsvin):
-                row = list(filter(None, rrow))
-                if not row:
-                    continue
-                if row[0] == '#MJD':
-                    bands = [x for x in row[1:] if x and 'err' not in x]
-                elif row[0][0] == '#' and len(row[0]) > 1:
-                    rtelescope = row[0][1:]
-                if row[0][0] == '#':
-                    continue
-                mjd = row[0]
-                if not is_number(mjd):
-                    continue
-                for v, val in enumerate(row[1::2]):
-                    mag = val.strip('>')
-                    if (not is_number(mag) or isnan(float(mag)) or float(mag) > 90.0):
-                        continue
-                    emag = row[2 * v + 2]
-                    upperlimit = ('>' in val) or (is_number(emag) and float(emag) == 0.0)
-                    band = bands[v]
-                    instrument = None
-                    survey = None
-                    system = None
-                    telescope = rtelescope
-                    if telescope == 'LSQ':
-                        instrument = 'QUEST'
-                    elif telescope == 'PS1':
-                        instrument = 'GPC'
-                    elif telescope == 'NTT':
-                        instrument = 'EFOSC'
-                    elif telescope == 'GROND':
-                        instrument = 'GROND'
-                        telescope = 'MPI/ESO 2.2m'
-                    else:
-                        if band == 'NUV':
-                            instrument = 'GALEX'
-                            telescope = 'GALEX'
-                        elif band in ['u', 'g', 'r', 'i', 'z']:
-                            if inpname.startswith('PS1'):
-                                instrument = 'GPC'
-                                telescope = 'PS1'
-                                survey = 'Pan-STARRS'
-                            elif inpname.startswith('PTF'):
-                                telescope = 'P60'
-                                survey = 'PTF'
-                        elif band.upper() in ['UVW2', 'UVW1', 'UVM2']:
-                            instrument = 'UVOT'
-                            telescope = 'Swift'
-                            if inpname in ['PTF12dam']:
-                                system = 'AB'
-                    if inpname in ['SCP-06F6']:
-                        system = 'Vega'
-                    photodict = {
-                        PHOTOMETRY.TIME: mjd,
-                        PHOTOMETRY.U_TIME: 'MJD',
-                        PHOTOMETRY.BAND: band,
-                        PHOTOMETRY.MAGNITUDE: mag,
-                        PHOTOMETRY.UPPER_LIMIT: upperlimit,
-                        PHOTOMETRY.SOURCE: source
-                    }
-                    if instrument is not None:
-                        photodict[PHOTOMETRY.INSTRUMENT] = instrument
-                    if telescope is not None:
-                        photodict[PHOTOMETRY.TELESCOPE] = telescope
-                    if survey is not None:
-                        photodict[PHOTOMETRY.SURVEY] = survey
-                    if system is not None:
-                        photodict[PHOTOMETRY.SYSTEM] = system
-                    if (is_number(emag) and not isnan(float(emag)) and float(emag) > 0.0):
-                        photodict[PHOTOMETRY.E_MAGNITUDE] = emag
-                    if isk:
-                        photodict[PHOTOMETRY.KCORRECTED] = True
-                    catalog.entries[name].add_photometry(**photodict)
+        columns = next(results)
+        columns[PHOTOMETRY.U_TIME] = 'MJD'
+        if isk:
+            columns[PHOTOMETRY.KCORRECTED] = True
+        catalog.entries[name].add_photometry_many(columns, source=source)
 
     catalog.journal_entries()
 
@@ -463,13 +333,16 @@ def do_donated_photo(catalog):
             os.path.join(catalog.get_current_task_repo(), 'Donations',
                          'Galbany-04-18-16/')))[1]
     bibcode = '2016AJ....151...33G'
+    photfiles = OrderedDict((folder, sorted(glob(
+        os.path.join(catalog.get_current_task_repo(), 'Donations',
+                     'Galbany-04-18-16/') + folder + '/*.out*')))
+        for folder in folders)
+    results = parse_in_pool(catalog, _parse_galbany, [
+        (path,) for paths in photfiles.values() for path in paths])
     for folder in folders:
         infofiles = glob(
             os.path.join(catalog.get_current_task_repo(), 'Donations',
                          'Galbany-04-18-16/') + folder + '/*.info')
-        photfiles = glob(
-            os.path.join(catalog.get_current_task_repo(), 'Donations',
-                         'Galbany-04-18-16/') + folder + '/*.out*')
 
         zhel = ''
         zcmb = ''
@@ -529,28 +402,10 @@ def do_donated_photo(catalog):
         catalog.entries[name].add_quantity(
             SUPERNOVA.REDSHIFT, zcmb, source, e_value=zerr, kind='cmb')
 
-        for path in photfiles:
-            with open(path, 'r') as f:
-                band = ''
-                lines = f.read().splitlines()
-                for li, line in enumerate(lines):
-                    if li in [0, 2, 3]:
-                        continue
-                    if li == 1:
-                        band = line.split(':')[-1].strip()
-                    else:
-                        cols = list(filter(None, line.split()))
-                        if not cols:
-                            continue
-                        catalog.entries[name].add_photometry(
-                            time=cols[0],
-                            u_time='MJD',
-                            magnitude=cols[1],
-                            e_magnitude=cols[2],
-                            band=band,
-                            system=cols[3],
-                            telescope=cols[4],
-                            source=source)
+        for path in photfiles[folder]:
+            columns = next(results)
+            columns[PHOTOMETRY.U_TIME] = 'MJD'
+            catalog.entries[name].add_photometry_many(columns, source=source)
     catalog.journal_entries()
 
     # Nicholl 05-03-16
@@ -558,7 +413,10 @@ def do_donated_photo(catalog):
         os.path.join(catalog.get_current_task_repo(), 'Donations',
                      'Nicholl-05-03-16', '*.txt'))
     name = catalog.add_entry('SN2015bn')
-    for fi in pbar(files, task_str + ': Nicholl-05-03-16'):
+    results = parse_in_pool(catalog, _parse_nicholl_05_03_16, [
+        (fi, os.path.basename(fi).split('_')[1]) for fi in files])
+    for fi, columns in zip(files, pbar(
+            results, task_str + ': Nicholl-05-03-16', total=len(files))):
         if 'late' in fi:
             bc = '2016ApJ...828L..18N'
         else:
@@ -566,52 +424,8 @@ def do_donated_photo(catalog):
         source = catalog.entries[name].add_source(bibcode=bc)
         catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, source)
         catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, 'PS15ae', source)
-        telescope = os.path.basename(fi).split('_')[1]
-        with open(fi, 'r') as f:
-            lines = f.read().splitlines()
-            for li, line in enumerate(lines):
-                if not line or (line[0] == '#' and li != 0):
-                    continue
-                cols = list(filter(None, line.split()))
-                if not cols:
-                    continue
-                if li == 0:
-                    bands = cols[1:]
-                    continue
-
-                mjd = cols[0]
-                for ci, col in enumerate(cols[1::2]):
-                    if not is_number(col) or np.isnan(float(col)):
-                        continue
-
-                    band = bands[ci]
-                    band_set = ''
-                    system = 'Vega'
-                    if bands[ci] in ["u'", "g'", "r'", "i'", "z'"]:
-                        band_set = 'SDSS'
-                        system = 'SDSS'
-                    elif telescope == 'ASASSN':
-                        band_set = 'ASASSN'
-                        system = 'Vega'
-                    photodict = {
-                        PHOTOMETRY.TIME: mjd,
-                        PHOTOMETRY.U_TIME: 'MJD',
-                        PHOTOMETRY.MAGNITUDE: col,
-                        PHOTOMETRY.BAND: bands[ci],
-                        PHOTOMETRY.SOURCE: source,
-                        PHOTOMETRY.TELESCOPE: telescope,
-                        PHOTOMETRY.SYSTEM: system
-                    }
-                    if band_set:
-                        photodict[PHOTOMETRY.BAND_SET] = band_set
-                    emag = cols[2 * ci + 2]
-                    if is_number(emag):
-                        photodict[PHOTOMETRY.E_MAGNITUDE] = emag
-                    else:
-                        photodict[PHOTOMETRY.UPPER_LIMIT] = True
-                    if telescope == 'Swift':
-                        photodict[PHOTOMETRY.INSTRUMENT] = 'UVOT'
-                    catalog.entries[name].add_photometry(**photodict)
+        columns[PHOTOMETRY.U_TIME] = 'MJD'
+        catalog.entries[name].add_photometry_many(columns, source=source)
 
     catalog.journal_entries()
     return
@@ -703,3 +517,220 @@ def do_donated_spectra(catalog):
 
     catalog.journal_entries()
     return
+
+
+def _parse_ponder(path):
+    """Photometry columns of a Ponder 05-12-17 light curve."""
+    points = []
+    for row in read_rows(path, ' '):
+        if row[0][0] == '#' or not is_number(row[-1]):
+            continue
+        bandinst = row[2].split('_')
+        points.append({
+            PHOTOMETRY.TIME: row[1],
+            PHOTOMETRY.BAND: bandinst[0],
+            PHOTOMETRY.MAGNITUDE: row[3],
+            PHOTOMETRY.E_LOWER_MAGNITUDE: row[5],
+            PHOTOMETRY.E_UPPER_MAGNITUDE: row[4],
+            PHOTOMETRY.INSTRUMENT: bandinst[1] if len(bandinst) > 1 else None
+        })
+    return points_to_columns(points)
+
+
+def _parse_nugent(path):
+    """Photometry columns of a Nugent 01-09-17 light curve."""
+    rows = [list(filter(None, urow)) for urow in read_rows(path, ' ')]
+    columns = {
+        PHOTOMETRY.BAND: [row[1] for row in rows],
+        PHOTOMETRY.TIME: [row[0] for row in rows],
+        PHOTOMETRY.COUNT_RATE: [row[2] for row in rows],
+        PHOTOMETRY.E_COUNT_RATE: [row[3] for row in rows],
+        PHOTOMETRY.ZERO_POINT: [row[4] for row in rows]
+    }
+    columns.update(mags_from_counts(
+        columns[PHOTOMETRY.COUNT_RATE], columns[PHOTOMETRY.E_COUNT_RATE],
+        zp=columns[PHOTOMETRY.ZERO_POINT], sig=5.0))
+    return columns
+
+
+def _parse_inserra(path):
+    """Photometry columns of an Inserra 09-04-16 light curve."""
+    points = []
+    host = False
+    for row in read_rows(path, ' '):
+        if row[0][0] == '#':
+            if row[0] == '#Host':
+                host = True
+                continue
+            host = False
+            bands = row[3:-1]
+            continue
+        for bi, ba in enumerate(bands):
+            mag = row[5 + 2 * bi]
+            if not is_number(mag):
+                continue
+            system = 'AB'
+            if ba in ['U', 'B', 'V', 'R', 'I', 'J', 'H', 'K']:
+                system = 'Vega'
+            photodict = {
+                PHOTOMETRY.TIME: row[3],
+                PHOTOMETRY.BAND: ba,
+                PHOTOMETRY.MAGNITUDE: mag.strip('< '),
+                PHOTOMETRY.SYSTEM: system
+            }
+            if 'ATel' not in row[-1]:
+                photodict[PHOTOMETRY.TELESCOPE] = row[-1]
+            if host:
+                photodict[PHOTOMETRY.HOST] = True
+            if '<' in mag:
+                photodict[PHOTOMETRY.UPPER_LIMIT] = True
+            e_mag = row[5 + 2 * bi + 1].strip('() ')
+            if is_number(e_mag):
+                photodict[PHOTOMETRY.E_MAGNITUDE] = e_mag
+            points.append(photodict)
+    return points_to_columns(points)
+
+
+def _parse_nicholl_04_01_16(path, inpname):
+    """Photometry columns of a Nicholl 04-01-16 light curve of `inpname`."""
+    points = []
+    rtelescope = None
+    for rrow in read_rows(path, '\t'):
+        row = list(filter(None, rrow))
+        if not row:
+            continue
+        if row[0] == '#MJD':
+            bands = [x for x in row[1:] if x and 'err' not in x]
+        elif row[0][0] == '#' and len(row[0]) > 1:
+            rtelescope = row[0][1:]
+        if row[0][0] == '#':
+            continue
+        mjd = row[0]
+        if not is_number(mjd):
+            continue
+        for v, val in enumerate(row[1::2]):
+            mag = val.strip('>')
+            if (not is_number(mag) or isnan(float(mag)) or float(mag) > 90.0):
+                continue
+            emag = row[2 * v + 2]
+            upperlimit = ('>' in val) or (is_number(emag) and float(emag) == 0.0)
+            band = bands[v]
+            instrument = None
+            survey = None
+            system = None
+            telescope = rtelescope
+            if telescope == 'LSQ':
+                instrument = 'QUEST'
+            elif telescope == 'PS1':
+                instrument = 'GPC'
+            elif telescope == 'NTT':
+                instrument = 'EFOSC'
+            elif telescope == 'GROND':
+                instrument = 'GROND'
+                telescope = 'MPI/ESO 2.2m'
+            else:
+                if band == 'NUV':
+                    instrument = 'GALEX'
+                    telescope = 'GALEX'
+                elif band in ['u', 'g', 'r', 'i', 'z']:
+                    if inpname.startswith('PS1'):
+                        instrument = 'GPC'
+                        telescope = 'PS1'
+                        survey = 'Pan-STARRS'
+                    elif inpname.startswith('PTF'):
+                        telescope = 'P60'
+                        survey = 'PTF'
+                elif band.upper() in ['UVW2', 'UVW1', 'UVM2']:
+                    instrument = 'UVOT'
+                    telescope = 'Swift'
+                    if inpname in ['PTF12dam']:
+                        system = 'AB'
+            if inpname in ['SCP-06F6']:
+                system = 'Vega'
+            photodict = {
+                PHOTOMETRY.TIME: mjd,
+                PHOTOMETRY.BAND: band,
+                PHOTOMETRY.MAGNITUDE: mag,
+                PHOTOMETRY.UPPER_LIMIT: upperlimit,
+                PHOTOMETRY.INSTRUMENT: instrument,
+                PHOTOMETRY.TELESCOPE: telescope,
+                PHOTOMETRY.SURVEY: survey,
+                PHOTOMETRY.SYSTEM: system
+            }
+            if (is_number(emag) and not isnan(float(emag)) and float(emag) > 0.0):
+                photodict[PHOTOMETRY.E_MAGNITUDE] = emag
+            points.append(photodict)
+    return points_to_columns(points)
+
+
+def _parse_galbany(path):
+    """Photometry columns of a Galbany 04-18-16 light curve."""
+    points = []
+    band = ''
+    with open(path, 'r') as f:
+        for li, line in enumerate(f):
+            line = line.rstrip('\n')
+            if li in [0, 2, 3]:
+                continue
+            if li == 1:
+                band = line.split(':')[-1].strip()
+                continue
+            cols = list(filter(None, line.split()))
+            if not cols:
+                continue
+            points.append({
+                PHOTOMETRY.TIME: cols[0],
+                PHOTOMETRY.MAGNITUDE: cols[1],
+                PHOTOMETRY.E_MAGNITUDE: cols[2],
+                PHOTOMETRY.BAND: band,
+                PHOTOMETRY.SYSTEM: cols[3],
+                PHOTOMETRY.TELESCOPE: cols[4]
+            })
+    return points_to_columns(points)
+
+
+def _parse_nicholl_05_03_16(path, telescope):
+    """Photometry columns of a Nicholl 05-03-16 light curve of SN2015bn."""
+    points = []
+    with open(path, 'r') as f:
+        for li, line in enumerate(f):
+            line = line.rstrip('\n')
+            if not line or (line[0] == '#' and li != 0):
+                continue
+            cols = list(filter(None, line.split()))
+            if not cols:
+                continue
+            if li == 0:
+                bands = cols[1:]
+                continue
+
+            mjd = cols[0]
+            for ci, col in enumerate(cols[1::2]):
+                if not is_number(col) or np.isnan(float(col)):
+                    continue
+
+                band_set = ''
+                system = 'Vega'
+                if bands[ci] in ["u'", "g'", "r'", "i'", "z'"]:
+                    band_set = 'SDSS'
+                    system = 'SDSS'
+                elif telescope == 'ASASSN':
+                    band_set = 'ASASSN'
+                    system = 'Vega'
+                photodict = {
+                    PHOTOMETRY.TIME: mjd,
+                    PHOTOMETRY.MAGNITUDE: col,
+                    PHOTOMETRY.BAND: bands[ci],
+                    PHOTOMETRY.TELESCOPE: telescope,
+                    PHOTOMETRY.SYSTEM: system,
+                    PHOTOMETRY.BAND_SET: band_set
+                }
+                emag = cols[2 * ci + 2]
+                if is_number(emag):
+                    photodict[PHOTOMETRY.E_MAGNITUDE] = emag
+                else:
+                    photodict[PHOTOMETRY.UPPER_LIMIT] = True
+                if telescope == 'Swift':
+                    photodict[PHOTOMETRY.INSTRUMENT] = 'UVOT'
+                points.append(photodict)
+    return points_to_columns(points)
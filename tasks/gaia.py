@@ -1,99 +1,171 @@
 """Import tasks for GAIA."""
 import csv
+import json
 import os
 import re
+from hashlib import md5
 
+from astrocats.structures.struct import PHOTOMETRY
 from astrocats.utils import jd_to_mjd, pbar
 
 from decimal import Decimal
 
 from ..supernova import SUPERNOVA
+from ..utils import atomic_write
+
+GAIA_ALERT_URL = 'http://gsaweb.ast.cam.ac.uk/alerts/alert/'
+# Number of light curves downloaded per concurrent batch.
+GAIA_FETCH_BATCH = 32
 
 
 def do_gaia(catalog):
-    """Import from the GAIA alerts page."""
+    """Import from the GAIA alerts page.
+
+    `GAIA/lc-state.json` keeps, for every alert, a hash of its row of the
+    alerts index and a fingerprint of its light curve (number of points,
+    last MJD and a hash of the file).  Only the light curves of new alerts
+    and of alerts whose index row changed are downloaded, concurrently;
+    in update mode the other alerts are skipped altogether, and the
+    photometry of alerts whose light curve is unchanged is not added again.
+    Light curves that fail to download are read from the cache, and their
+    state is left as it was.
+    """
     task_str = catalog.get_current_task_str()
-    fname = os.path.join(catalog.get_current_task_repo(), 'GAIA/alerts.csv')
+    task_repo = catalog.get_current_task_repo()
+    fname = os.path.join(task_repo, 'GAIA/alerts.csv')
     csvtxt = catalog.load_url('http://gsaweb.ast.cam.ac.uk/alerts/alerts.csv',
                               fname)
     if not csvtxt:
         return
+    state_path = os.path.join(task_repo, 'GAIA', 'lc-state.json')
+    state = {}
+    if os.path.isfile(state_path):
+        with open(state_path, 'r') as ff:
+            state = json.load(ff)
     tsvin = list(
         csv.reader(
             csvtxt.splitlines(), delimiter=',', skipinitialspace=True))
-    reference = 'Gaia Photometric Science Alerts'
-    refurl = 'http://gsaweb.ast.cam.ac.uk/alerts/alertsindex'
-    loopcnt = 0
-    for ri, row in enumerate(pbar(tsvin, task_str)):
+    pending = []
+    for ri, row in enumerate(tsvin):
         if ri == 0 or not row:
             continue
-        name = catalog.add_entry(row[0])
-        source = catalog.entries[name].add_source(name=reference, url=refurl)
-        catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, source)
-        year = '20' + re.findall(r'\d+', row[0])[0]
-        catalog.entries[name].add_quantity(SUPERNOVA.DISCOVER_DATE, year,
-                                           source)
-        catalog.entries[name].add_quantity(
-            SUPERNOVA.RA, row[2], source, u_value='floatdegrees')
-        catalog.entries[name].add_quantity(
-            SUPERNOVA.DEC, row[3], source, u_value='floatdegrees')
-        if row[7] and row[7] != 'unknown':
-            type = row[7].replace('SNe', '').replace('SN', '').strip()
-            catalog.entries[name].add_quantity(SUPERNOVA.CLAIMED_TYPE, type,
-                                               source)
-        elif any([
-                xx in row[9].upper()
-                for xx in ['SN CANDIATE', 'CANDIDATE SN', 'HOSTLESS SN']
-        ]):
-            catalog.entries[name].add_quantity(SUPERNOVA.CLAIMED_TYPE,
-                                               'Candidate', source)
-
-        if ('aka' in row[9].replace('gakaxy', 'galaxy').lower() and
-                'AKARI' not in row[9]):
-            commentsplit = (row[9].replace('_', ' ').replace('MLS ', 'MLS')
-                            .replace('CSS ', 'CSS').replace('SN iPTF', 'iPTF')
-                            .replace('SN ', 'SN').replace('AT ', 'AT'))
-            commentsplit = commentsplit.split()
-            for csi, cs in enumerate(commentsplit):
-                if 'aka' in cs.lower() and csi < len(commentsplit) - 1:
-                    alias = commentsplit[csi + 1].strip('(),:.ï»¿').replace(
-                        'PSNJ', 'PSN J')
-                    if alias[:6] == 'ASASSN' and alias[6] != '-':
-                        alias = 'ASASSN-' + alias[6:]
-                    if alias.lower() != 'master':
-                        catalog.entries[name].add_quantity(SUPERNOVA.ALIAS,
-                                                           alias, source)
-                    break
-
-        fname = os.path.join(catalog.get_current_task_repo(),
-                             'GAIA/') + row[0] + '.csv'
-
-        csvtxt = catalog.load_url('http://gsaweb.ast.cam.ac.uk/alerts/alert/' +
-                                  row[0] + '/lightcurve.csv', fname)
+        fingerprint = md5(','.join(row).encode('utf-8')).hexdigest()
+        if (catalog.args.update and
+                state.get(row[0], {}).get('row') == fingerprint and
+                os.path.isfile(os.path.join(task_repo, 'GAIA',
+                                            row[0] + '.csv'))):
+            continue
+        pending.append((row, fingerprint))
+        if (catalog.args.travis and
+                len(pending) % catalog.TRAVIS_QUERY_LIMIT == 0):
+            break
+    catalog.log.info('{} of {} GAIA alerts to import.'.format(
+        len(pending), len(tsvin) - 1))
 
-        tsvin2 = csv.reader(csvtxt.splitlines())
-        for ri2, row2 in enumerate(tsvin2):
-            if ri2 <= 1 or not row2:
+    for bi in pbar(range(0, len(pending), GAIA_FETCH_BATCH), task_str):
+        batch = pending[bi:bi + GAIA_FETCH_BATCH]
+        paths = [os.path.join('GAIA', row[0] + '.csv') for row, fp in batch]
+        fetch = [ii for ii, (row, fingerprint) in enumerate(batch)
+                 if state.get(row[0], {}).get('row') != fingerprint or
+                 not os.path.isfile(os.path.join(task_repo, paths[ii]))]
+        fetched = dict(zip(fetch, catalog.fetch_many(
+            [GAIA_ALERT_URL + batch[ii][0][0] + '/lightcurve.csv'
+             for ii in fetch], [paths[ii] for ii in fetch])))
+        for ii, (row, fingerprint) in enumerate(batch):
+            current = True
+            if ii in fetched:
+                lctxt = fetched[ii].text
+                current = fetched[ii].ok
+            else:
+                with open(os.path.join(task_repo, paths[ii]), 'r') as ff:
+                    lctxt = ff.read()
+            if lctxt is None:
                 continue
-            mjd = str(jd_to_mjd(Decimal(row2[1].strip())))
-            magnitude = row2[2].strip()
-            if magnitude == 'null':
-                continue
-            e_mag = 0.
-            telescope = 'GAIA'
-            band = 'G'
-            catalog.entries[name].add_photometry(
-                time=mjd,
-                u_time='MJD',
-                telescope=telescope,
-                band=band,
-                magnitude=magnitude,
-                e_magnitude=e_mag,
-                source=source)
-        if catalog.args.update:
-            catalog.journal_entries()
-        loopcnt = loopcnt + 1
-        if catalog.args.travis and loopcnt % catalog.TRAVIS_QUERY_LIMIT == 0:
-            break
+            mjds, magnitudes = _gaia_light_curve(lctxt)
+            lcstate = {
+                'row': fingerprint,
+                'points': len(mjds),
+                'last_mjd': mjds[-1] if mjds else None,
+                'hash': md5(lctxt.encode('utf-8')).hexdigest()
+            }
+            old = state.get(row[0], {})
+            if catalog.args.update and old.get('hash') == lcstate['hash']:
+                mjds, magnitudes = [], []
+            _add_gaia_alert(catalog, row, mjds, magnitudes)
+            # A light curve read from the cache after a failed download
+            # may be stale: it is fetched again next time
+            if current:
+                state[row[0]] = lcstate
+        catalog.journal_entries()
+
+    atomic_write(state_path, json.dumps(
+        state, indent='\t', separators=(',', ':'), sort_keys=True))
     catalog.journal_entries()
     return
+
+
+def _gaia_light_curve(csvtxt):
+    """Return the MJDs and magnitudes of a GAIA light-curve file."""
+    mjds, magnitudes = [], []
+    for ri, row in enumerate(csv.reader(csvtxt.splitlines())):
+        if ri <= 1 or not row:
+            continue
+        magnitude = row[2].strip()
+        if magnitude == 'null':
+            continue
+        mjds.append(str(jd_to_mjd(Decimal(row[1].strip()))))
+        magnitudes.append(magnitude)
+    return mjds, magnitudes
+
+
+def _add_gaia_alert(catalog, row, mjds, magnitudes):
+    """Add the alert of index `row` with its light-curve points."""
+    reference = 'Gaia Photometric Science Alerts'
+    refurl = 'http://gsaweb.ast.cam.ac.uk/alerts/alertsindex'
+    name = catalog.add_entry(row[0])
+    source = catalog.entries[name].add_source(name=reference, url=refurl)
+    catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, source)
+    year = '20' + re.findall(r'\d+', row[0])[0]
+    catalog.entries[name].add_quantity(SUPERNOVA.DISCOVER_DATE, year, source)
+    catalog.entries[name].add_quantity(
+        SUPERNOVA.RA, row[2], source, u_value='floatdegrees')
+    catalog.entries[name].add_quantity(
+        SUPERNOVA.DEC, row[3], source, u_value='floatdegrees')
+    if row[7] and row[7] != 'unknown':
+        type = row[7].replace('SNe', '').replace('SN', '').strip()
+        catalog.entries[name].add_quantity(SUPERNOVA.CLAIMED_TYPE, type,
+                                           source)
+    elif any([
+            xx in row[9].upper()
+            for xx in ['SN CANDIATE', 'CANDIDATE SN', 'HOSTLESS SN']
+    ]):
+        catalog.entries[name].add_quantity(SUPERNOVA.CLAIMED_TYPE,
+                                           'Candidate', source)
+
+    if ('aka' in row[9].replace('gakaxy', 'galaxy').lower() and
+            'AKARI' not in row[9]):
+        commentsplit = (row[9].replace('_', ' ').replace('MLS ', 'MLS')
+                        .replace('CSS ', 'CSS').replace('SN iPTF', 'iPTF')
+                        .replace('SN ', 'SN').replace('AT ', 'AT'))
+        commentsplit = commentsplit.split()
+        for csi, cs in enumerate(commentsplit):
+            if 'aka' in cs.lower() and csi < len(commentsplit) - 1:
+                alias = commentsplit[csi + 1].strip('(),:.ï»¿').replace(
+                    'PSNJ', 'PSN J')
+                if alias[:6] == 'ASASSN' and alias[6] != '-':
+                    alias = 'ASASSN-' + alias[6:]
+                if alias.lower() != 'master':
+                    catalog.entries[name].add_quantity(SUPERNOVA.ALIAS,
+                                                       alias, source)
+                break
+
+    if not mjds:
+        return
+    catalog.entries[name].add_photometry_many({
+        PHOTOMETRY.TIME: mjds,
+        PHOTOMETRY.U_TIME: 'MJD',
+        PHOTOMETRY.TELESCOPE: 'GAIA',
+        PHOTOMETRY.BAND: 'G',
+        PHOTOMETRY.MAGNITUDE: magnitudes,
+        PHOTOMETRY.E_MAGNITUDE: 0.
+    }, source=source)
@@ -10,55 +10,34 @@ from glob import glob
 from astrocats.structures.struct import PHOTOMETRY
 from astrocats.structures.struct import SPECTRUM
 from astrocats import utils
-from astropy.io import fits
 from astropy.time import Time as astrotime
 
 from ..supernova import SUPERNOVA, Supernova
+from ..utils import parse_in_pool, points_to_columns, read_fits_spectrum
 
 
 def do_external_radio(catalog):
     task_str = catalog.get_current_task_str()
     path_pattern = os.path.join(catalog.get_current_task_repo(), '*.txt')
-    for datafile in utils.pbar(glob(path_pattern), task_str, sort=True):
+    files = sorted(glob(path_pattern), key=lambda s: s.lower())
+    results = parse_in_pool(catalog, _parse_radio, [(ff,) for ff in files])
+    for datafile, (bibcodes, columns) in zip(files, utils.pbar(
+            results, task_str, total=len(files))):
         oldname = os.path.basename(datafile).split('.')[0]
         name = catalog.add_entry(oldname)
-        radiosourcedict = OrderedDict()
-        with open(datafile, 'r') as ff:
-            for li, line in enumerate(
-                    [xx.strip() for xx in ff.read().splitlines()]):
-                if line.startswith('(') and li <= len(radiosourcedict):
-                    key = line.split()[0]
-                    bibc = line.split()[-1]
-                    radiosourcedict[key] = catalog.entries[name].add_source(bibcode=bibc)
-                elif li in [xx + len(radiosourcedict) for xx in range(3)]:
-                    continue
-                else:
-                    cols = list(filter(None, line.split()))
-                    source = radiosourcedict[cols[6]]
-                    photo = {
-                        PHOTOMETRY.TIME: cols[0],
-                        PHOTOMETRY.FREQUENCY: cols[2],
-                        PHOTOMETRY.U_FREQUENCY: 'GHz',
-                        PHOTOMETRY.FLUX_DENSITY: cols[3],
-                        PHOTOMETRY.U_FLUX_DENSITY: 'µJy',
-                        PHOTOMETRY.U_TIME: 'MJD',
-                        PHOTOMETRY.INSTRUMENT: cols[5],
-                        PHOTOMETRY.SOURCE: source
-                    }
-                    if float(cols[4]) == 0.0:
-                        eflux = None
-                        upp = True
-                    else:
-                        eflux = cols[4]
-                        upp = False
-
-                    if eflux is not None:
-                        photo[PHOTOMETRY.E_FLUX_DENSITY] = eflux
-
-                    photo[PHOTOMETRY.UPPER_LIMIT] = upp
-
-                    catalog.entries[name].add_photometry(**photo)
-                    catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, oldname, source)
+        radiosourcedict = OrderedDict(
+            (key, catalog.entries[name].add_source(bibcode=bibc))
+            for key, bibc in bibcodes.items())
+        if not columns:
+            continue
+        columns[PHOTOMETRY.SOURCE] = [
+            radiosourcedict[key] for key in columns[PHOTOMETRY.SOURCE]]
+        columns[PHOTOMETRY.U_FREQUENCY] = 'GHz'
+        columns[PHOTOMETRY.U_FLUX_DENSITY] = 'µJy'
+        columns[PHOTOMETRY.U_TIME] = 'MJD'
+        catalog.entries[name].add_photometry_many(columns)
+        for source in OrderedDict.fromkeys(columns[PHOTOMETRY.SOURCE]):
+            catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, oldname, source)
 
     catalog.journal_entries()
     return
@@ -68,41 +47,82 @@ def do_external_xray(catalog):
     """Import supernova X-ray data."""
     task_str = catalog.get_current_task_str()
     path_pattern = os.path.join(catalog.get_current_task_repo(), '*.txt')
-    for datafile in utils.pbar(glob(path_pattern), task_str, sort=True):
+    files = sorted(glob(path_pattern), key=lambda s: s.lower())
+    results = parse_in_pool(catalog, _parse_xray, [(ff,) for ff in files])
+    for datafile, (bibcode, columns) in zip(files, utils.pbar(
+            results, task_str, total=len(files))):
         oldname = os.path.basename(datafile).split('.')[0]
         name = catalog.add_entry(oldname)
-        with open(datafile, 'r') as ff:
-            for li, line in enumerate(ff.read().splitlines()):
-                if li == 0:
-                    source = catalog.entries[name].add_source(
-                        bibcode=line.split()[-1])
-                elif li in [1, 2, 3]:
-                    continue
-                else:
-                    cols = list(filter(None, line.split()))
-                    photodict = {
-                        PHOTOMETRY.TIME: cols[:2],
-                        PHOTOMETRY.U_TIME: 'MJD',
-                        PHOTOMETRY.ENERGY: cols[2:4],
-                        PHOTOMETRY.U_ENERGY: 'keV',
-                        PHOTOMETRY.COUNT_RATE: cols[4],
-                        PHOTOMETRY.FLUX: cols[6],
-                        PHOTOMETRY.UNABSORBED_FLUX: cols[8],
-                        PHOTOMETRY.U_FLUX: 'ergs/s/cm^2',
-                        PHOTOMETRY.PHOTON_INDEX: cols[15],
-                        PHOTOMETRY.INSTRUMENT: cols[17],
-                        PHOTOMETRY.NHMW: cols[11],
-                        PHOTOMETRY.UPPER_LIMIT: (float(cols[5]) < 0),
-                        PHOTOMETRY.SOURCE: source
-                    }
-                    catalog.entries[name].add_photometry(**photodict)
-                    catalog.entries[name].add_quantity(SUPERNOVA.ALIAS,
-                                                       oldname, source)
+        if bibcode is None:
+            continue
+        source = catalog.entries[name].add_source(bibcode=bibcode)
+        if not columns:
+            continue
+        columns[PHOTOMETRY.U_TIME] = 'MJD'
+        columns[PHOTOMETRY.U_ENERGY] = 'keV'
+        columns[PHOTOMETRY.U_FLUX] = 'ergs/s/cm^2'
+        catalog.entries[name].add_photometry_many(columns, source=source)
+        catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, oldname, source)
 
     catalog.journal_entries()
     return
 
 
+def _parse_radio(path):
+    """Source bibcodes (by key) and photometry columns of a radio file.
+
+    The `source` column holds the source keys used in the file.
+    """
+    bibcodes = OrderedDict()
+    points = []
+    with open(path, 'r') as ff:
+        for li, line in enumerate(
+                [xx.strip() for xx in ff.read().splitlines()]):
+            if line.startswith('(') and li <= len(bibcodes):
+                bibcodes[line.split()[0]] = line.split()[-1]
+            elif li in [xx + len(bibcodes) for xx in range(3)]:
+                continue
+            else:
+                cols = list(filter(None, line.split()))
+                upp = float(cols[4]) == 0.0
+                points.append({
+                    PHOTOMETRY.TIME: cols[0],
+                    PHOTOMETRY.FREQUENCY: cols[2],
+                    PHOTOMETRY.FLUX_DENSITY: cols[3],
+                    PHOTOMETRY.E_FLUX_DENSITY: None if upp else cols[4],
+                    PHOTOMETRY.INSTRUMENT: cols[5],
+                    PHOTOMETRY.UPPER_LIMIT: upp,
+                    PHOTOMETRY.SOURCE: cols[6]
+                })
+    return bibcodes, points_to_columns(points)
+
+
+def _parse_xray(path):
+    """Source bibcode and photometry columns of an X-ray file."""
+    bibcode = None
+    points = []
+    with open(path, 'r') as ff:
+        for li, line in enumerate(ff.read().splitlines()):
+            if li == 0:
+                bibcode = line.split()[-1]
+            elif li in [1, 2, 3]:
+                continue
+            else:
+                cols = list(filter(None, line.split()))
+                points.append({
+                    PHOTOMETRY.TIME: cols[:2],
+                    PHOTOMETRY.ENERGY: cols[2:4],
+                    PHOTOMETRY.COUNT_RATE: cols[4],
+                    PHOTOMETRY.FLUX: cols[6],
+                    PHOTOMETRY.UNABSORBED_FLUX: cols[8],
+                    PHOTOMETRY.PHOTON_INDEX: cols[15],
+                    PHOTOMETRY.INSTRUMENT: cols[17],
+                    PHOTOMETRY.NHMW: cols[11],
+                    PHOTOMETRY.UPPER_LIMIT: (float(cols[5]) < 0)
+                })
+    return bibcode, points_to_columns(points)
+
+
 def do_external_fits_spectra(catalog):
     fpath = catalog.get_current_task_repo()
     with open(os.path.join(fpath, 'meta.json'), 'r') as f:
@@ -112,71 +132,55 @@ def do_external_fits_spectra(catalog):
     # task_str = catalog.get_current_task_str()
     path_pattern = os.path.join(catalog.get_current_task_repo(), '*.fits')
     files = glob(path_pattern)
-    for datafile in files:
+    results = parse_in_pool(catalog, read_fits_spectrum, [(x, 3) for x in files])
+    for datafile, spectrum in zip(files, results):
         filename = datafile.split('/')[-1]
-        if filename == 'meta.json':
+        if spectrum is None:
+            catalog.log.warning('Skipping FITS spectrum `{}`.'.format(filename))
             continue
-        hdulist = fits.open(datafile)
-        for oi, obj in enumerate(hdulist[0].header):
-            if any(x in ['.', '/'] for x in obj):
-                del hdulist[0].header[oi]
-        hdulist[0].verify('silentfix')
-        hdrkeys = list(hdulist[0].header.keys())
-        # print(hdrkeys)
+        if spectrum['verify']:
+            catalog.log.warning(spectrum['verify'])
+        header = spectrum['header']
         name = None
         if filename in metadict:
             if 'name' in metadict[filename]:
                 name = metadict[filename]['name']
         if name is None:
-            name = hdulist[0].header['OBJECT']
+            name = header['OBJECT']
         if 'bibcode' in metadict[filename]:
             name, source = catalog.new_entry(name, bibcode=metadict[filename]['bibcode'])
         elif 'donator' in metadict[filename]:
             name, source = catalog.new_entry(name, name=metadict[filename]['donator'])
         else:
-            if 'OBSERVER' in hdrkeys:
-                name, source = catalog.new_entry(name, name=hdulist[0].header['OBSERVER'])
+            if 'OBSERVER' in header:
+                name, source = catalog.new_entry(name, name=header['OBSERVER'])
             else:
                 name = catalog.add_entry(name)
                 source = catalog.entries[name].add_self_source()
-        # for key in hdulist[0].header.keys():
-        #     print(key, hdulist[0].header[key])
-        if hdulist[0].header['SIMPLE']:
-            if 'JD' in hdrkeys:
-                mjd = str(utils.jd_to_mjd(Decimal(str(hdulist[0].header['JD']))))
-            elif 'MJD' in hdrkeys:
-                mjd = str(hdulist[0].header['MJD'])
-            elif 'DATE-OBS' in hdrkeys:
-                if 'T' in hdulist[0].header['DATE-OBS']:
-                    dateobs = hdulist[0].header['DATE-OBS'].strip()
-                elif 'UTC-OBS' in hdrkeys:
-                    dateobs = (hdulist[0].header['DATE-OBS'].strip() + 'T' +
-                               hdulist[0].header['UTC-OBS'].strip())
-                mjd = str(astrotime(dateobs, format='isot').mjd)
-            else:
-                raise ValueError("Couldn't find JD/MJD for spectrum.")
-            w0 = hdulist[0].header['CRVAL1']
-            if hdulist[0].header['NAXIS'] == 1:
-                wd = hdulist[0].header['CDELT1']
-                fluxes = [str(x) for x in list(hdulist[0].data)]
-                errors = False
-            elif hdulist[0].header['NAXIS'] == 3:
-                wd = hdulist[0].header['CD1_1']
-                fluxes = [str(x) for x in list(hdulist[0].data)[0][0]]
-                errors = [str(x) for x in list(hdulist[0].data)[3][0]]
-            else:
-                print('Warning: Skipping FITS spectrum `{}`.'.format(filename))
-                continue
-            waves = [str(w0 + wd * x) for x in range(0, len(fluxes))]
+        if 'JD' in header:
+            mjd = str(utils.jd_to_mjd(Decimal(str(header['JD']))))
+        elif 'MJD' in header:
+            mjd = str(header['MJD'])
+        elif 'DATE-OBS' in header:
+            if 'T' in header['DATE-OBS']:
+                dateobs = header['DATE-OBS'].strip()
+            elif 'UTC-OBS' in header:
+                dateobs = (header['DATE-OBS'].strip() + 'T' +
+                           header['UTC-OBS'].strip())
+            mjd = str(astrotime(dateobs, format='isot').mjd)
         else:
-            raise ValueError('Non-simple FITS import not yet supported.')
-        airmass = hdulist[0].header['AIRMASS']
-        if 'BUNIT' in hdrkeys:
-            fluxunit = hdulist[0].header['BUNIT']
+            raise ValueError("Couldn't find JD/MJD for spectrum.")
+        waves = spectrum['wavelengths'].astype(str).tolist()
+        fluxes = spectrum['fluxes'].astype(str).tolist()
+        errors = (spectrum['errors'].astype(str).tolist()
+                  if spectrum['errors'] is not None else False)
+        airmass = header['AIRMASS']
+        if 'BUNIT' in header:
+            fluxunit = header['BUNIT']
             if fluxunit in fureps:
                 fluxunit = fureps[fluxunit]
         else:
-            if max([float(x) for x in fluxes]) < 1.0e-5:
+            if spectrum['fluxes'].max() < 1.0e-5:
                 fluxunit = 'erg/s/cm^2/Angstrom'
             else:
                 fluxunit = 'Uncalibrated'
@@ -191,21 +195,20 @@ def do_external_fits_spectra(catalog):
             SPECTRUM.FILENAME: filename,
             SPECTRUM.SOURCE: source
         }
-        if 'TELESCOP' in hdrkeys:
-            specdict[SPECTRUM.TELESCOPE] = hdulist[0].header['TELESCOP']
-        if 'INSTRUME' in hdrkeys:
-            specdict[SPECTRUM.INSTRUMENT] = hdulist[0].header['INSTRUME']
+        if 'TELESCOP' in header:
+            specdict[SPECTRUM.TELESCOPE] = header['TELESCOP']
+        if 'INSTRUME' in header:
+            specdict[SPECTRUM.INSTRUMENT] = header['INSTRUME']
         if errors:
             specdict[SPECTRUM.ERRORS] = errors
             specdict[SPECTRUM.U_ERRORS] = fluxunit
-        if 'SITENAME' in hdrkeys:
-            specdict[SPECTRUM.OBSERVATORY] = hdulist[0].header['SITENAME']
-        elif 'OBSERVAT' in hdrkeys:
-            specdict[SPECTRUM.OBSERVATORY] = hdulist[0].header['OBSERVAT']
-        if 'OBSERVER' in hdrkeys:
-            specdict[SPECTRUM.OBSERVER] = hdulist[0].header['OBSERVER']
+        if 'SITENAME' in header:
+            specdict[SPECTRUM.OBSERVATORY] = header['SITENAME']
+        elif 'OBSERVAT' in header:
+            specdict[SPECTRUM.OBSERVATORY] = header['OBSERVAT']
+        if 'OBSERVER' in header:
+            specdict[SPECTRUM.OBSERVER] = header['OBSERVER']
         catalog.entries[name].add_spectrum(**specdict)
-        hdulist.close()
         catalog.journal_entries()
     return
 
@@ -1,9 +1,8 @@
 """Import tasks related to MAST."""
 import json
 import os
-import sys
-import time
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from decimal import Decimal
 
@@ -17,12 +16,11 @@ from astropy.io import fits
 from astropy.table import Table
 
 from ..supernova import SUPERNOVA
+from ..utils import QueryHistory
 
 try:  # Python 3.x
-    from urllib.parse import quote as urlencode
     from urllib.request import urlretrieve
 except ImportError:  # Python 2.x
-    from urllib import pathname2url as urlencode
     from urllib import urlretrieve
 
 try:  # Python 3.x
@@ -31,86 +29,160 @@ except ImportError:  # Python 2.x
     import httplib
 
 
-def mastQuery(request):
-    """Perform a MAST query.
+MAST_URL = 'https://mast.stsci.edu/api/v0/invoke'
+# Objects cone searched per batch; the history is committed after each batch.
+MAST_BATCH = 100
+# Results for SNe discovered in the last `MAST_RECENT_YEARS` years (or of
+# unknown age) expire after `MAST_RECENT_TTL` seconds, older ones never.
+MAST_RECENT_YEARS = 5
+MAST_RECENT_TTL = 30. * 86400.
+
+
+def mastQuery(fetcher, request):
+    """Perform a MAST query through the shared `fetcher`.
 
     Parameters
     ----------
+    fetcher (FetchService): The catalog's pooled HTTP client.
     request (dictionary): The Mashup request json object
 
     Returns head,content where head is the response HTTP headers, and content
     is the returned data.
 
     """
-    server = 'mast.stsci.edu'
+    response = fetcher.request(
+        MAST_URL, post={'request': json.dumps(request)},
+        headers={"Accept": "text/plain"})
+    response.raise_for_status()
+    return response.headers, response.text
+
+
+def _mast_ttl(discovered):
+    """Seconds the MAST results of a SN discovered on `discovered` stay valid.
+
+    `None` (never expire) for SNe older than `MAST_RECENT_YEARS` years.
+    """
+    if (discovered is not None and
+            discovered < datetime(datetime.now().year - MAST_RECENT_YEARS, 1, 1)):
+        return None
+    return MAST_RECENT_TTL
 
-    # Grab Python Version
-    version = ".".join(map(str, sys.version_info[:3]))
 
-    # Create Http Header Variables
-    headers = {"Content-type": "application/x-www-form-urlencoded",
-               "Accept": "text/plain",
-               "User-agent": "python-requests/" + version}
+def _wanted_spectrum(spec):
+    """Whether a MAST observation is an HST STIS/COS spectrum of a SN."""
+    return (any(x in spec['target_classification'].upper()
+                for x in ['SUPERNOVA', 'UNIDENTIFIED']) and
+            spec['obsid'] is not None and
+            any(x in spec['instrument_name'].upper() for x in ['STIS', 'COS']))
 
-    # Encoding the request as a json string
-    requestString = json.dumps(request)
-    requestString = urlencode(requestString)
 
-    # opening the https connection
-    conn = httplib.HTTPSConnection(server)
+def _query_mast(catalog, entry, objRa, objDec):
+    """Cone search MAST around an entry and list its HST spectra.
+
+    The science products of the wanted spectra are listed under `sciProds`.
+    Returns `None` if the cone search failed.  Runs in worker threads.
+    """
+    mastRequest = {'service': 'Mast.Caom.Cone',
+                   'params': {'ra': objRa,
+                              'dec': objDec,
+                              'radius': 0.008},
+                   'format': 'json',
+                   'pagesize': 1000,
+                   'page': 1,
+                   'removenullcolumns': True,
+                   'removecache': True}
+
+    try:
+        headers, mastDataString = mastQuery(catalog.fetcher, mastRequest)
+    except Exception:
+        catalog.log.warning('`mastQuery` failed for `{}`, skipping.'.format(entry))
+        return None
+
+    mastData = json.loads(mastDataString)
+
+    if 'fields' not in mastData:
+        catalog.log.warning('`fields` not found for `{}`'.format(entry))
+        return None
+
+    mastDataTable = Table()
+    for col, atype in [(x['name'], x['type']) for x in mastData['fields']]:
+        if atype == "string":
+            atype = "str"
+        if atype == "boolean":
+            atype = "bool"
+        mastDataTable[col] = np.array(
+            [x.get(col, None) for x in mastData['data']], dtype=atype)
+
+    spectra = [
+        x for x in mastDataTable if
+        x['dataproduct_type'] == 'spectrum' and x['obs_collection'] == 'HST'
+    ]
+
+    spectra = [{
+        'target_classification': x['target_classification'],
+        'obsid': x['obsid'] if 'obsid' in x else None,
+        't_min': x['t_min'],
+        't_max': x['t_max'],
+        'instrument_name': x['instrument_name'],
+        'proposal_pi': x['proposal_pi'],
+    } for x in spectra]
+
+    for spec in spectra:
+        if not _wanted_spectrum(spec):
+            continue
+        obsid = spec['obsid']
+        productRequest = {'service': 'Mast.Caom.Products',
+                          'params': {'obsid': obsid},
+                          'format': 'json',
+                          'pagesize': 100,
+                          'page': 1}
+
+        try:
+            headers, obsProductsString = mastQuery(catalog.fetcher, productRequest)
+        except Exception:
+            catalog.log.warning('`mastQuery` failed for `{}`, skipping.'.format(obsid))
+            continue
 
-    # Making the query
-    conn.request("POST", "/api/v0/invoke", "request=" + requestString, headers)
+        obsProducts = json.loads(obsProductsString)
 
-    # Getting the response
-    resp = conn.getresponse()
-    head = resp.getheaders()
-    content = resp.read().decode('utf-8')
+        if 'fields' not in obsProducts:
+            catalog.log.warning('`fields` not found for `{}`'.format(obsid))
+            continue
 
-    # Close the https connection
-    conn.close()
+        sciProdArr = [x for x in obsProducts['data']
+                      if x.get("productType", None) == 'SCIENCE']
+        scienceProducts = OrderedDict()
+        for col in [x['name'] for x in obsProducts['fields']]:
+            scienceProducts[col] = [x.get(col, None) for x in sciProdArr]
+        spec['sciProds'] = scienceProducts
 
-    return head, content
+    return spectra
 
 
 def do_mast_spectra(catalog):
-    """Import HST spectra from MAST."""
+    """Import HST spectra from MAST.
+
+    Entries are cone searched in batches of `MAST_BATCH`, with up to the
+    task's concurrency of queries at once.  Results are kept per entry in
+    `MAST/history.sqlite` (see `QueryHistory`) and reused until they expire
+    (`_mast_ttl`).  With the task option `dry_run`, only the number of
+    entries that would be queried is reported.
+    """
     task_str = catalog.get_current_task_str()
     masturl = 'https://mast.stsci.edu'
     mastref = 'MAST'
     fureps = {'erg/cm2/s/A': 'erg/s/cm^2/Angstrom'}
     log = catalog.log
 
-    histfile = os.path.join(catalog.get_current_task_repo(), 'MAST', 'history.json')
-
-    if os.path.exists(histfile):
-        histdict = json.load(open(histfile, 'r'))
-    else:
-        histdict = OrderedDict()
-
-    # objectOfInterest = 'ASASSN-14li'
-    #
-    # resolverRequest = {'service': 'Mast.Name.Lookup',
-    #                    'params': {'input': objectOfInterest,
-    #                               'format': 'json'},
-    #                    }
-    #
-    # headers, resolvedObjectString = mastQuery(resolverRequest)
-    #
-    # resolvedObject = json.loads(resolvedObjectString)
-    #
-    # pp.pprint(resolvedObject)
-
-    # objRa = resolvedObject['resolvedCoordinate'][0]['ra']
-    # objDec = resolvedObject['resolvedCoordinate'][0]['decl']
-
     objs = []
+    discovered = {}
     for entry in catalog.entries:
+        discovered[entry] = None
         if SUPERNOVA.DISCOVER_DATE in catalog.entries[entry]:
             dd = catalog.entries[entry][SUPERNOVA.DISCOVER_DATE][0][QUANTITY.VALUE]
             try:
-                dt = datetime.strptime(dd, '%Y/%m/%d')
-                if dt < datetime(1997, 1, 1):
+                discovered[entry] = datetime.strptime(dd, '%Y/%m/%d')
+                if discovered[entry] < datetime(1997, 1, 1):
                     continue
             except Exception:
                 pass
@@ -153,237 +225,166 @@ def do_mast_spectra(catalog):
             log.info("Coordinate conversion succeeded after removing {}/{} entries.".format(
                 num_bad, num_obs))
 
-    mastcnt = 0
-    for ci, co in enumerate(pbar(coords, desc=task_str)):
-        entry = objs[0][ci]
-        use_cache = False
-        if entry in histdict:
-            if dt < datetime(datetime.now().year - 5, 1, 1):
-                use_cache = True
-            if (dt >= datetime(datetime.now().year - 5, 1, 1) and
-                    time.time() - histdict[entry][0] < 30. * 86400.):
-                use_cache = True
-        if use_cache:
-            spectra = histdict[entry][1]
-        else:
-            objRa, objDec = tuple(co.to_string().split())
-            mastRequest = {'service': 'Mast.Caom.Cone',
-                           'params': {'ra': objRa,
-                                      'dec': objDec,
-                                      'radius': 0.008},
-                           'format': 'json',
-                           'pagesize': 1000,
-                           'page': 1,
-                           'removenullcolumns': True,
-                           'removecache': True}
+    entries = [str(x) for x in objs[0]]
+    if catalog.args.travis:
+        entries = entries[:catalog.TRAVIS_QUERY_LIMIT]
+    positions = [x.split() for x in coords[:len(entries)].to_string()]
 
-            try:
-                headers, mastDataString = mastQuery(mastRequest)
-            except Exception:
-                print('`mastQuery` failed for `{}`, skipping.'.format(entry))
-                continue
-
-            mastData = json.loads(mastDataString)
-
-            # print(mastData.keys())
-            # print("Query status:", mastData['status'])
+    mastpath = os.path.join(catalog.get_current_task_repo(), 'MAST')
+    history = QueryHistory(os.path.join(mastpath, 'history.sqlite'))
+    try:
+        histfile = os.path.join(mastpath, 'history.json')
+        if not len(history) and os.path.exists(histfile):
+            # One-time import of the former JSON history
+            with open(histfile, 'r') as f:
+                histdict = json.load(f)
+            history.put_many([
+                (entry, spectra, _mast_ttl(discovered.get(entry)), queried)
+                for entry, (queried, spectra) in histdict.items()])
+
+        stale = set(history.stale(entries))
+        if catalog.get_current_task_option('dry_run'):
+            log.warning('MAST dry run: {} of {} entries would be queried, '
+                        '{} are cached.'.format(
+                            len(stale), len(entries), len(entries) - len(stale)))
+            return
+
+        workers = catalog.get_current_task_concurrency()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for ci in pbar(range(len(entries)), task_str):
+                if ci % MAST_BATCH == 0:
+                    batch = range(ci, min(ci + MAST_BATCH, len(entries)))
+                    todo = [bi for bi in batch if entries[bi] in stale]
+                    queried = dict(zip(todo, executor.map(
+                        lambda bi: _query_mast(catalog, entries[bi], *positions[bi]),
+                        todo)))
+                    history.put_many([
+                        (entries[bi], spectra, _mast_ttl(discovered[entries[bi]]))
+                        for bi, spectra in queried.items() if spectra is not None])
+                if ci in queried:
+                    spectra = queried[ci]
+                else:
+                    spectra = history.get(entries[ci])
+                if spectra is None:
+                    continue
+                _add_mast_spectra(catalog, entries[ci], spectra, masturl, mastref, fureps)
+                catalog.journal_entries()
+    finally:
+        history.close()
 
-            mastDataTable = Table()
+    return
 
-            if 'fields' not in mastData:
-                print('`fields` not found for `{}`'.format(entry))
-                continue
 
-            for col, atype in [(x['name'], x['type']) for x in mastData['fields']]:
-                if atype == "string":
-                    atype = "str"
-                if atype == "boolean":
-                    atype = "bool"
-                mastDataTable[col] = np.array(
-                    [x.get(col, None) for x in mastData['data']], dtype=atype)
-
-            # print(mastDataTable.columns)
-
-            spectra = [
-                x for x in mastDataTable if
-                x['dataproduct_type'] == 'spectrum' and x['obs_collection'] == 'HST'
-            ]
-
-            spectra = [{
-                'target_classification': x['target_classification'],
-                'obsid': x['obsid'] if 'obsid' in x else None,
-                't_min': x['t_min'],
-                't_max': x['t_max'],
-                'instrument_name': x['instrument_name'],
-                'proposal_pi': x['proposal_pi'],
-            } for x in spectra]
-
-        mjd = ''
-        instrument = ''
-        observer = ''
-        for si in range(len(spectra)):
-            spec = spectra[si]
-            if all([x not in spec['target_classification'].upper()
-                    for x in ['SUPERNOVA', 'UNIDENTIFIED']]):
+def _add_mast_spectra(catalog, entry, spectra, masturl, mastref, fureps):
+    """Download and add the HST spectra of `entry` found on MAST."""
+    mjd = ''
+    instrument = ''
+    observer = ''
+    for spec in spectra:
+        scienceProducts = spec.get('sciProds')
+        if not _wanted_spectrum(spec) or not scienceProducts:
+            continue
+
+        obsid = spec['obsid']
+        mjd = str(Decimal('0.5') * (Decimal(str(spec['t_min'])) + Decimal(str(spec['t_max']))))
+        instrument = spec['instrument_name']
+        observer = spec['proposal_pi']
+
+        search_str = '_x1d.fits'
+        summed = False
+        if any(['_x1dsum.fits' in x for x in scienceProducts['productFilename']]):
+            search_str = '_x1dsum.fits'
+            summed = True
+        if any(['_sx1.fits' in x for x in scienceProducts['productFilename']]):
+            search_str = '_sx1.fits'
+            summed = True
+        for ri in range(len(scienceProducts['productFilename'])):
+            if search_str not in scienceProducts['productFilename'][ri]:
                 continue
+            filename = str(obsid) + "_" + scienceProducts['productFilename'][ri]
+            datafile = os.path.join(catalog.get_current_task_repo(), 'MAST', filename)
+            if not os.path.exists(datafile):
+                # link is url, so can just dl
+                if "http" in scienceProducts['dataURI'][ri]:
+                    urlretrieve(scienceProducts['dataURI'][ri], datafile)
+                else:  # link is uri, need to go through direct dl request
+                    server = 'mast.stsci.edu'
+                    conn = httplib.HTTPSConnection(server)
+                    conn.request("GET", "/api/v0/download/file/" +
+                                 scienceProducts['dataURI'][ri].lstrip('mast:'))
+                    resp = conn.getresponse()
+                    fileContent = resp.read()
+                    with open(datafile, 'wb') as FLE:
+                        FLE.write(fileContent)
+                    conn.close()
 
-            obsid = spec['obsid']
-            if obsid is None:
+            try:
+                hdulist = fits.open(datafile)
+            except Exception:
+                print("Couldn't read `{}`, maybe private.".format(filename))
+                os.remove(datafile)
                 continue
-
-            mjd = str(Decimal('0.5') * (Decimal(str(spec['t_min'])) + Decimal(str(spec['t_max']))))
-            instrument = spec['instrument_name']
-            if ('STIS' not in instrument.upper() and 'COS' not in instrument.upper()):
+            for oi, obj in enumerate(hdulist[0].header):
+                if any(x in ['.', '/'] for x in obj):
+                    del hdulist[0].header[oi]
+            hdulist[0].verify('silentfix')
+            hdrkeys = list(hdulist[0].header.keys())
+            # print(hdrkeys)
+            name = entry
+            if not name:
+                name = hdulist[0].header['OBJECT']
+            name, source = catalog.new_entry(name, name=mastref, url=masturl, secondary=True)
+            sources = [source]
+            if 'OBSERVER' in hdrkeys:
+                sources.append(
+                    catalog.entries[name].add_source(name=hdulist[0].header['OBSERVER']))
+            if observer:
+                source = catalog.entries[name].add_source(name=observer)
+                sources.append(source)
+            source = ','.join(sources)
+
+            if summed:
+                wcol = 3
+                fcol = 4
+            else:
+                wcol = 2
+                fcol = 3
+            try:
+                waves = [str(x) for x in list(hdulist[1].data)[0][wcol]]
+                fluxes = [str(x) for x in list(hdulist[1].data)[0][fcol]]
+            except Exception:
+                print('Failed to find waves/fluxes for `{}`.'.format(filename))
                 continue
-            observer = spec['proposal_pi']
 
-            if use_cache:
-                scienceProducts = spec.get('sciProds', [])
+            if 'BUNIT' in hdrkeys:
+                fluxunit = hdulist[0].header['BUNIT']
+                if fluxunit in fureps:
+                    fluxunit = fureps[fluxunit]
             else:
-                productRequest = {'service': 'Mast.Caom.Products',
-                                  'params': {'obsid': obsid},
-                                  'format': 'json',
-                                  'pagesize': 100,
-                                  'page': 1}
-
-                try:
-                    headers, obsProductsString = mastQuery(productRequest)
-                except Exception:
-                    print('`mastQuery` failed for `{}`, skipping.'.format(obsid))
-                    continue
-
-                obsProducts = json.loads(obsProductsString)
-
-                if 'fields' not in obsProducts:
-                    print('`fields` not found for `{}`'.format(obsid))
-                    print(obsProducts)
-                    continue
-
-                sciProdArr = [x for x in obsProducts['data']
-                              if x.get("productType", None) == 'SCIENCE']
-                scienceProducts = OrderedDict()
-
-                for col, atype in [(x['name'], x['type']) for x in obsProducts['fields']]:
-                    if atype == "string":
-                        atype = "str"
-                    if atype == "boolean":
-                        atype = "bool"
-                    if atype == "int":
-                        # array may contain nan values, and they do not exist
-                        # in numpy integer arrays.
-                        atype = "float"
-                    scienceProducts[col] = [x.get(col, None) for x in sciProdArr]
-
-                spectra[si]['sciProds'] = scienceProducts
-
-            # print("Number of science products:", len(scienceProducts))
-            # print(scienceProducts)
-
-            search_str = '_x1d.fits'
-            summed = False
-            if any(['_x1dsum.fits' in x for x in scienceProducts['productFilename']]):
-                search_str = '_x1dsum.fits'
-                summed = True
-            if any(['_sx1.fits' in x for x in scienceProducts['productFilename']]):
-                search_str = '_sx1.fits'
-                summed = True
-            for ri in range(len(scienceProducts['productFilename'])):
-                if search_str not in scienceProducts['productFilename'][ri]:
-                    continue
-                filename = str(obsid) + "_" + scienceProducts['productFilename'][ri]
-                datafile = os.path.join(catalog.get_current_task_repo(), 'MAST', filename)
-                if not os.path.exists(datafile):
-                    # link is url, so can just dl
-                    if "http" in scienceProducts['dataURI'][ri]:
-                        urlretrieve(scienceProducts['dataURI'][ri], datafile)
-                    else:  # link is uri, need to go through direct dl request
-                        server = 'mast.stsci.edu'
-                        conn = httplib.HTTPSConnection(server)
-                        conn.request("GET", "/api/v0/download/file/" +
-                                     scienceProducts['dataURI'][ri].lstrip('mast:'))
-                        resp = conn.getresponse()
-                        fileContent = resp.read()
-                        with open(datafile, 'wb') as FLE:
-                            FLE.write(fileContent)
-                        conn.close()
-
-                try:
-                    hdulist = fits.open(datafile)
-                except Exception:
-                    print("Couldn't read `{}`, maybe private.".format(filename))
-                    os.remove(datafile)
-                    continue
-                for oi, obj in enumerate(hdulist[0].header):
-                    if any(x in ['.', '/'] for x in obj):
-                        del hdulist[0].header[oi]
-                hdulist[0].verify('silentfix')
-                hdrkeys = list(hdulist[0].header.keys())
-                # print(hdrkeys)
-                name = entry
-                if not name:
-                    name = hdulist[0].header['OBJECT']
-                name, source = catalog.new_entry(name, name=mastref, url=masturl, secondary=True)
-                sources = [source]
-                if 'OBSERVER' in hdrkeys:
-                    sources.append(
-                        catalog.entries[name].add_source(name=hdulist[0].header['OBSERVER']))
-                if observer:
-                    source = catalog.entries[name].add_source(name=observer)
-                    sources.append(source)
-                source = ','.join(sources)
-
-                if summed:
-                    wcol = 3
-                    fcol = 4
+                if max([float(x) for x in fluxes]) < 1.0e-5:
+                    fluxunit = 'erg/s/cm^2/Angstrom'
                 else:
-                    wcol = 2
-                    fcol = 3
-                try:
-                    waves = [str(x) for x in list(hdulist[1].data)[0][wcol]]
-                    fluxes = [str(x) for x in list(hdulist[1].data)[0][fcol]]
-                except Exception:
-                    print('Failed to find waves/fluxes for `{}`.'.format(filename))
-                    continue
-
-                if 'BUNIT' in hdrkeys:
-                    fluxunit = hdulist[0].header['BUNIT']
-                    if fluxunit in fureps:
-                        fluxunit = fureps[fluxunit]
-                else:
-                    if max([float(x) for x in fluxes]) < 1.0e-5:
-                        fluxunit = 'erg/s/cm^2/Angstrom'
-                    else:
-                        fluxunit = 'Uncalibrated'
-                specdict = {
-                    SPECTRUM.U_WAVELENGTHS: 'Angstrom',
-                    SPECTRUM.WAVELENGTHS: waves,
-                    SPECTRUM.TIME: mjd,
-                    SPECTRUM.U_TIME: 'MJD',
-                    SPECTRUM.FLUXES: fluxes,
-                    SPECTRUM.U_FLUXES: fluxunit,
-                    SPECTRUM.FILENAME: filename,
-                    SPECTRUM.SOURCE: source
-                }
-                if 'TELESCOP' in hdrkeys:
-                    specdict[SPECTRUM.TELESCOPE] = hdulist[0].header['TELESCOP']
-                if not instrument and 'INSTRUME' in hdrkeys:
-                    instrument = hdulist[0].header['INSTRUME']
-                if instrument:
-                    specdict[SPECTRUM.INSTRUMENT] = instrument
-                if 'SITENAME' in hdrkeys:
-                    specdict[SPECTRUM.OBSERVATORY] = hdulist[0].header['SITENAME']
-                elif 'OBSERVAT' in hdrkeys:
-                    specdict[SPECTRUM.OBSERVATORY] = hdulist[0].header['OBSERVAT']
-                if 'OBSERVER' in hdrkeys:
-                    specdict[SPECTRUM.OBSERVER] = hdulist[0].header['OBSERVER']
-                catalog.entries[name].add_spectrum(**specdict)
-        if not use_cache and (ci % 100 == 0 or ci == len(coords) - 1):
-            histdict[entry] = [time.time(), spectra]
-            json.dump(histdict, open(histfile, 'w'), indent='\t', separators=(',', ':'))
-        catalog.journal_entries()
-
-        mastcnt = mastcnt + 1
-        if (catalog.args.travis and mastcnt >= catalog.TRAVIS_QUERY_LIMIT):
-            break
-
-    return
+                    fluxunit = 'Uncalibrated'
+            specdict = {
+                SPECTRUM.U_WAVELENGTHS: 'Angstrom',
+                SPECTRUM.WAVELENGTHS: waves,
+                SPECTRUM.TIME: mjd,
+                SPECTRUM.U_TIME: 'MJD',
+                SPECTRUM.FLUXES: fluxes,
+                SPECTRUM.U_FLUXES: fluxunit,
+                SPECTRUM.FILENAME: filename,
+                SPECTRUM.SOURCE: source
+            }
+            if 'TELESCOP' in hdrkeys:
+                specdict[SPECTRUM.TELESCOPE] = hdulist[0].header['TELESCOP']
+            if not instrument and 'INSTRUME' in hdrkeys:
+                instrument = hdulist[0].header['INSTRUME']
+            if instrument:
+                specdict[SPECTRUM.INSTRUMENT] = instrument
+            if 'SITENAME' in hdrkeys:
+                specdict[SPECTRUM.OBSERVATORY] = hdulist[0].header['SITENAME']
+            elif 'OBSERVAT' in hdrkeys:
+                specdict[SPECTRUM.OBSERVATORY] = hdulist[0].header['OBSERVAT']
+            if 'OBSERVER' in hdrkeys:
+                specdict[SPECTRUM.OBSERVER] = hdulist[0].header['OBSERVER']
+            catalog.entries[name].add_spectrum(**specdict)
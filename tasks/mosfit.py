@@ -1,5 +1,8 @@
 """Import tasks related to MOSFiT."""
+import json
 import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
 
 import dropbox
@@ -8,13 +11,61 @@ from astrocats.utils import pbar
 from astrocats.structures.struct import PHOTOMETRY
 
 from supernovae.supernova import Supernova, SUPERNOVA
+from supernovae.utils import read_entry_json
 
+# Only realizations 1 to `REALIZATION_LIMIT - 1` of every model are kept
+REALIZATION_LIMIT = 10
+REALIZATIONS = {str(x) for x in range(1, REALIZATION_LIMIT)}
 
-def do_mosfit(catalog):
-    """Import models produced by MOSFiT from Dropbox."""
-    REALIZATION_LIMIT = 10
+
+def _kept_photometry(photo):
+    return photo.get(PHOTOMETRY.REALIZATION) in REALIZATIONS
+
+
+def _download_models(catalog, dbx, files, fdir):
+    """Download the Dropbox model `files` concurrently into `fdir`.
+
+    Interrupted downloads are resumed on the next run.
+    """
+    def download(entry):
+        link = dbx.files_get_temporary_link('/' + entry.name).link
+        catalog.fetcher.download_file(
+            link, os.path.join(fdir, entry.name), size=entry.size)
 
     task_str = catalog.get_current_task_str()
+    workers = max(catalog.get_current_task_concurrency(), 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [(entry, executor.submit(download, entry))
+                   for entry in files]
+        for entry, future in pbar(futures, desc=task_str):
+            try:
+                future.result()
+            except Exception as err:
+                catalog.log.warning("Download of MOSFiT model '{}' failed "
+                                    "('{}').".format(entry.name, err))
+
+
+def _load_model(catalog, fpath):
+    """Load the model file at `fpath` as a new `Supernova`.
+
+    The file is read incrementally and the photometry of realizations that
+    are not kept is dropped as it is read, so it is never held in memory.
+    """
+    name, data = read_entry_json(
+        fpath, keep={SUPERNOVA.PHOTOMETRY: _kept_photometry})
+    with tempfile.NamedTemporaryFile(
+            'w', suffix='.json', delete=False) as ff:
+        json.dump({name: data}, ff)
+    try:
+        return Supernova.init_from_file(
+            catalog, path=ff.name, compare_to_existing=False, clean=False,
+            merge=False)
+    finally:
+        os.remove(ff.name)
+
+
+def do_mosfit(catalog):
+    """Import models produced by MOSFiT from Dropbox."""
     try:
         with open('mosfit.key', 'r') as f:
             mosfitkey = f.read().splitlines()[0]
@@ -26,35 +77,24 @@ def do_mosfit(catalog):
 
     # Get new data from Dropbox.
     dbx = dropbox.Dropbox(mosfitkey)
-    files = list(sorted([
-        x.name for x in dbx.files_list_folder('').entries
-        if not x.name.startswith('.')
-    ]))
     fdir = os.path.join(catalog.get_current_task_repo(), 'MOSFiT')
     if not os.path.isdir(fdir):
         os.mkdir(fdir)
-    old_name = ''
-    for fname in pbar(files, desc=task_str):
-        fpath = os.path.join(fdir, fname)
-
-        if 'GW' in fpath:
-            continue
-
-        if not os.path.isfile(fpath):
-            md, res = dbx.files_download('/' + fname)
-            jtxt = res.content
-            with open(fpath, 'wb') as f:
-                f.write(jtxt)
+    files = [
+        x for x in sorted(dbx.files_list_folder('').entries,
+                          key=lambda x: x.name)
+        if not x.name.startswith('.') and 'GW' not in x.name and
+        not os.path.isfile(os.path.join(fdir, x.name))
+    ]
+    _download_models(catalog, dbx, files, fdir)
 
     # Load data in models folder.
     efiles = [x.split('/')[-1] for x in glob(
-        os.path.join(fdir, '*')) if '.json' in x]
+        os.path.join(fdir, '*')) if '.json' in x and not x.endswith('.part')]
+    old_name = ''
     for fname in efiles:
         fpath = os.path.join(fdir, fname)
-        new_entry = Supernova.init_from_file(
-            catalog, path=fpath, compare_to_existing=False, try_gzip=True,
-            clean=False, merge=False, filter_on={
-                'realization': [str(x) for x in range(1, REALIZATION_LIMIT)]})
+        new_entry = _load_model(catalog, fpath)
 
         name = new_entry[SUPERNOVA.NAME]
 
@@ -64,15 +104,6 @@ def do_mosfit(catalog):
             os.remove(fpath)
             continue
 
-        # Only take a number of realizations up to the realization limit.
-        new_photo = []
-        for photo in new_entry[SUPERNOVA.PHOTOMETRY]:
-            real = int(photo.get(PHOTOMETRY.REALIZATION, -1))
-            if real < 0 or real >= REALIZATION_LIMIT:
-                continue
-            new_photo.append(photo)
-        new_entry[SUPERNOVA.PHOTOMETRY] = new_photo
-
         old_entry = None
         if name in catalog.entries:
             if catalog.entries[name]._stub:
@@ -1,9 +1,13 @@
 '''Import tasks for NED-D, the galactic distances catalog.
 '''
 import csv
+import hashlib
 import os
 from collections import OrderedDict
 from html import unescape
+from itertools import islice
+
+import numpy as np
 
 from astrocats.utils import (get_sig_digits, is_number, pbar,
                                      pretty_num, uniq_cdl)
@@ -17,36 +21,106 @@ from ..supernova import SUPERNOVA
 from ..utils import host_clean, name_clean
 
 
+# Version of the parsed form; bump it when `_parse_nedd` changes.
+NEDD_CACHE_VERSION = 1
+NEDD_FIELDS = ['distname', 'name', 'dist', 'bibcode', 'snname', 'redshift',
+               'cleanhost', 'zderived']
+
+
+def _checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as ff:
+        for chunk in iter(lambda: ff.read(1 << 20), b''):
+            digest.update(chunk)
+    return '{}-v{}'.format(digest.hexdigest(), NEDD_CACHE_VERSION)
+
+
+def _redshift_at_distance(dist):
+    """Redshift (as a string) of comoving distance `dist` (Mpc), or ''."""
+    try:
+        zatval = z_at_value(cosmo.comoving_distance,
+                            float(dist) * un.Mpc, zmax=5.0)
+        return pretty_num(zatval, sig=get_sig_digits(str(dist)))
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    except Exception:
+        return ''
+
+
+def _parse_nedd(path):
+    """Parse the NED-D CSV at `path` into columns of strings (`NEDD_FIELDS`).
+
+    The file is streamed, keeping only the fields used per row, and rows
+    are sorted by SN and galaxy name.  `zderived` is the redshift derived
+    from the distance of SN rows without a redshift, solved once per
+    distinct distance.
+    """
+    with open(path, 'r') as f:
+        rows = [(row[3], row[6], row[8], row[9], row[10])
+                for row in islice(csv.reader(f, delimiter=',', quotechar='"'),
+                                  13, None)]
+    rows.sort(key=lambda x: (x[3], x[0]))
+    columns = {key: [] for key in NEDD_FIELDS}
+    zcache = {}
+    # The first 13 sorted rows have always been skipped
+    for distname, dist, bibcode, snname, redshift in rows[13:]:
+        name = name_clean(distname)
+        snname = name_clean(snname)
+        cleanhost = ''
+        if name != snname and (name + ' HOST' != snname):
+            cleanhost = host_clean(distname)
+            if cleanhost.endswith(' HOST'):
+                cleanhost = ''
+        zderived = ''
+        if snname and 'HOST' not in snname and dist and not redshift:
+            if dist not in zcache:
+                zcache[dist] = _redshift_at_distance(dist)
+            zderived = zcache[dist]
+        for key, val in zip(NEDD_FIELDS, [
+                distname, name, dist, unescape(bibcode), snname, redshift,
+                cleanhost, zderived]):
+            columns[key].append(val)
+    return {key: np.array(val, dtype=str) for key, val in columns.items()}
+
+
+def _load_nedd(catalog, path):
+    """Parsed columns of the NED-D CSV at `path`, cached by its checksum.
+
+    The parsed form is kept next to the CSV as a compressed NumPy file and
+    only rebuilt when the checksum of the CSV (or `NEDD_CACHE_VERSION`)
+    changes.
+    """
+    checksum = _checksum(path)
+    cache_path = path + '.parsed.npz'
+    if os.path.isfile(cache_path):
+        with np.load(cache_path) as data:
+            if str(data['checksum']) == checksum:
+                return {key: data[key] for key in NEDD_FIELDS}
+    catalog.log.info("Parsing '{}'.".format(path))
+    columns = _parse_nedd(path)
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'wb') as ff:
+        np.savez_compressed(ff, checksum=np.array(checksum), **columns)
+    os.replace(tmp_path, cache_path)
+    return columns
+
+
 def do_nedd(catalog):
     task_str = catalog.get_current_task_str()
     nedd_path = os.path.join(
         catalog.get_current_task_repo(), 'NED26.10.1-D-13.1.0-20160930.csv')
 
-    f = open(nedd_path, 'r')
-
-    data = sorted(list(csv.reader(f, delimiter=',', quotechar='"'))[
-                  13:], key=lambda x: (x[9], x[3]))
+    data = _load_nedd(catalog, nedd_path)
     reference = "NED-D v" + nedd_path.split('-')[-2]
     refurl = "http://ned.ipac.caltech.edu/Library/Distances/"
     nedbib = "1991ASSL..171...89H"
     olddistname = ''
     loopcnt = 0
-    for r, row in enumerate(pbar(data, task_str)):
-        if r <= 12:
-            continue
-        distname = row[3]
-        name = name_clean(distname)
-        # distmod = row[4]
-        # moderr = row[5]
-        dist = row[6]
-        bibcode = unescape(row[8])
-        snname = name_clean(row[9])
-        redshift = row[10]
-        cleanhost = ''
+    rows = zip(*[data[key].tolist() for key in NEDD_FIELDS])
+    for row in pbar(rows, task_str, total=len(data['distname'])):
+        (distname, name, dist, bibcode, snname, redshift, cleanhost,
+         zderived) = row
         if name != snname and (name + ' HOST' != snname):
-            cleanhost = host_clean(distname)
-            if cleanhost.endswith(' HOST'):
-                cleanhost = ''
             if not is_number(dist):
                 print(dist)
             if dist:
@@ -67,24 +141,14 @@ def do_nedd(catalog):
                 if dist:
                     catalog.entries[snname].add_quantity(
                         SUPERNOVA.COMOVING_DIST, dist, sources)
-                    if not redshift:
-                        try:
-                            zatval = z_at_value(cosmo.comoving_distance,
-                                                float(dist) * un.Mpc, zmax=5.0)
-                            sigd = get_sig_digits(str(dist))
-                            redshift = pretty_num(zatval, sig=sigd)
-                        except (KeyboardInterrupt, SystemExit):
-                            raise
-                        except Exception:
-                            pass
-                        else:
-                            cosmosource = catalog.entries[name].add_source(
-                                bibcode='2016A&A...594A..13P')
-                            combsources = uniq_cdl(sources.split(',') +
-                                                   [cosmosource])
-                            catalog.entries[snname].add_quantity(
-                                SUPERNOVA.REDSHIFT, redshift, combsources,
-                                derived=True)
+                    if not redshift and zderived:
+                        cosmosource = catalog.entries[name].add_source(
+                            bibcode='2016A&A...594A..13P')
+                        combsources = uniq_cdl(sources.split(',') +
+                                               [cosmosource])
+                        catalog.entries[snname].add_quantity(
+                            SUPERNOVA.REDSHIFT, zderived, combsources,
+                            derived=True)
             if cleanhost:
                 catalog.entries[snname].add_quantity(
                     SUPERNOVA.HOST, cleanhost, sources)
@@ -97,6 +161,4 @@ def do_nedd(catalog):
             break
     catalog.journal_entries()
 
-    f.close()
-
     return
@@ -3,17 +3,24 @@
 import csv
 import json
 import os
-import urllib
 import warnings
+from collections import OrderedDict
 from glob import glob
+from hashlib import md5
 
-import requests
 from astrocats.structures.struct import PHOTOMETRY
 from astrocats.utils import is_number, make_date_string, pbar, uniq_cdl
 from astropy.time import Time as astrotime
 from bs4 import BeautifulSoup
 
 from ..supernova import SUPERNOVA
+from ..utils import atomic_write, extract_rows, extract_tables, fix_html
+
+PS_THREEPI_URL = 'https://star.pst.qub.ac.uk/ps1threepi/psdb/public/'
+PS_THREEPI_BAD_ALIASES = ['SN1994J']
+PS_THREEPI_TELESCOPE = 'Pan-STARRS1'
+# Number of candidate pages downloaded per concurrent batch.
+PS_THREEPI_FETCH_BATCH = 16
 
 
 def do_ps_mds(catalog):
@@ -150,16 +157,175 @@ def do_ps_alerts(catalog):
     # print(missing_confirmed)
     return
 
+def _threepi_page_url(page):
+    return PS_THREEPI_URL + '?page=' + str(page) + '&sort=followup_flag_date'
+
+
+def _threepi_candidates(html):
+    """Parse the candidates listed on a page of the 3pi results.
+
+    Every candidate's `fingerprint` hashes the text of its whole row, so it
+    changes with the follow-up date (or any other listed property).
+    """
+    candidates = []
+    for tds in extract_rows(html):
+        if not tds or not tds[0].links:
+            continue
+        cand = {
+            'psname': tds[0].links[0].text,
+            'pslink': tds[0].links[0].href,
+            'ra': '',
+            'dec': '',
+            'ttype': '',
+            'ctype': None,
+            'refs': [],
+            'aliases': [],
+            'fingerprint': md5('\t'.join(
+                td.text for td in tds).encode('utf-8')).hexdigest()
+        }
+        cand['id'] = cand['pslink'].rstrip('/').split('/')[-1]
+        for tdi, td in enumerate(tds):
+            if tdi == 1:
+                cand['ra'] = td.parts[0]
+            elif tdi == 2:
+                cand['dec'] = td.parts[0]
+            elif tdi == 3:
+                cand['ttype'] = td.parts[0]
+                if cand['ttype'] != 'sn' and cand['ttype'] != 'orphan':
+                    break
+            elif tdi == 6:
+                if not td.parts:
+                    continue
+                if td.parts[0] != 'Observed':
+                    cand['ctype'] = td.parts[0]
+            elif tdi == 17:
+                for cref in td.links:
+                    if 'atel' in cref.text.lower():
+                        cand['refs'].append([cref.text, cref.href])
+                    elif is_number(cref.text[:4]):
+                        continue
+                    else:
+                        cand['aliases'].append(cref.text)
+        candidates.append(cand)
+    return candidates
+
+
+def _add_threepi_candidate(catalog, cand, html2):
+    """Add a 3pi candidate, with the light curve of its page `html2`."""
+    name = None
+    for alias in cand['aliases']:
+        if alias in PS_THREEPI_BAD_ALIASES:
+            continue
+        if alias[:2] == 'SN':
+            name = alias
+    if name is None:
+        name = cand['psname']
+    name = catalog.add_entry(name)
+    sources = [
+        catalog.entries[name].add_source(
+            name='Pan-STARRS 3Pi', url='https://star.pst.qub.ac.uk/ps1threepi/psdb/')
+    ]
+    catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, sources[0])
+    for ref in cand['refs']:
+        sources.append(catalog.entries[name].add_source(name=ref[0], url=ref[1]))
+    source = uniq_cdl(sources)
+    for alias in cand['aliases']:
+        newalias = alias
+        if alias[:3] in ['CSS', 'SSS', 'MLS']:
+            newalias = alias.replace('-', ':', 1)
+        newalias = newalias.replace('PSNJ', 'PSN J')
+        catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, newalias, source)
+    catalog.entries[name].add_quantity(SUPERNOVA.RA, cand['ra'], source)
+    catalog.entries[name].add_quantity(SUPERNOVA.DEC, cand['dec'], source)
+    if cand['ctype'] is not None:
+        catalog.entries[name].add_quantity(
+            SUPERNOVA.CLAIMED_TYPE, cand['ctype'], source)
+    if html2 is None:
+        return
+
+    # The light curves are pushed line by line by inline scripts
+    nslines = []
+    nslabels = []
+    for line in html2.splitlines():
+        if 'jslcdata.push' in line:
+            json_fname = (line.strip()
+                          .replace('jslcdata.push(', '')
+                          .replace(');', ''))
+            nslines.append(json.loads(json_fname))
+        if ('jslabels.push' in line and 'blanks' not in line and
+                'non det' not in line):
+            json_fname = (line.strip()
+                          .replace('jslabels.push(', '')
+                          .replace(');', ''))
+            nslabels.append(json.loads(json_fname)['label'])
+    for li, line in enumerate(nslines[:len(nslabels)]):
+        if not line:
+            continue
+        for obs in line:
+            catalog.entries[name].add_photometry(
+                time=str(obs[0]),
+                u_time='MJD',
+                band=nslabels[li],
+                instrument='GPC',
+                magnitude=str(obs[1]),
+                e_magnitude=str(obs[2]),
+                source=source,
+                telescope=PS_THREEPI_TELESCOPE)
+    # Ignoring upper limits as they are usually spurious chip gaps.
+    # for li, line in enumerate(nslines[2 * len(nslabels):]):
+    #     if not line:
+    #         continue
+    #     for obs in line:
+    #         catalog.entries[name].add_photometry(
+    #             time=str(obs[0]),
+    #             u_time='MJD',
+    #             band=nslabels[li],
+    #             instrument='GPC',
+    #             magnitude=str(obs[1]),
+    #             upperlimit=True,
+    #             source=source,
+    #             telescope=PS_THREEPI_TELESCOPE)
+    assoctabs = extract_tables(html2, attrs={'class': 'generictable'})
+    hostname = None
+    redshift = None
+    if assoctabs:
+        tds = assoctabs[0][1]
+        headertds = [x.parts[0] for x in tds]
+        for tdi, td in enumerate(tds):
+            if tdi == 1:
+                hostname = td.parts[0].strip()
+            elif tdi == 4:
+                if 'z' in headertds:
+                    redshift = td.parts[0].strip()
+    # Skip galaxies with just SDSS id
+    if hostname is not None:
+        if is_number(hostname):
+            return
+        catalog.entries[name].add_quantity(SUPERNOVA.HOST, hostname, source)
+
+    if redshift is not None:
+        for qkey in [SUPERNOVA.REDSHIFT, SUPERNOVA.HOST_REDSHIFT]:
+            catalog.entries[name].add_quantity(qkey, redshift, source, kind='host')
+
 
 def do_ps_threepi(catalog):
-    """Import data from Pan-STARRS' 3pi page."""
+    """Import data from Pan-STARRS' 3pi page.
+
+    The results are sorted by follow-up date, most recent first, so they are
+    crawled incrementally: `3pi/crawl-state.json` keeps the fingerprint of
+    the listing row of every candidate added.  Once a results page only
+    lists candidates with unchanged rows (the watermark), the following
+    pages are read from the cache instead of downloaded, and not read at all
+    in update mode, where unchanged candidates are also skipped.  Only the
+    candidate pages of new or changed candidates are downloaded, concurrently.
+    Pages that fail to download are read from the cache, but neither set the
+    watermark nor update the fingerprints, so they are retried next time.
+    """
     task_str = catalog.get_current_task_str()
-    bad_aliases = ['SN1994J']
-    teles = 'Pan-STARRS1'
-    fname = os.path.join(catalog.get_current_task_repo(), '3pi/page00.html')
-    ps_url = ("https://star.pst.qub.ac.uk/"
-              "ps1threepi/psdb/public/?page=1&sort=followup_flag_date")
-    html = catalog.load_url(ps_url, fname, write=False, update_mode=True)
+    threepi_path = os.path.join(catalog.get_current_task_repo(), '3pi')
+    fname = os.path.join(threepi_path, 'page00.html')
+    html = catalog.load_url(_threepi_page_url(1), fname, write=False,
+                            update_mode=True)
 
     archived_flag = (catalog.args.archived or catalog.current_task.archived)
 
@@ -168,10 +334,7 @@ def do_ps_threepi(catalog):
     if not html:
         offline = True
     else:
-        # Clean some common HTML manglings
-        html = html.replace('ahref=', 'a href=')
-
-        bs = BeautifulSoup(html, 'html5lib')
+        bs = BeautifulSoup(fix_html(html), 'html5lib')
         div = bs.find('div', {'class': 'pagination'})
         if not div:
             offline = True
@@ -186,209 +349,105 @@ def do_ps_threepi(catalog):
         warnings.warn('Pan-STARRS 3pi offline, using local files only.')
         with open(fname, 'r') as f:
             html = f.read()
-        bs = BeautifulSoup(html, 'html5lib')
+        bs = BeautifulSoup(fix_html(html), 'html5lib')
         div = bs.find('div', {'class': 'pagination'})
         links = div.findAll('a')
     else:
         with open(fname, 'w') as f:
             f.write(html)
 
+    state_path = os.path.join(threepi_path, 'crawl-state.json')
+    seen = {}
+    if os.path.isfile(state_path):
+        with open(state_path, 'r') as f:
+            seen = json.load(f)
+
     numpages = int(links[-2].contents[0]) + 1
-    oldnumpages = len(
-        glob(os.path.join(catalog.get_current_task_repo(), '3pi/page*')))
+    oldnumpages = len(glob(os.path.join(threepi_path, 'page*')))
+    candidates = OrderedDict()
+    watermark = False
     for page in pbar(range(1, numpages), task_str):
-        fname = os.path.join(catalog.get_current_task_repo(), '3pi/page') + \
+        if watermark and catalog.args.update:
+            break
+        current = True
+        fname = os.path.join(threepi_path, 'page') + \
             str(page).zfill(2) + '.html'
-        if offline:
-            if not os.path.isfile(fname):
+        cached = os.path.isfile(fname)
+        if offline or (cached and (watermark or (
+                archived_flag and page < oldnumpages))):
+            if not cached:
                 continue
             with open(fname, 'r') as f:
                 html = f.read()
         else:
-            if archived_flag and (page < oldnumpages) and os.path.isfile(fname):
-                with open(fname, 'r') as f:
-                    html = f.read()
-            else:
-                response = urllib.request.urlopen(
-                    "https://star.pst.qub.ac.uk/ps1threepi/psdb/public/?page=" +
-                    str(page) + "&sort=followup_flag_date")
-                with open(fname, 'w') as f:
-                    html = response.read().decode('utf-8')
-                    f.write(html)
-
-        bs = BeautifulSoup(html, 'html5lib')
-        trs = bs.findAll('tr')
-        for tr in pbar(trs, task_str):
-            tds = tr.findAll('td')
-            if not tds:
-                continue
-            refs = []
-            aliases = []
-            ttype = ''
-            ctype = None
-            for tdi, td in enumerate(tds):
-                if tdi == 0:
-                    psname = td.contents[0]
-                    pslink = psname['href']
-                    psname = psname.text
-                elif tdi == 1:
-                    ra = td.contents[0]
-                elif tdi == 2:
-                    dec = td.contents[0]
-                elif tdi == 3:
-                    ttype = td.contents[0]
-                    if ttype != 'sn' and ttype != 'orphan':
-                        break
-                elif tdi == 6:
-                    if not td.contents:
-                        continue
-                    ctype = td.contents[0]
-                    if ctype == 'Observed':
-                        ctype = None
-                elif tdi == 17:
-                    if td.contents:
-                        crossrefs = td.findAll('a')
-                        for cref in crossrefs:
-                            if 'atel' in cref.contents[0].lower():
-                                refs.append([cref.contents[0], cref['href']])
-                            elif is_number(cref.contents[0][:4]):
-                                continue
-                            else:
-                                aliases.append(cref.contents[0])
-
-            if ttype != 'sn' and ttype != 'orphan':
+            result = catalog.fetcher.fetch(_threepi_page_url(page), fname)
+            html = result.text
+            if html is None:
                 continue
+            # A cached copy read after a failed download may be stale
+            current = result.ok
 
-            name = None
-            for alias in aliases:
-                if alias in bad_aliases:
-                    continue
-                if alias[:2] == 'SN':
-                    name = alias
-            if name is None:
-                name = psname
-            name = catalog.add_entry(name)
-            sources = [
-                catalog.entries[name].add_source(
-                    name='Pan-STARRS 3Pi', url='https://star.pst.qub.ac.uk/ps1threepi/psdb/')
-            ]
-            catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, sources[0])
-            for ref in refs:
-                sources.append(catalog.entries[name].add_source(name=ref[0], url=ref[1]))
-            source = uniq_cdl(sources)
-            for alias in aliases:
-                newalias = alias
-                if alias[:3] in ['CSS', 'SSS', 'MLS']:
-                    newalias = alias.replace('-', ':', 1)
-                newalias = newalias.replace('PSNJ', 'PSN J')
-                catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, newalias, source)
-            catalog.entries[name].add_quantity(SUPERNOVA.RA, ra, source)
-            catalog.entries[name].add_quantity(SUPERNOVA.DEC, dec, source)
-            if ctype is not None:
-                catalog.entries[name].add_quantity(SUPERNOVA.CLAIMED_TYPE, ctype, source)
-
-            fname2 = os.path.join(catalog.get_current_task_repo(), '3pi/candidate-')
-            fname2 += pslink.rstrip('/').split('/')[-1] + '.html'
-            if offline:
-                if not os.path.isfile(fname2):
-                    continue
-                with open(fname2, 'r') as f:
-                    html2 = f.read()
-            else:
-                if archived_flag and os.path.isfile(fname2):
-                    with open(fname2, 'r') as f:
-                        html2 = f.read()
-                else:
-                    pslink = 'https://star.pst.qub.ac.uk/ps1threepi/psdb/public/' + pslink
-                    try:
-                        session2 = requests.Session()
-                        response2 = session2.get(pslink)
-                    except Exception:
-                        offline = True
-                        if not os.path.isfile(fname2):
-                            continue
-                        with open(fname2, 'r') as f:
-                            html2 = f.read()
-                    else:
-                        html2 = response2.text
-                        with open(fname2, 'w') as f:
-                            f.write(html2)
-
-            bs2 = BeautifulSoup(html2, 'html5lib')
-            scripts = bs2.findAll('script')
-            nslines = []
-            nslabels = []
-            for script in scripts:
-                if 'jslcdata.push' not in script.text:
-                    continue
-                slines = script.text.splitlines()
-                for line in slines:
-                    if 'jslcdata.push' in line:
-                        json_fname = (line.strip()
-                                      .replace('jslcdata.push(', '')
-                                      .replace(');', ''))
-                        nslines.append(json.loads(json_fname))
-                    if ('jslabels.push' in line and 'blanks' not in line and
-                            'non det' not in line):
-                        json_fname = (line.strip()
-                                      .replace('jslabels.push(', '')
-                                      .replace(');', ''))
-                        nslabels.append(json.loads(json_fname)['label'])
-            for li, line in enumerate(nslines[:len(nslabels)]):
-                if not line:
-                    continue
-                for obs in line:
-                    catalog.entries[name].add_photometry(
-                        time=str(obs[0]),
-                        u_time='MJD',
-                        band=nslabels[li],
-                        instrument='GPC',
-                        magnitude=str(obs[1]),
-                        e_magnitude=str(obs[2]),
-                        source=source,
-                        telescope=teles)
-            # Ignoring upper limits as they are usually spurious chip gaps.
-            # for li, line in enumerate(nslines[2 * len(nslabels):]):
-            #     if not line:
-            #         continue
-            #     for obs in line:
-            #         catalog.entries[name].add_photometry(
-            #             time=str(obs[0]),
-            #             u_time='MJD',
-            #             band=nslabels[li],
-            #             instrument='GPC',
-            #             magnitude=str(obs[1]),
-            #             upperlimit=True,
-            #             source=source,
-            #             telescope=teles)
-            assoctab = bs2.find('table', {'class': 'generictable'})
-            hostname = None
-            redshift = None
-            if assoctab:
-                trs = assoctab.findAll('tr')
-                headertds = [x.contents[0] for x in trs[1].findAll('td')]
-                tds = trs[1].findAll('td')
-                for tdi, td in enumerate(tds):
-                    if tdi == 1:
-                        hostname = td.contents[0].strip()
-                    elif tdi == 4:
-                        if 'z' in headertds:
-                            redshift = td.contents[0].strip()
-            # Skip galaxies with just SDSS id
-            if hostname is not None:
-                if is_number(hostname):
-                    continue
-                catalog.entries[name].add_quantity(SUPERNOVA.HOST, hostname, source)
-
-            if redshift is not None:
-                for qkey in [SUPERNOVA.REDSHIFT, SUPERNOVA.HOST_REDSHIFT]:
-                    catalog.entries[name].add_quantity(qkey, redshift, source, kind='host')
-            if catalog.args.update:
-                catalog.journal_entries()
-
-        catalog.journal_entries()
+        page_cands = _threepi_candidates(html)
+        # Pages read after the watermark may be stale, listings having
+        # moved down since they were cached: the first listing seen wins
+        for cand in page_cands:
+            candidates.setdefault(cand['id'], cand)
+        if (not watermark and current and page_cands and all(
+                seen.get(cand['id']) == cand['fingerprint']
+                for cand in page_cands)):
+            catalog.log.info(
+                'Pan-STARRS 3pi watermark reached on page {}.'.format(page))
+            watermark = True
 
         if catalog.args.travis:
             break
 
+    changed = {cid for cid, cand in candidates.items()
+               if seen.get(cid) != cand['fingerprint']}
+    todo = [cand for cid, cand in candidates.items()
+            if cand['ttype'] in ('sn', 'orphan') and
+            (cid in changed or not catalog.args.update)]
+    catalog.log.info('{} of {} Pan-STARRS 3pi candidates new or changed.'
+                     .format(len(changed), len(candidates)))
+    for cid, cand in candidates.items():
+        if cand['ttype'] not in ('sn', 'orphan'):
+            seen[cid] = cand['fingerprint']
+
+    failed = 0
+    for bi in pbar(range(0, len(todo), PS_THREEPI_FETCH_BATCH), task_str):
+        batch = todo[bi:bi + PS_THREEPI_FETCH_BATCH]
+        paths = [os.path.join('3pi', 'candidate-' + cand['id'] + '.html')
+                 for cand in batch]
+        fetch = [ii for ii, cand in enumerate(batch) if not offline and (
+            cand['id'] in changed or not os.path.isfile(
+                os.path.join(catalog.get_current_task_repo(), paths[ii])))]
+        fetched = dict(zip(fetch, catalog.fetch_many(
+            [PS_THREEPI_URL + batch[ii]['pslink'] for ii in fetch],
+            [paths[ii] for ii in fetch], archived_mode=archived_flag)))
+        for ii, cand in enumerate(batch):
+            current = True
+            if ii in fetched:
+                html2 = fetched[ii].text
+                current = fetched[ii].ok
+                if not current:
+                    failed += 1
+            else:
+                html2 = None
+                path = os.path.join(catalog.get_current_task_repo(),
+                                    paths[ii])
+                if os.path.isfile(path):
+                    with open(path, 'r') as f:
+                        html2 = f.read()
+            _add_threepi_candidate(catalog, cand, html2)
+            # Candidates whose page could not be downloaded are retried
+            if html2 is not None and current:
+                seen[cand['id']] = cand['fingerprint']
+        catalog.journal_entries()
+    if failed:
+        catalog.log.warning('{} Pan-STARRS 3pi candidate pages could not be '
+                            'downloaded.'.format(failed))
+
+    atomic_write(state_path, json.dumps(
+        seen, indent='\t', separators=(',', ':'), sort_keys=True))
+    catalog.journal_entries()
     return
@@ -1,15 +1,14 @@
 """Import tasks for David Bishop's Latest Supernovae page."""
 import csv
 import os
-import re
 from math import floor
 from string import ascii_letters
 
 from astrocats.utils import is_number, make_date_string, pbar, uniq_cdl
 from astropy.time import Time as astrotime
-from bs4 import BeautifulSoup
 
 from ..supernova import SUPERNOVA
+from ..utils import extract_rows
 
 
 def do_rochester(catalog):
@@ -74,22 +73,20 @@ def do_rochester(catalog):
         if not html:
             continue
 
-        soup = BeautifulSoup(html, 'html5lib')
-        rows = soup.findAll('tr')
+        rows = extract_rows(html)
         sec_ref = 'Latest Supernovae'
         sec_refurl = ('http://www.rochesterastronomy.org/'
                       'snimages/snredshiftall.html')
         loopcnt = 0
-        for rr, row in enumerate(pbar(rows, task_str)):
+        for rr, cols in enumerate(pbar(rows, task_str)):
             if rr == 0:
                 continue
-            cols = row.findAll('td')
             if not len(cols):
                 continue
 
             name = ''
-            if cols[cns['aka']].contents:
-                for rawaka in str(cols[cns['aka']].contents[0]).split(','):
+            if cols[cns['aka']].parts:
+                for rawaka in cols[cns['aka']].parts[0].split(','):
                     aka = rawaka.strip()
                     if is_number(aka.strip('?')):
                         aka = 'SN' + aka.strip('?') + 'A'
@@ -101,8 +98,7 @@ def do_rochester(catalog):
                         name = catalog.add_entry(aka)
 
 
-            sn = re.sub('<[^<]+?>', '',
-                        str(cols[cns['name']].contents[0])).strip()
+            sn = cols[cns['name']].parts[0].strip()
             if is_number(sn.strip('?')):
                 sn = 'SN' + sn.strip('?') + 'A'
             elif len(sn) == 4 and is_number(sn[:4]):
@@ -111,8 +107,8 @@ def do_rochester(catalog):
                 if not sn or sn in ['Transient']:
                     continue
 
-            ra = str(cols[cns['ra']].contents[0]).strip()
-            dec = str(cols[cns['dec']].contents[0]).strip()
+            ra = cols[cns['ra']].parts[0].strip()
+            dec = cols[cns['dec']].parts[0].strip()
 
             if not name:
                 if sn[:8] == 'MASTER J':
@@ -127,10 +123,10 @@ def do_rochester(catalog):
                 name=sec_ref, url=sec_refurl, secondary=True)
             sources = []
             if 'ref' in cns:
-                reftag = reference = cols[cns['ref']].findAll('a')
-                if len(reftag) and len(reftag[0].contents):
-                    reference = reftag[0].contents[0].strip()
-                    refurl = reftag[0]['href'].strip()
+                reftag = reference = cols[cns['ref']].links
+                if len(reftag) and reftag[0].text:
+                    reference = reftag[0].text.strip()
+                    refurl = reftag[0].href.strip()
                     sources.append(catalog.entries[name].add_source(
                         name=reference, url=refurl))
             sources.append(sec_source)
@@ -139,8 +135,8 @@ def do_rochester(catalog):
                                                sources)
             catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, sn, sources)
 
-            if cols[cns['aka']].contents:
-                for rawaka in str(cols[cns['aka']].contents[0]).split(','):
+            if cols[cns['aka']].parts:
+                for rawaka in cols[cns['aka']].parts[0].split(','):
                     aka = rawaka.strip()
                     if aka == 'SNR G1.9+0.3':
                         aka = 'G001.9+00.3'
@@ -155,18 +151,18 @@ def do_rochester(catalog):
                     catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, aka,
                                                        sources)
 
-            if str(cols[cns['type']].contents[0]).strip() != 'unk':
-                type = str(cols[cns['type']].contents[0]).strip(' :,')
+            if cols[cns['type']].parts[0].strip() != 'unk':
+                type = cols[cns['type']].parts[0].strip(' :,')
                 catalog.entries[name].add_quantity(SUPERNOVA.CLAIMED_TYPE,
                                                    type, sources)
-            if (len(cols[cns['host']].contents) > 0 and
-                    str(cols[cns['host']].contents[0]).strip() != 'anonymous'):
+            if (len(cols[cns['host']].parts) > 0 and
+                    cols[cns['host']].parts[0].strip() != 'anonymous'):
                 catalog.entries[name].add_quantity(
                     SUPERNOVA.HOST,
-                    str(cols[cns['host']].contents[0]).strip(), sources)
+                    cols[cns['host']].parts[0].strip(), sources)
             catalog.entries[name].add_quantity(SUPERNOVA.RA, ra, sources)
             catalog.entries[name].add_quantity(SUPERNOVA.DEC, dec, sources)
-            discstr = str(cols[cns['disc']].contents[0]).strip()
+            discstr = cols[cns['disc']].parts[0].strip()
             if discstr and discstr not in baddates:
                 if '/' not in discstr:
                     astrot = astrotime(float(discstr), format='jd').datetime
@@ -176,7 +172,7 @@ def do_rochester(catalog):
                     ddate = discstr
                 catalog.entries[name].add_quantity(SUPERNOVA.DISCOVER_DATE,
                                                    ddate, sources)
-            maxstr = str(cols[cns.get('max', '')].contents[0]).strip()
+            maxstr = cols[cns.get('max', '')].parts[0].strip()
             if maxstr and maxstr not in baddates:
                 try:
                     if '/' not in maxstr:
@@ -187,29 +183,29 @@ def do_rochester(catalog):
                 except:
                     catalog.log.info(
                         'Max date conversion failed for `{}`.'.format(maxstr))
-                if ((float(str(cols[cns['mmag']].contents[0]).strip()) <= 90.0
+                if ((float(cols[cns['mmag']].parts[0].strip()) <= 90.0
                      and
                      not any('GRB' in xx
                              for xx in catalog.entries[name].get_aliases()))):
-                    mag = str(cols[cns['mmag']].contents[0]).strip()
+                    mag = cols[cns['mmag']].parts[0].strip()
                     catalog.entries[name].add_photometry(
                         time=str(astrot.mjd),
                         u_time='MJD',
                         magnitude=mag,
                         source=sources)
-            if 'z' in cns and cols[cns['z']].contents[0] != 'n/a':
+            if 'z' in cns and cols[cns['z']].parts[0] != 'n/a':
                 catalog.entries[name].add_quantity(
                     SUPERNOVA.REDSHIFT,
-                    str(cols[cns['z']].contents[0]).strip(), sources)
+                    cols[cns['z']].parts[0].strip(), sources)
             if 'zh' in cns:
-                zhost = str(cols[cns['zh']].contents[0]).strip()
+                zhost = cols[cns['zh']].parts[0].strip()
                 if is_number(zhost):
                     catalog.entries[name].add_quantity(SUPERNOVA.REDSHIFT,
                                                        zhost, sources)
             if 'dver' in cns:
                 catalog.entries[name].add_quantity(
                     SUPERNOVA.DISCOVERER,
-                    str(cols[cns['dver']].contents[0]).strip(), sources)
+                    cols[cns['dver']].parts[0].strip(), sources)
             if catalog.args.update:
                 catalog.journal_entries()
             loopcnt = loopcnt + 1
@@ -260,7 +256,7 @@ def do_rochester(catalog):
                         if int(magnitude) > 100:
                             magnitude = magnitude[:2] + '.' + magnitude[2:]
 
-                    if float(str(cols[8].contents[0]).strip()) >= 90.0:
+                    if float(cols[8].parts[0].strip()) >= 90.0:
                         continue
 
                     if len(row) >= 4:
@@ -1,6 +1,11 @@
 """Import tasks for the SIMBAD astrophysical database.
 """
+import os
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
 
 from astrocats.utils import is_number, pbar, single_spaces, uniq_cdl
 from astroquery.simbad import Simbad
@@ -10,6 +15,103 @@ from ..utils import name_clean
 
 RAISE_ERROR_ON_MIRRORS_FAILURE = False
 
+SIMBAD_MIRRORS = ['http://simbad.harvard.edu/simbad/sim-script',
+                  'http://simbad.u-strasbg.fr/simbad/sim-script']
+SIMBAD_TIMEOUT = 120
+# Seconds during which the local snapshot is used instead of querying SIMBAD
+SIMBAD_SNAPSHOT_TTL = 7 * 86400
+
+
+def _query_mirror(mirror):
+    customSimbad = Simbad()
+    customSimbad.ROW_LIMIT = -1
+    customSimbad.TIMEOUT = SIMBAD_TIMEOUT
+    customSimbad.SIMBAD_URL = mirror
+    customSimbad.add_votable_fields('otype', 'sptype', 'sp_bibcode', 'id')
+    return customSimbad.query_criteria('maintype=SN | maintype="SN?"')
+
+
+def _race_mirrors(log):
+    """Query all SIMBAD mirrors at once and return the first non-empty table.
+
+    Returns `None` if every mirror failed.
+    """
+    executor = ThreadPoolExecutor(max_workers=len(SIMBAD_MIRRORS))
+    futures = {executor.submit(_query_mirror, mirror): mirror
+               for mirror in SIMBAD_MIRRORS}
+    table = None
+    try:
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception:
+                result = None
+            if result:
+                table = result
+                log.info("Loaded SIMBAD from '{}'.".format(futures[future]))
+                break
+            log.warning(
+                "Failed to load from SIMBAD mirror '{}'".format(futures[future]))
+    finally:
+        # Slower mirrors are not waited for
+        executor.shutdown(wait=False)
+    return table
+
+
+def _column_strings(column):
+    """Values of a table column as an array of strings, masked ones empty."""
+    values = np.asarray(column)
+    if values.dtype.kind == 'S':
+        values = np.char.decode(values, 'utf-8')
+    elif values.dtype.kind == 'O':
+        values = np.array([x.decode('utf-8') if isinstance(x, bytes) else str(x)
+                           for x in values], dtype=str)
+    else:
+        values = values.astype(str)
+    return np.where(np.ma.getmaskarray(column), '', values)
+
+
+def _load_snapshot(path):
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def _save_snapshot(path, columns):
+    dirname = os.path.dirname(path)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as ff:
+        np.savez_compressed(ff, **columns)
+    os.replace(tmp_path, path)
+
+
+def _simbad_columns(catalog):
+    """Columns of the SIMBAD SN table as string arrays.
+
+    Read from the snapshot in the task repository if it is younger than
+    `SIMBAD_SNAPSHOT_TTL` (or in archived mode); otherwise the mirrors are
+    raced and the snapshot rewritten.  A stale snapshot is used if every
+    mirror fails.  Returns `None` if no table is available.
+    """
+    log = catalog.log
+    path = os.path.join(catalog.get_current_task_repo(), 'SIMBAD',
+                        'snapshot.npz')
+    if os.path.isfile(path) and (
+            catalog.args.archived or
+            time.time() - os.path.getmtime(path) < SIMBAD_SNAPSHOT_TTL):
+        return _load_snapshot(path)
+
+    table = _race_mirrors(log)
+    if not table:
+        if os.path.isfile(path):
+            log.warning("SIMBAD unable to load, using stale snapshot.")
+            return _load_snapshot(path)
+        return None
+    columns = {name: _column_strings(table[name]) for name in table.colnames}
+    _save_snapshot(path, columns)
+    return columns
+
 
 def do_simbad(catalog):
     # Simbad.list_votable_fields()
@@ -17,8 +119,6 @@ def do_simbad(catalog):
     # the host.
     task_str = catalog.get_current_task_str()
     log = catalog.log
-    simbadmirrors = ['http://simbad.harvard.edu/simbad/sim-script',
-                     'http://simbad.u-strasbg.fr/simbad/sim-script']
     simbadbadcoordbib = ['2013ApJ...770..107C']
     simbadbadtypebib = ['2014ApJ...796...87I', '2015MNRAS.448.1206M',
                         '2015ApJ...807L..18N']
@@ -27,30 +127,9 @@ def do_simbad(catalog):
                         '2002ApJ...566..880G']
     simbadbannedcats = ['[TBV2008]', 'OGLE-MBR']
     simbadbannednames = ['SN']
-    customSimbad = Simbad()
-    customSimbad.ROW_LIMIT = -1
-    customSimbad.TIMEOUT = 120
-    customSimbad.add_votable_fields('otype', 'sptype', 'sp_bibcode', 'id')
-    table = []
-    print(customSimbad.SIMBAD_URL)
-    for mirror in simbadmirrors:
-        fail = False
-        customSimbad.SIMBAD_URL = mirror
-        try:
-            table = customSimbad.query_criteria('maintype=SN | maintype="SN?"')
-        except Exception:
-            fail = True
-        else:
-            if not table:
-                fail = True
-            else:
-                break
-
-        if fail:
-            log.warning(
-                "Failed to load from SIMBAD mirror '{}'".format(mirror))
+    cols = _simbad_columns(catalog)
 
-    if not table:
+    if cols is None:
         err = "SIMBAD unable to load, probably offline."
         if RAISE_ERROR_ON_MIRRORS_FAILURE:
             log.raise_error(err)
@@ -58,21 +137,19 @@ def do_simbad(catalog):
             log.error(err)
             return
 
+    # Skip items with no bibliographic info aside from SIMBAD, too
+    # error-prone
+    keep = ~((cols['OTYPE'] == 'Candidate_SN*') & (cols['SP_TYPE'] == ''))
+    keep &= ((cols['COO_BIBCODE'] != '') | (cols['SP_BIBCODE'] != '') |
+             (cols['SP_BIBCODE_2'] != ''))
+    for cat in simbadbannedcats:
+        keep &= np.char.find(cols['MAIN_ID'], cat) < 0
+    keep &= ~np.isin(cols['COO_BIBCODE'], simbadbadnamebib)
+    rows = [dict(zip(cols, values)) for values in zip(
+        *[col[keep].tolist() for col in cols.values()])]
+
     # 2000A&AS..143....9W
-    for brow in pbar(table, task_str):
-        row = {x: re.sub(r'b\'(.*)\'', r'\1',
-                         str(brow[x])) for x in brow.colnames}
-        # Skip items with no bibliographic info aside from SIMBAD, too
-        # error-prone
-        if row['OTYPE'] == 'Candidate_SN*' and not row['SP_TYPE']:
-            continue
-        if (not row['COO_BIBCODE'] and not row['SP_BIBCODE'] and
-                not row['SP_BIBCODE_2']):
-            continue
-        if any([x in row['MAIN_ID'] for x in simbadbannedcats]):
-            continue
-        if row['COO_BIBCODE'] and row['COO_BIBCODE'] in simbadbadnamebib:
-            continue
+    for row in pbar(rows, task_str):
         name = single_spaces(re.sub(r'\[[^)]*\]', '', row['MAIN_ID']).strip())
         if name in simbadbannednames:
             continue
@@ -1,5 +1,11 @@
 """Import tasks for the Sloan Digital Sky Survey.
 """
+import json
+import os
+import time
+import warnings
+from hashlib import sha256
+
 import numpy as np
 import sncosmo
 from astrocats.structures.struct import PHOTOMETRY
@@ -8,10 +14,18 @@ from astrocats.utils import pbar
 from astropy.table import Table
 
 from ..supernova import SUPERNOVA
+from ..utils import atomic_write, parse_in_pool
 
+# Model fitted to the light curves, as (name, version)
+SNCOSMO_MODEL = ('salt2', '2.4')
+# Bumped when the fitting rules change, invalidating cached fits
+SNCOSMO_FIT_VERSION = 1
+# Lower redshift bounds of the (overlapping) fit windows, and their width
+SNCOSMO_WINDOWS = np.linspace(0.0, 1.0, 19)
+SNCOSMO_WINDOW_WIDTH = 0.1
 
-def do_sncosmo(catalog):
-    import warnings
+
+def _ignore_fit_warnings():
     warnings.filterwarnings("ignore", message="fcn returns Nan")
     warnings.filterwarnings("ignore", message="overflow encountered in power")
     warnings.filterwarnings(
@@ -22,9 +36,88 @@ def do_sncosmo(catalog):
     warnings.filterwarnings(
         "ignore", message="overflow encountered in multiply")
 
+
+def _fit_key(photodat):
+    """Cache key of the fit of the `photodat` rows."""
+    return sha256(json.dumps(
+        [SNCOSMO_MODEL, SNCOSMO_FIT_VERSION, photodat]).encode(
+            'utf-8')).hexdigest()
+
+
+def _fit_salt2(photodat):
+    """Fit the model to the `photodat` rows in successive redshift windows.
+
+    Runs in the worker processes of `do_sncosmo`.  A fit is accepted if it
+    has at least 15 degrees of freedom, a reduced chi-square below 2 and a
+    redshift inside its window; the best one is kept.  Windows are scanned
+    by increasing redshift, and the scan stops once a converged fit is
+    bracketed: a window above its redshift fits at its own lower bound,
+    i.e. the chi-square rises again past the accepted fit.
+
+    Returns a dict with the best ``z`` (`None` if no fit was accepted), its
+    ``redchisq`` and ``ndof``, the number of ``windows`` fitted and the
+    ``seconds`` spent.
+    """
+    _ignore_fit_warnings()
+    start = time.time()
+    table = Table(
+        rows=[tuple(row) for row in photodat],
+        names=('time', 'band', 'flux', 'fluxerr', 'zp', 'zpsys'))
+    source = sncosmo.get_source(SNCOSMO_MODEL[0], version=SNCOSMO_MODEL[1])
+    model = sncosmo.Model(source=source)
+    best = {'z': None, 'redchisq': None, 'ndof': None}
+    converged = False
+    windows = 0
+    for zmin in SNCOSMO_WINDOWS:
+        zmax = zmin + SNCOSMO_WINDOW_WIDTH  # Overlapping intervals
+        windows += 1
+        try:
+            resl, fml = sncosmo.fit_lc(
+                table,
+                model, ['z', 't0', 'x0', 'x1', 'c'],
+                bounds={'z': (zmin, zmax)})
+        except RuntimeError:
+            continue
+        except sncosmo.fitting.DataQualityError:
+            break
+        zfit = fml.get('z')
+        if (converged and zmin > best['z'] and
+                np.isclose(zmin, zfit, rtol=1.0e-3)):
+            break
+        if resl.ndof < 15:
+            continue
+        redchiq = resl.chisq / resl.ndof
+        if ((best['z'] is None or redchiq < best['redchisq']) and
+                redchiq < 2.0 and
+                not np.isclose(zmin, zfit, rtol=1.0e-3) and
+                not np.isclose(zmax, zfit, rtol=1.e-3)):
+            best = {'z': float(zfit), 'redchisq': float(redchiq),
+                    'ndof': int(resl.ndof)}
+            converged = bool(resl.success)
+    best['windows'] = windows
+    best['seconds'] = time.time() - start
+    return best
+
+
+def do_sncosmo(catalog):
+    """Fit SALT2 to the SDSS and MegaCam light curves of Type Ia supernovae.
+
+    Entries are fitted in a pool of processes (see `_fit_salt2`), and fits
+    are cached in `sncosmo/salt2-fits.json` by a hash of the fitted
+    photometry and model, so only new or changed light curves are fitted
+    again.  The time spent on every fit is logged.
+    """
+    _ignore_fit_warnings()
     task_str = catalog.get_current_task_str()
+    cache_path = os.path.join(catalog.get_current_task_repo(), 'sncosmo',
+                              'salt2-fits.json')
+    cache = {}
+    if os.path.isfile(cache_path):
+        with open(cache_path, 'r') as ff:
+            cache = json.load(ff)
 
-    for event in pbar(catalog.entries, task_str):
+    jobs = []
+    for event in pbar(list(catalog.entries), task_str):
         catalog.add_entry(event, delete=False)
         if (SUPERNOVA.PHOTOMETRY not in catalog.entries[event]  # or
                 # SUPERNOVA.REDSHIFT in catalog.entries[event] or
@@ -59,48 +152,44 @@ def do_sncosmo(catalog):
         if len(photodat) < 20:
             catalog.entries[event] = catalog.entries[event].get_stub()
             continue
-        table = Table(
-            rows=photodat,
-            names=('time', 'band', 'flux', 'fluxerr', 'zp', 'zpsys'))
         if (catalog.entries[event].get(SUPERNOVA.CLAIMED_TYPE, [{
                 QUANTITY.VALUE: ''
         }])[0][QUANTITY.VALUE] == 'Ia'):
-            source = sncosmo.get_source('salt2', version='2.4')
-            model = sncosmo.Model(source=source)
-            mredchisq = np.inf
-            fm = None
-            for zmin in np.linspace(0.0, 1.0, 19):
-                zmax = zmin + 0.1  # Overlapping intervals
-                try:
-                    resl, fml = sncosmo.fit_lc(
-                        table,
-                        model, ['z', 't0', 'x0', 'x1', 'c'],
-                        bounds={'z': (zmin, zmax)})
-                except RuntimeError:
-                    continue
-                except sncosmo.fitting.DataQualityError:
-                    break
-                if resl.ndof < 15:
-                    continue
-                redchiq = resl.chisq / resl.ndof
-                if (redchiq < mredchisq and redchiq < 2.0 and not np.isclose(
-                        zmin, fml.get('z'), rtol=1.0e-3) and not np.isclose(
-                            zmax, fml.get('z'), rtol=1.e-3)):
-                    mredchisq = resl.chisq
-                    res, fm = resl, fml
-
-            if fm:
-                print(event, res.chisq / res.ndof,
-                      fm.get('z'),
-                      catalog.entries[event][SUPERNOVA.REDSHIFT][0]['value']
-                      if SUPERNOVA.REDSHIFT in catalog.entries[event] else
-                      'no redshift')
-                # source = catalog.entries[event].add_source(
-                #     bibcode='2014A&A...568A..22B')
-                # catalog.entries[event].add_quantity(SUPERNOVA.REDSHIFT,
-                #                                     str(fm.get('z')), source)
-                catalog.journal_entries()
-            else:
-                catalog.entries[event] = catalog.entries[event].get_stub()
+            jobs.append((event, photodat, _fit_key(photodat)))
+            # Reloaded if the fit succeeds
+            catalog.entries[event] = catalog.entries[event].get_stub()
+
+    todo = [job for job in jobs if job[2] not in cache]
+    catalog.log.info('Fitting {} light curves ({} cached).'.format(
+        len(todo), len(jobs) - len(todo)))
+    fits = parse_in_pool(catalog, _fit_salt2, [(job[1],) for job in todo])
+    for (event, photodat, key), fit in zip(
+            todo, pbar(fits, task_str, total=len(todo))):
+        cache[key] = fit
+        catalog.log.info('Fitted `{}` ({} windows) in {:.2f} s.'.format(
+            event, fit['windows'], fit['seconds']))
+    if todo:
+        seconds = [cache[job[2]]['seconds'] for job in todo]
+        catalog.log.info(
+            'Fits took {:.1f} s in total, {:.2f} s on average, the slowest '
+            '{:.2f} s.'.format(sum(seconds), np.mean(seconds), max(seconds)))
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        atomic_write(cache_path, json.dumps(
+            cache, indent='\t', separators=(',', ':'), sort_keys=True))
+
+    for event, photodat, key in jobs:
+        fit = cache[key]
+        if fit['z'] is None:
+            continue
+        catalog.add_entry(event, delete=False)
+        print(event, fit['redchisq'], fit['z'],
+              catalog.entries[event][SUPERNOVA.REDSHIFT][0]['value']
+              if SUPERNOVA.REDSHIFT in catalog.entries[event] else
+              'no redshift')
+        # source = catalog.entries[event].add_source(
+        #     bibcode='2014A&A...568A..22B')
+        # catalog.entries[event].add_quantity(SUPERNOVA.REDSHIFT,
+        #                                     str(fit['z']), source)
+        catalog.journal_entries()
 
     return
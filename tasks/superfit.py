@@ -1,7 +1,6 @@
 """Import tasks for the spectra collected by the Superfit software package.
 """
 import os
-import re
 from glob import glob
 
 from astrocats.utils import pbar
@@ -11,17 +10,22 @@ from decimal import Decimal
 
 from astrocats.structures.struct import SPECTRUM
 from ..supernova import SUPERNOVA
+from ..utils import load_spectrum_text, parse_in_pool
 
 
 def do_superfit_spectra(catalog):
     superfit_url = 'http://www.dahowell.com/superfit.html'
     task_str = catalog.get_current_task_str()
     sfdirs = list(glob(os.path.join(catalog.get_current_task_repo(), 'superfit/*')))
-    for sfdir in pbar(sfdirs, task_str):
-        sffiles = sorted(glob(sfdir + '/*.dat'))
+    sffiles = [sorted(glob(sfdir + '/*.dat')) for sfdir in sfdirs]
+    # Skipped files are parsed too, their data being discarded
+    results = parse_in_pool(catalog, load_spectrum_text,
+                            [(sffile,) for files in sffiles for sffile in files])
+    for files in pbar(sffiles, task_str):
         lastname = ''
         oldname = ''
-        for sffile in pbar(sffiles, task_str):
+        for sffile in pbar(files, task_str):
+            specdata = next(results)
             basename = os.path.basename(sffile)
             name = basename.split('.')[0]
             if name.startswith('sn'):
@@ -57,15 +61,8 @@ def do_superfit_spectra(catalog):
                 name='Superfit', url=superfit_url, secondary=True)
             catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, oldname, source)
 
-            with open(sffile) as ff:
-                rows = ff.read().splitlines()
-            specdata = []
-            for row in rows:
-                if row.strip():
-                    specdata.append(list(filter(None, re.split('\t+|\s+', row, maxsplit=0))))
-            specdata = [[xx.replace('D', 'E') for xx in list(ii)] for ii in zip(*specdata)]
-            wavelengths = specdata[0]
-            fluxes = specdata[1]
+            wavelengths = specdata[0].tolist()
+            fluxes = specdata[1].tolist()
 
             if epoff != '':
                 mlmjd = astrotime('-'.join([str(mldt.year), str(mldt.month), str(mldt.day)])).mjd
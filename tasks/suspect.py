@@ -9,6 +9,7 @@ from glob import glob
 from html import unescape
 from math import floor
 
+import numpy as np
 # from astropy.time import Time as astrotime
 from bs4 import BeautifulSoup
 
@@ -18,6 +19,7 @@ from astrocats.utils import (astrotime, get_sig_digits, is_number, jd_to_mjd,
 from decimal import Decimal
 
 from ..supernova import SUPERNOVA
+from ..utils import load_spectrum_text, parse_in_pool
 
 
 def do_suspect_photo(catalog):
@@ -126,11 +128,19 @@ def do_suspect_spectra(catalog):
 
     suspectcnt = 0
     folders = next(os.walk(os.path.join(catalog.get_current_task_repo(), 'Suspect')))[1]
-    for folder in pbar(folders, task_str):
+    eventfolders = {}
+    fpaths = []
+    for folder in folders:
         path = os.path.join(catalog.get_current_task_repo(), 'Suspect/') + folder
-        eventfolders = next(os.walk(path))[1]
+        eventfolders[folder] = next(os.walk(path))[1]
+        for eventfolder in eventfolders[folder]:
+            fpath = os.path.join(path, eventfolder)
+            fpaths.extend(os.path.join(fpath, spectrum) for spectrum in next(os.walk(fpath))[2])
+    specdatas = dict(zip(fpaths, parse_in_pool(
+        catalog, load_spectrum_text, [(fpath,) for fpath in fpaths])))
+    for folder in pbar(folders, task_str):
         oldname = ''
-        for eventfolder in pbar(eventfolders, task_str):
+        for eventfolder in pbar(eventfolders[folder], task_str):
             name = eventfolder
             if is_number(name[:4]):
                 name = 'SN' + name
@@ -179,22 +189,16 @@ def do_suspect_spectra(catalog):
 
                 fpath = os.path.join(
                     catalog.get_current_task_repo(), 'Suspect', folder, eventfolder, spectrum)
-                with open(fpath, 'r') as f:
-                    specdata = list(csv.reader(f, delimiter=' ', skipinitialspace=True))
-                    specdata = list(filter(None, specdata))
-                    newspec = []
-                    oldval = ''
-                    for row in specdata:
-                        if row[1] == oldval:
-                            continue
-                        newspec.append(row)
-                        oldval = row[1]
-                    specdata = newspec
-                haserrors = len(specdata[0]) == 3 and specdata[0][2] and specdata[0][2] != 'NaN'
-                specdata = [list(i) for i in zip(*specdata)]
-
-                wavelengths = specdata[0]
-                fluxes = specdata[1]
+                specdata = specdatas[fpath]
+                # Drop rows repeating the flux of the previous row
+                keep = np.ones(specdata.shape[1], dtype=bool)
+                keep[1:] = specdata[1][1:] != specdata[1][:-1]
+                specdata = specdata[:, keep]
+                haserrors = (len(specdata) == 3 and specdata[2][0] and
+                             specdata[2][0] != 'NaN')
+
+                wavelengths = specdata[0].tolist()
+                fluxes = specdata[1].tolist()
 
                 spec = {
                     SPECTRUM.U_WAVELENGTHS: 'Angstrom',
@@ -208,7 +212,7 @@ def do_suspect_spectra(catalog):
                     SPECTRUM.FILENAME: spectrum
                 }
                 if haserrors:
-                    spec[SPECTRUM.ERRORS] = specdata[2]
+                    spec[SPECTRUM.ERRORS] = specdata[2].tolist()
 
                 catalog.entries[name].add_spectrum(**spec)
 
@@ -6,6 +6,7 @@ import time
 import urllib
 import warnings
 from datetime import datetime, timedelta
+from hashlib import md5
 from math import ceil
 
 import requests
@@ -16,123 +17,231 @@ from astrocats.utils import (is_integer, is_number, jd_to_mjd, pbar, pretty_num,
 from decimal import Decimal
 
 from ..supernova import SUPERNOVA
+from ..utils import atomic_write
+
+
+TNS_URL = 'https://wis-tns.weizmann.ac.il/'
+TNS_PAGE_SIZE = 1000
+# Days after which every page is downloaded again, regardless of watermarks.
+TNS_RESYNC_DAYS = 30
+# Number of pages downloaded per concurrent batch.
+TNS_FETCH_BATCH = 8
+
+
+def _tns_page_url(page):
+    return (TNS_URL + 'search?&num_page=1000&format=html&edit'
+            '[type]=&edit[objname]=&edit[id]=&sort=asc&order=id'
+            '&display[redshift]=1'
+            '&display[hostname]=1&display[host_redshift]=1'
+            '&display[source_group_name]=1'
+            '&display[programs_name]=1'
+            '&display[internal_name]=1'
+            '&display[isTNS_AT]=1'
+            '&display[public]=1'
+            '&display[end_pop_period]=0'
+            '&display[spectra_count]=1'
+            '&display[discoverymag]=1&display[discmagfilter]=1'
+            '&display[discoverydate]=1&display[discoverer]=1'
+            '&display[sources]=1'
+            '&display[bibcode]=1&format=csv&page=' + str(page))
+
+
+def _load_tns_state(path):
+    """Load the TNS synchronization state (watermark and page hashes)."""
+    state = {'maxid': 0, 'maxid_page': None, 'full_sync': '', 'pages': {}}
+    if os.path.isfile(path):
+        with open(path, 'r') as ff:
+            state.update(json.load(ff))
+    return state
 
 
 def do_tns(catalog):
-    """Load TNS metadata."""
-    session = requests.Session()
+    """Load TNS metadata.
+
+    TNS is synchronized incrementally using the state kept in
+    `TNS/sync-state.json`: the highest TNS id downloaded (the watermark),
+    the page that held it, and a hash of every page that was downloaded and
+    parsed.  Since ids are sorted but not contiguous, new ids can only be on
+    the page of the watermark or after it: those pages are downloaded, older
+    pages are read from the cache.  In update mode, pages whose content hash
+    is unchanged are not parsed at all, so their entries are left untouched.
+    Pages that fail to download do not move the watermark and lose their
+    hash, so they are downloaded again on the next run.  Every
+    `TNS_RESYNC_DAYS` days (or when the state file is deleted) all pages are
+    downloaded and parsed again.  The task option `full_resync` forces this,
+    ignoring the stored watermark and page hashes.
+    """
     task_str = catalog.get_current_task_str()
-    tns_url = 'https://wis-tns.weizmann.ac.il/'
-    search_url = tns_url + 'search?&num_page=1&format=html&sort=desc&order=id&format=csv&page=0'
-    path = os.path.join(catalog.get_current_task_repo(), 'TNS', 'index.csv')
+    tns_path = os.path.join(catalog.get_current_task_repo(), 'TNS')
+    search_url = TNS_URL + 'search?&num_page=1&format=html&sort=desc&order=id&format=csv&page=0'
+    path = os.path.join(tns_path, 'index.csv')
     csvtxt = catalog.load_url(search_url, path)
     if not csvtxt:
         return
-    maxid = csvtxt.splitlines()[1].split(',')[0].strip('"')
-    maxpages = ceil(int(maxid) / 1000.)
-
-    for jj, page in enumerate(pbar(range(maxpages), task_str)):
-        fname = os.path.join(catalog.get_current_task_repo(), 'TNS', 'page-')
-        fname += str(page).zfill(2) + '.csv'
-        archived_flag = (catalog.current_task.archived or catalog.args.archived)
-        if archived_flag and os.path.isfile(fname) and page < 7:
-            with open(fname, 'r') as tns_file:
-                csvtxt = tns_file.read()
-        else:
-            with open(fname, 'w') as tns_file:
-                session = requests.Session()
-                ses_url = (tns_url + 'search?&num_page=1000&format=html&edit'
-                           '[type]=&edit[objname]=&edit[id]=&sort=asc&order=id'
-                           '&display[redshift]=1'
-                           '&display[hostname]=1&display[host_redshift]=1'
-                           '&display[source_group_name]=1'
-                           '&display[programs_name]=1'
-                           '&display[internal_name]=1'
-                           '&display[isTNS_AT]=1'
-                           '&display[public]=1'
-                           '&display[end_pop_period]=0'
-                           '&display[spectra_count]=1'
-                           '&display[discoverymag]=1&display[discmagfilter]=1'
-                           '&display[discoverydate]=1&display[discoverer]=1'
-                           '&display[sources]=1'
-                           '&display[bibcode]=1&format=csv&page=' + str(page))
-                try:
-                    response = session.get(ses_url, timeout=30)
-                    csvtxt = response.text
-                except Exception:
-                    catalog.log.warning('Could not download TNS page #{}.'.format(str(page)))
-                    if os.path.isfile(fname):
-                        with open(fname, 'r') as tns_file:
-                            csvtxt = tns_file.read()
-                    else:
-                        continue
-                else:
-                    tns_file.write(csvtxt)
+    maxid = int(csvtxt.splitlines()[1].split(',')[0].strip('"'))
+    maxpages = ceil(maxid / float(TNS_PAGE_SIZE))
+
+    state_path = os.path.join(tns_path, 'sync-state.json')
+    state = _load_tns_state(state_path)
+    if catalog.get_current_task_option('full_resync'):
+        state.update({'maxid': 0, 'maxid_page': None, 'full_sync': '',
+                      'pages': {}})
+    now = datetime.utcnow()
+    full_sync = (not state['full_sync'] or (now - datetime.strptime(
+        state['full_sync'], '%Y-%m-%d %H:%M:%S')).days >= TNS_RESYNC_DAYS)
+    # Pages before the one of the previous watermark only hold older ids
+    # (unknown for states written before it was recorded: every page is
+    # downloaded once)
+    first_new_page = state['maxid_page'] or 0
+    archived_flag = (catalog.current_task.archived or catalog.args.archived)
+    if full_sync:
+        catalog.log.warning('Running a full TNS synchronization.')
+
+    fnames = []
+    fetch_pages = set()
+    for page in range(maxpages):
+        fname = os.path.join(tns_path, 'page-' + str(page).zfill(2) + '.csv')
+        fnames.append(fname)
+        cached = os.path.isfile(fname)
+        if archived_flag and cached and page < 7:
+            continue
+        if (not full_sync and cached and page < first_new_page and
+                str(page) in state['pages']):
+            continue
+        fetch_pages.add(page)
+    catalog.log.info('Downloading {} of {} TNS pages.'.format(
+        len(fetch_pages), maxpages))
 
-        tsvin = list(csv.reader(csvtxt.splitlines(), delimiter=','))
-        for ri, row in enumerate(pbar(tsvin, task_str, leave=False)):
-            if ri == 0:
+    skipped = 0
+    failed = 0
+    watermark = (int(state['maxid']), first_new_page)
+    for bi in pbar(range(0, maxpages, TNS_FETCH_BATCH), task_str):
+        batch = range(bi, min(bi + TNS_FETCH_BATCH, maxpages))
+        todo = [page for page in batch if page in fetch_pages]
+        fetched = dict(zip(todo, catalog.fetch_many(
+            [_tns_page_url(page) for page in todo],
+            [fnames[page] for page in todo],
+            archived_mode=False, timeout=30)))
+        for jj in batch:
+            downloaded = False
+            if jj in fetched:
+                csvtxt = fetched[jj].text
+                downloaded = fetched[jj].ok
+                if not downloaded:
+                    # The cached copy is still parsed, but not recorded
+                    failed += 1
+                    state['pages'].pop(str(jj), None)
+                    catalog.log.warning(
+                        'Could not download TNS page #{}.'.format(str(jj)))
+            elif catalog.args.update and not full_sync:
+                # Old page, unchanged since it was last parsed
+                skipped += 1
                 continue
-            if row[4] and 'SN' not in row[4]:
+            else:
+                with open(fnames[jj], 'r') as tns_file:
+                    csvtxt = tns_file.read()
+            if csvtxt is None:
                 continue
-            name = row[1].replace(' ', '')
-            if len(name) < 5:
+
+            page_hash = md5(csvtxt.encode('utf-8')).hexdigest()
+            if downloaded:
+                page_maxid = _tns_max_id(csvtxt)
+                if page_maxid is not None and page_maxid >= watermark[0]:
+                    watermark = (page_maxid, jj)
+            if (catalog.args.update and not full_sync and
+                    state['pages'].get(str(jj)) == page_hash):
+                skipped += 1
                 continue
-            name, source = catalog.new_entry(
-                name, name='Transient Name Server', url=tns_url)
-            if row[2] and row[2] != '00:00:00.00':
-                catalog.entries[name].add_quantity(SUPERNOVA.RA, row[2], source)
-            if row[3] and row[3] != '+00:00:00.00':
-                catalog.entries[name].add_quantity(SUPERNOVA.DEC, row[3], source)
-            if row[4]:
-                catalog.entries[name].add_quantity(
-                    SUPERNOVA.CLAIMED_TYPE, row[4].replace('SN', '').strip(), source)
-            if row[5]:
-                catalog.entries[name].add_quantity(
-                    SUPERNOVA.REDSHIFT, row[5], source, kind='spectroscopic')
-            if row[6]:
-                catalog.entries[name].add_quantity(SUPERNOVA.HOST, row[6], source)
-            if row[7]:
-                for qkey in [SUPERNOVA.REDSHIFT, SUPERNOVA.HOST_REDSHIFT]:
-                    catalog.entries[name].add_quantity(qkey, row[7], source, kind='host')
-            if row[8]:
-                catalog.entries[name].add_quantity(SUPERNOVA.DISCOVERER, row[8], source)
-            # Currently, all events listing all possible observers. TNS bug?
-            # if row[9]:
-            #    observers = row[9].split(',')
-            #    for observer in observers:
-            #        catalog.entries[name].add_quantity('observer',
-            #                                  observer.strip(),
-            #                                  source)
-            if row[11]:
-                catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, row[11], source)
-
-            if (len(row) > 19) and row[19]:
-                date = row[19].split()[0].replace('-', '/')
-                if date != '0000/00/00':
-                    date = date.replace('/00', '')
-                    dsplit = row[19].split()
-                    if len(dsplit) >= 2:
-                        t = dsplit[1]
-                        if t != '00:00:00':
-                            ts = t.split(':')
-                            dt = timedelta(
-                                hours=int(ts[0]), minutes=int(ts[1]), seconds=int(ts[2]))
-                            temp = pretty_num(dt.total_seconds() / (24 * 60 * 60), sig=6)
-                            date += temp.lstrip('0')
-                    catalog.entries[name].add_quantity(SUPERNOVA.DISCOVER_DATE, date, source)
-
-            if catalog.args.travis and ri >= catalog.TRAVIS_QUERY_LIMIT:
+
+            _add_tns_rows(catalog, csvtxt, task_str)
+            if downloaded:
+                state['pages'][str(jj)] = page_hash
+
+            if catalog.args.travis and jj >= catalog.TRAVIS_QUERY_LIMIT:
                 break
 
-        if catalog.args.travis and jj >= catalog.TRAVIS_QUERY_LIMIT:
+            catalog.journal_entries()
+
+        if catalog.args.travis and bi >= catalog.TRAVIS_QUERY_LIMIT:
             break
 
-        catalog.journal_entries()
+    catalog.log.info('Skipped {} unchanged TNS pages, {} failed.'.format(
+        skipped, failed))
+    state['maxid'], state['maxid_page'] = watermark
+    if full_sync and not failed:
+        state['full_sync'] = now.strftime('%Y-%m-%d %H:%M:%S')
+    atomic_write(state_path, json.dumps(
+        state, indent='\t', separators=(',', ':'), sort_keys=True))
 
     catalog.journal_entries()
 
 
+def _tns_max_id(csvtxt):
+    """Highest TNS id of a page of the CSV export, or `None` if empty."""
+    ids = [int(row[0]) for row in csv.reader(csvtxt.splitlines()[1:])
+           if row and row[0].strip().isdigit()]
+    return max(ids) if ids else None
+
+
+def _add_tns_rows(catalog, csvtxt, task_str):
+    """Add the objects listed in one page of the TNS CSV export."""
+    tsvin = list(csv.reader(csvtxt.splitlines(), delimiter=','))
+    for ri, row in enumerate(pbar(tsvin, task_str, leave=False)):
+        if ri == 0:
+            continue
+        if row[4] and 'SN' not in row[4]:
+            continue
+        name = row[1].replace(' ', '')
+        if len(name) < 5:
+            continue
+        name, source = catalog.new_entry(
+            name, name='Transient Name Server', url=TNS_URL)
+        if row[2] and row[2] != '00:00:00.00':
+            catalog.entries[name].add_quantity(SUPERNOVA.RA, row[2], source)
+        if row[3] and row[3] != '+00:00:00.00':
+            catalog.entries[name].add_quantity(SUPERNOVA.DEC, row[3], source)
+        if row[4]:
+            catalog.entries[name].add_quantity(
+                SUPERNOVA.CLAIMED_TYPE, row[4].replace('SN', '').strip(), source)
+        if row[5]:
+            catalog.entries[name].add_quantity(
+                SUPERNOVA.REDSHIFT, row[5], source, kind='spectroscopic')
+        if row[6]:
+            catalog.entries[name].add_quantity(SUPERNOVA.HOST, row[6], source)
+        if row[7]:
+            for qkey in [SUPERNOVA.REDSHIFT, SUPERNOVA.HOST_REDSHIFT]:
+                catalog.entries[name].add_quantity(qkey, row[7], source, kind='host')
+        if row[8]:
+            catalog.entries[name].add_quantity(SUPERNOVA.DISCOVERER, row[8], source)
+        # Currently, all events listing all possible observers. TNS bug?
+        # if row[9]:
+        #    observers = row[9].split(',')
+        #    for observer in observers:
+        #        catalog.entries[name].add_quantity('observer',
+        #                                  observer.strip(),
+        #                                  source)
+        if row[11]:
+            catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, row[11], source)
+
+        if (len(row) > 19) and row[19]:
+            date = row[19].split()[0].replace('-', '/')
+            if date != '0000/00/00':
+                date = date.replace('/00', '')
+                dsplit = row[19].split()
+                if len(dsplit) >= 2:
+                    t = dsplit[1]
+                    if t != '00:00:00':
+                        ts = t.split(':')
+                        dt = timedelta(
+                            hours=int(ts[0]), minutes=int(ts[1]), seconds=int(ts[2]))
+                        temp = pretty_num(dt.total_seconds() / (24 * 60 * 60), sig=6)
+                        date += temp.lstrip('0')
+                catalog.entries[name].add_quantity(SUPERNOVA.DISCOVER_DATE, date, source)
+
+        if catalog.args.travis and ri >= catalog.TRAVIS_QUERY_LIMIT:
+            break
+
+
 def do_tns_photo(catalog):
     """Load TNS photometry."""
     task_str = catalog.get_current_task_str()
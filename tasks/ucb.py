@@ -4,6 +4,8 @@ import csv
 import json
 import os
 import urllib
+from collections import OrderedDict
+from hashlib import md5
 from math import floor
 
 from astropy.time import Time as astrotime
@@ -12,6 +14,76 @@ from astrocats.structures.struct import PHOTOMETRY, SPECTRUM
 from astrocats.utils import (get_sig_digits, is_number, pbar, pretty_num, uniq_cdl)
 
 from ..supernova import SUPERNOVA
+from ..utils import atomic_write, load_spectrum_text
+
+UCB_DOWNLOAD_URL = 'http://heracles.astro.berkeley.edu/sndb/download?id='
+# Number of data files downloaded per concurrent batch.
+UCB_FETCH_BATCH = 32
+
+
+def _record_hash(record):
+    return md5(json.dumps(record, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _iter_ucb_files(catalog, records, idkey, prefix, folder, desc):
+    """Yield every index record with the text of its data file, in order.
+
+    `<folder>/synced.json` keeps a hash of the index record of every file
+    downloaded: the files of unchanged records are read from the cache, and
+    those of new or modified records downloaded concurrently,
+    `UCB_FETCH_BATCH` at a time.  The text is `None` if the file could not
+    be read.  The numbers of files downloaded, skipped (read from the cache)
+    and failed are logged once the generator is exhausted or closed.
+
+    Without a `synced.json` (e.g. the first run over files cached by an
+    older version of the task), the cached files are taken to match the
+    current index rather than all downloaded again.
+    """
+    task_repo = catalog.get_current_task_repo()
+    state_path = os.path.join(task_repo, folder, 'synced.json')
+    synced = {}
+    if os.path.isfile(state_path):
+        with open(state_path, 'r') as f:
+            synced = json.load(f)
+    else:
+        for record in records:
+            if os.path.isfile(os.path.join(task_repo, folder,
+                                           record['Filename'])):
+                synced[str(record[idkey])] = _record_hash(record)
+    counts = OrderedDict([('downloaded', 0), ('skipped', 0), ('failed', 0)])
+    try:
+        for bi in range(0, len(records), UCB_FETCH_BATCH):
+            batch = records[bi:bi + UCB_FETCH_BATCH]
+            ids = [str(record[idkey]) for record in batch]
+            hashes = [_record_hash(record) for record in batch]
+            paths = [os.path.join(folder, record['Filename'])
+                     for record in batch]
+            fetch = [ii for ii in range(len(batch))
+                     if synced.get(ids[ii]) != hashes[ii] or
+                     not os.path.isfile(os.path.join(task_repo, paths[ii]))]
+            fetched = dict(zip(fetch, catalog.fetch_many(
+                [UCB_DOWNLOAD_URL + prefix + ids[ii] for ii in fetch],
+                [paths[ii] for ii in fetch], archived_mode=False)))
+            for ii, record in enumerate(batch):
+                if ii in fetched:
+                    text = fetched[ii].text
+                    if not fetched[ii].ok:
+                        counts['failed'] += 1
+                    else:
+                        counts['downloaded'] += 1
+                        synced[ids[ii]] = hashes[ii]
+                else:
+                    with open(os.path.join(task_repo, paths[ii]), 'r',
+                              encoding='utf-8') as f:
+                        text = f.read()
+                    counts['skipped'] += 1
+                yield record, text
+    finally:
+        atomic_write(state_path, json.dumps(
+            synced, indent='\t', separators=(',', ':'), sort_keys=True))
+        catalog.log.info(
+            '{}: {downloaded} downloaded, {skipped} skipped, {failed} '
+            'failed.'.format(desc, **counts))
 
 
 def do_ucb_photo(catalog):
@@ -29,7 +101,15 @@ def do_ucb_photo(catalog):
 
     photom = json.loads(jsontxt)
     photom = sorted(photom, key=lambda kk: kk['PhotID'])
-    for phot in pbar(photom, task_str):
+    for phot in photom:
+        if not phot['Filename']:
+            raise ValueError('Filename not found for SNDB phot!')
+        if not phot['PhotID']:
+            raise ValueError('ID not found for SNDB phot!')
+
+    files = _iter_ucb_files(catalog, photom, 'PhotID', 'dp:', 'SNDB',
+                            'SNDB photometry sets')
+    for phot, phottxt in pbar(files, task_str, total=len(photom)):
         oldname = phot['ObjName']
         name = catalog.add_entry(oldname)
 
@@ -58,18 +138,8 @@ def do_ucb_photo(catalog):
         if phot['HostName']:
             host = urllib.parse.unquote(phot['HostName']).replace('*', '')
             catalog.entries[name].add_quantity(SUPERNOVA.HOST, host, sources)
-        filename = phot['Filename'] if phot['Filename'] else ''
-
-        if not filename:
-            raise ValueError('Filename not found for SNDB phot!')
-        if not phot['PhotID']:
-            raise ValueError('ID not found for SNDB phot!')
-
-        filepath = os.path.join(catalog.get_current_task_repo(),
-                                'SNDB/') + filename
-        phottxt = catalog.load_url('http://heracles.astro.berkeley.edu/sndb/'
-                                   'download?id=dp:' + str(phot['PhotID']),
-                                   filepath)
+        if phottxt is None:
+            continue
 
         tsvin = csv.reader(
             phottxt.splitlines(), delimiter=' ', skipinitialspace=True)
@@ -105,7 +175,6 @@ def do_ucb_spectra(catalog):
     sec_reference = 'UCB Filippenko Group\'s Supernova Database (SNDB)'
     sec_refurl = 'http://heracles.astro.berkeley.edu/sndb/info'
     sec_refbib = '2012MNRAS.425.1789S'
-    ucbspectracnt = 0
 
     jsontxt = catalog.load_url(
         'http://heracles.astro.berkeley.edu/sndb/download?id=allpubspec',
@@ -116,8 +185,18 @@ def do_ucb_spectra(catalog):
 
     spectra = json.loads(jsontxt)
     spectra = sorted(spectra, key=lambda kk: kk['SpecID'])
+    for spectrum in spectra:
+        if not spectrum['Filename']:
+            raise ValueError('Filename not found for SNDB spectrum!')
+        if not spectrum['SpecID']:
+            raise ValueError('ID not found for SNDB spectrum!')
+    if catalog.args.travis:
+        spectra = spectra[:catalog.TRAVIS_QUERY_LIMIT]
+
     oldname = ''
-    for spectrum in pbar(spectra, task_str):
+    files = _iter_ucb_files(catalog, spectra, 'SpecID', 'ds:', 'UCB',
+                            'UCB spectra')
+    for spectrum, spectxt in pbar(files, task_str, total=len(spectra)):
         name = spectrum['ObjName']
         if oldname and name != oldname:
             catalog.journal_entries()
@@ -153,41 +232,23 @@ def do_ucb_spectra(catalog):
             sig = get_sig_digits(day) + 5
             mjd = astrotime(year + '-' + month + '-' + str(floor(float(day))).zfill(2)).mjd
             mjd = pretty_num(mjd + float(day) - floor(float(day)), sig=sig)
-        filename = spectrum['Filename'] if spectrum['Filename'] else ''
+        filename = spectrum['Filename']
         instrument = spectrum['Instrument'] if spectrum['Instrument'] else ''
         reducer = spectrum['Reducer'] if spectrum['Reducer'] else ''
         observer = spectrum['Observer'] if spectrum['Observer'] else ''
         snr = str(spectrum['SNR']) if spectrum['SNR'] else ''
 
-        if not filename:
-            raise ValueError('Filename not found for SNDB spectrum!')
-        if not spectrum['SpecID']:
-            raise ValueError('ID not found for SNDB spectrum!')
-
-        filepath = os.path.join(catalog.get_current_task_repo(), 'UCB/') + filename
-        spectxt = catalog.load_url(
-            'http://heracles.astro.berkeley.edu/sndb/download?id=ds:' +
-            str(spectrum['SpecID']),
-            filepath,
-            archived_mode=True)
-
-        specdata = list(csv.reader(spectxt.splitlines(), delimiter=' ', skipinitialspace=True))
-        newspecdata = []
-        for row in specdata:
-            if row[0][0] == '#':
-                continue
-            else:
-                newspecdata.append(row)
-        specdata = newspecdata
+        if spectxt is None:
+            continue
+        specdata = load_spectrum_text(None, text=spectxt)
 
-        haserrors = len(specdata[0]) == 3 and specdata[0][2] and specdata[0][2] != 'NaN'
-        specdata = [list(ii) for ii in zip(*specdata)]
+        haserrors = len(specdata) == 3 and specdata[2][0] and specdata[2][0] != 'NaN'
 
-        wavelengths = specdata[0]
-        fluxes = specdata[1]
+        wavelengths = specdata[0].tolist()
+        fluxes = specdata[1].tolist()
         errors = None
         if haserrors:
-            errors = specdata[2]
+            errors = specdata[2].tolist()
             if not list(filter(None, errors)):
                 errors = None
 
@@ -213,9 +274,5 @@ def do_ucb_spectra(catalog):
 
         catalog.entries[name].add_spectrum(**spec)
 
-        ucbspectracnt = ucbspectracnt + 1
-        if catalog.args.travis and ucbspectracnt >= catalog.TRAVIS_QUERY_LIMIT:
-            break
-
     catalog.journal_entries()
     return
@@ -9,23 +9,67 @@ from astrocats.utils import (convert_aq_output, get_sig_digits, is_number,
                              jd_to_mjd, make_date_string, pbar, rep_chars,
                              round_sig, uniq_cdl)
 from astropy.time import Time as astrotime
-from astroquery.vizier import Vizier
 
 from supernovae import utils as sn_utils
 
 from ..constants import CLIGHT, KM
 from ..supernova import SUPERNOVA
-from ..utils import radec_clean
-
-TRAVIS_LIMIT = True
+from ..utils import VizierCache, ingest_photometry, radec_clean
+
+
+# Every table read by `do_vizier`, downloaded up front if missing.  Tables
+# read but not listed here are still fetched on first use.
+VIZIER_CATALOGS = [
+    'J/A+A/592/A40/table2', 'J/ApJ/756/173/table2', 'J/ApJ/756/173/table3',
+    'J/other/NewA/20.30/table1', 'J/other/NewA/20.30/table2',
+    'J/other/NewA/20.30/table3', 'J/ApJ/686/749/table12',
+    'J/A+A/555/A10/table4', 'J/A+A/555/A10/table5', 'J/ApJ/820/33/table1',
+    'J/ApJ/820/33/table2', 'J/ApJS/200/12/table1', 'J/ApJ/746/85/table1',
+    'J/ApJ/746/85/table2', 'J/ApJ/854/L14/ph17dio', 'J/MNRAS/384/107/table3',
+    'J/MNRAS/384/107/table5', 'J/MNRAS/384/107/table4', 'J/ApJ/824/6/table1',
+    'J/AJ/151/125/table2', 'J/A+A/593/A68/ph12os', 'J/A+A/593/A68/ph13bvn',
+    'J/ApJ/825/L22/table3', 'J/ApJ/826/144/table1', 'J/ApJ/819/35/table2',
+    'J/ApJ/686/749/table10', 'J/ApJ/602/571/table8', 'J/MNRAS/444/3258/SNe',
+    'J/MNRAS/438/1391/table2', 'J/ApJ/749/18/table1', 'J/A+A/523/A7/table9',
+    'J/A+A/415/863/table1', 'J/AJ/136/2306/sources', 'J/ApJ/708/661/sn',
+    'J/ApJ/708/661/table1', 'J/ApJ/795/44/ps1_snIa', 'II/189/mag',
+    'VII/272/snrs', 'J/MNRAS/442/844/table1', 'J/MNRAS/425/1789/table1',
+    'J/ApJS/219/13/table3', 'J/ApJS/219/13/table2', 'J/ApJ/795/44/table6',
+    'J/MNRAS/442/844/table2', 'J/other/Nat/491.228/tablef1',
+    'J/other/Nat/491.228/tablef2', 'J/ApJ/760/L33/table1',
+    'J/ApJ/769/39/table1', 'J/MNRAS/394/2266/table2',
+    'J/MNRAS/394/2266/table3', 'J/MNRAS/394/2266/table4', 'J/AJ/145/99/table1',
+    'J/ApJ/729/143/table1', 'J/ApJ/729/143/table2', 'J/ApJ/729/143/table4',
+    'J/ApJ/729/143/table5', 'J/ApJ/728/14/table1', 'J/ApJ/728/14/table2',
+    'J/ApJ/728/14/table3', 'J/PAZh/37/837/table2', 'J/MNRAS/433/1871/table3a',
+    'J/MNRAS/433/1871/table3b', 'J/other/Nat/474.484/tables1',
+    'J/ApJ/736/159/table1', 'J/AJ/148/1/table2', 'J/AJ/148/1/table3',
+    'J/AJ/148/1/table5', 'J/ApJ/805/74/table1', 'J/ApJ/741/97/table2',
+    'J/MNRAS/448/1206/table3', 'J/MNRAS/448/1206/table4',
+    'J/MNRAS/448/1206/table5', 'J/MNRAS/448/1206/table6',
+    'J/MNRAS/448/1206/tablea2', 'J/MNRAS/448/1206/tablea3',
+    'J/AJ/143/126/table4', 'J/ApJS/220/9/table8', 'J/ApJ/673/999/table1',
+    'J/MNRAS/417/916/table2', 'J/MNRAS/430/1746/table4', 'J/AJ/148/13/high_z',
+    'J/AJ/148/13/low_z', 'J/ApJ/666/674/table3', 'J/AcA/63/1/table1',
+    'J/MNRAS/410/1262/tablea2', 'J/ApJ/755/61/table3', 'J/AJ/135/348/SNe',
+    'J/ApJ/713/1026/SNe', 'J/ApJ/770/107/galaxies', 'J/ApJ/738/162/table3',
+    'J/ApJ/738/162/table4', 'J/ApJ/703/370/tables', 'J/ApJ/607/665/table1',
+    'J/ApJ/607/665/table5', 'J/ApJ/821/57/table1', 'J/ApJ/821/57/table2',
+    'J/ApJ/821/57/table3', 'J/ApJ/821/57/table4', 'J/ApJ/607/665/table2'
+]
 
 
 def do_vizier(catalog):
-    """Import data from Vizier catalogs."""
+    """Import data from Vizier catalogs.
 
-    viz = Vizier(columns=['**'])
-    viz.ROW_LIMIT = -1
+    Tables are served from a local cache in the task repository, all of them
+    being downloaded concurrently up front if missing.
+    """
+    viz = VizierCache(
+        os.path.join(catalog.get_current_task_repo(), 'VizieR'), catalog.log)
     # viz.VIZIER_SERVER = 'vizier.cfa.harvard.edu'
+    viz.prefetch(
+        VIZIER_CATALOGS, max_workers=catalog.get_current_task_concurrency())
 
     _viz_1(catalog, viz)
     _viz_2(catalog, viz)
@@ -40,123 +84,48 @@ def _viz_1(catalog, viz):
     task_str = catalog.get_current_task_str()
 
     # 2018ApJ...854L..14K
-    result = viz.get_catalogs('J/ApJ/854/L14/ph17dio')
-    table = result[list(result.keys())[0]]
-    table.convert_bytestring_to_unicode()
-    name, source = catalog.new_entry(
-        'SN2017dio', bibcode='2018ApJ...854L..14K')
-    for row in pbar(table, task_str):
-        row = convert_aq_output(row)
-        bands = [x for x in row if x.endswith(
-            'mag') and not x.startswith('e_')]
-        for bandtag in bands:
-            band = bandtag.replace('mag', '')
-            if (bandtag in row and is_number(row[bandtag]) and not isnan(float(row[bandtag]))):
-                photodict = {
-                    PHOTOMETRY.TIME: str(row['MJD']),
-                    PHOTOMETRY.U_TIME: 'MJD',
-                    PHOTOMETRY.BAND: band,
-                    PHOTOMETRY.MAGNITUDE: row[bandtag],
-                    PHOTOMETRY.E_MAGNITUDE: row['e_' + bandtag],
-                    PHOTOMETRY.TELESCOPE: row['Tel'],
-                    PHOTOMETRY.SOURCE: source
-                }
-                catalog.entries[name].add_photometry(**photodict)
-
+    ingest_photometry(catalog, viz, {
+        'catalog': 'J/ApJ/854/L14/ph17dio',
+        'bibcode': '2018ApJ...854L..14K',
+        'name': 'SN2017dio',
+        'columns': {PHOTOMETRY.TELESCOPE: 'Tel'}
+    })
     catalog.journal_entries()
 
     # 2008MNRAS.384..107E
-    results = viz.get_catalogs(
-        ['J/MNRAS/384/107/table3', 'J/MNRAS/384/107/table5', 'J/MNRAS/384/107/table4']
-    )
-    for ti, table in enumerate(results):
-        table.convert_bytestring_to_unicode()
-        name, source = catalog.new_entry(
-            'SN2002cv', bibcode='2008MNRAS.384..107E')
-        for ri, row in enumerate(pbar(table, task_str)):
-            row = convert_aq_output(row)
-            bands = [x for x in row if x.endswith(
-                'mag') and not x.startswith('e_')]
-            for bandtag in bands:
-                band = bandtag.replace('mag', '')
-                if (bandtag in row and is_number(row[bandtag]) and not isnan(float(row[bandtag]))):
-                    photodict = {
-                        PHOTOMETRY.TIME: jd_to_mjd(Decimal(str(row['JD']))),
-                        PHOTOMETRY.U_TIME: 'MJD',
-                        PHOTOMETRY.BAND: band,
-                        PHOTOMETRY.MAGNITUDE: row[bandtag],
-                        PHOTOMETRY.SOURCE: source,
-                        PHOTOMETRY.INSTRUMENT: row['Inst']
-                    }
-                    if ti == 2:
-                        photodict[PHOTOMETRY.SCORRECTED] = True
-                    if row.get('l_' + bandtag, '') in ['>', '>=']:
-                        photodict[PHOTOMETRY.UPPER_LIMIT] = True
-                    elif ('e_' + bandtag) in row:
-                        photodict[PHOTOMETRY.E_MAGNITUDE] = row['e_' + bandtag]
-                    catalog.entries[name].add_photometry(**photodict)
-
-            if TRAVIS_LIMIT and catalog.args.travis and ri >= catalog.TRAVIS_QUERY_LIMIT:
-                break
-
+    ingest_photometry(catalog, viz, {
+        'catalog': ['J/MNRAS/384/107/table3', 'J/MNRAS/384/107/table5',
+                    'J/MNRAS/384/107/table4'],
+        'bibcode': '2008MNRAS.384..107E',
+        'name': 'SN2002cv',
+        'time': 'JD',
+        'time_format': 'jd',
+        'upper_limit': ['>', '>='],
+        'columns': {PHOTOMETRY.INSTRUMENT: 'Inst'},
+        'table_constants': [{}, {}, {PHOTOMETRY.SCORRECTED: True}]
+    })
     catalog.journal_entries()
 
     # 2016ApJ...824....6O
-    result = viz.get_catalogs('J/ApJ/824/6/table1')
-    table = result[list(result.keys())[0]]
-    table.convert_bytestring_to_unicode()
-    name, source = catalog.new_entry('SN2015bh', bibcode='2016ApJ...824....6O')
-    for row in pbar(table, task_str):
-        row = convert_aq_output(row)
-        bands = [x for x in row if x.endswith(
-            'mag') and not x.startswith('e_')]
-        for bandtag in bands:
-            band = bandtag.replace('mag', '')
-            if (bandtag in row and is_number(row[bandtag]) and
-                    not isnan(float(row[bandtag]))):
-                photodict = {
-                    PHOTOMETRY.TIME: str(row['MJD']),
-                    PHOTOMETRY.U_TIME: 'MJD',
-                    PHOTOMETRY.BAND: band,
-                    PHOTOMETRY.COUNT_RATE: str(row['Cts']),
-                    PHOTOMETRY.E_COUNT_RATE: str(row['e_Cts']),
-                    PHOTOMETRY.MAGNITUDE: row[bandtag],
-                    PHOTOMETRY.SOURCE: source
-                }
-                if row.get('l_' + bandtag, '') == '>':
-                    photodict[PHOTOMETRY.UPPER_LIMIT] = True
-                else:
-                    photodict[PHOTOMETRY.E_MAGNITUDE] = row['e_' + bandtag]
-                catalog.entries[name].add_photometry(**photodict)
+    ingest_photometry(catalog, viz, {
+        'catalog': 'J/ApJ/824/6/table1',
+        'bibcode': '2016ApJ...824....6O',
+        'name': 'SN2015bh',
+        'upper_limit': ['>'],
+        'columns': {PHOTOMETRY.COUNT_RATE: 'Cts',
+                    PHOTOMETRY.E_COUNT_RATE: 'e_Cts'}
+    })
     catalog.journal_entries()
 
     # 2016AJ....151..125Z
-    result = viz.get_catalogs('J/AJ/151/125/table2')
-    table = result[list(result.keys())[0]]
-    table.convert_bytestring_to_unicode()
-    name, source = catalog.new_entry('SN2013dy', bibcode='2016AJ....151..125Z')
-    for row in pbar(table, task_str):
-        row = convert_aq_output(row)
-        bands = [x for x in row if x.endswith(
-            'mag') and not x.startswith('e_')]
-        for bandtag in bands:
-            band = bandtag.replace('mag', '')
-            if (bandtag in row and is_number(row[bandtag]) and
-                    not isnan(float(row[bandtag]))):
-                photodict = {
-                    PHOTOMETRY.TIME: str(row['MJD']),
-                    PHOTOMETRY.U_TIME: 'MJD',
-                    PHOTOMETRY.BAND: band,
-                    PHOTOMETRY.MAGNITUDE: row[bandtag],
-                    PHOTOMETRY.SOURCE: source,
-                    PHOTOMETRY.TELESCOPE: row['Tel']
-                }
-                if row.get('l_' + bandtag, '') == '>':
-                    photodict[PHOTOMETRY.UPPER_LIMIT] = True
-                else:
-                    photodict[PHOTOMETRY.E_MAGNITUDE] = str(Decimal(
-                        '0.01') * Decimal(row['e_' + bandtag]))
-                catalog.entries[name].add_photometry(**photodict)
+    ingest_photometry(catalog, viz, {
+        'catalog': 'J/AJ/151/125/table2',
+        'bibcode': '2016AJ....151..125Z',
+        'name': 'SN2013dy',
+        'upper_limit': ['>'],
+        'e_magnitude_scale': '0.01',
+        'columns': {PHOTOMETRY.TELESCOPE: 'Tel'}
+    })
     catalog.journal_entries()
 
     # 2016A&A...592..A40F
@@ -180,75 +149,39 @@ def _viz_1(catalog, viz):
     catalog.journal_entries()
 
     # 2016A&A...593A..68F
-    results = viz.get_catalogs(
-        ['J/A+A/593/A68/ph12os', 'J/A+A/593/A68/ph13bvn'])
-    for ti, table in enumerate(results):
-        table.convert_bytestring_to_unicode()
-        name, source = catalog.new_entry(
-            ['PTF12os', 'iPTF13bvn'][ti], bibcode='2016A&A...593A..68F')
-        for row in pbar(table, task_str):
-            photodict = {
-                PHOTOMETRY.TIME: jd_to_mjd(Decimal(str(row['JD']))),
-                PHOTOMETRY.U_TIME: 'MJD',
-                PHOTOMETRY.TELESCOPE: row['Tel'],
-                PHOTOMETRY.BAND: row['Filter'],
-                PHOTOMETRY.MAGNITUDE: row['mag'],
-                PHOTOMETRY.E_MAGNITUDE: row['e_mag'],
-                PHOTOMETRY.SOURCE: source
-            }
-            catalog.entries[name].add_photometry(**photodict)
+    ingest_photometry(catalog, viz, {
+        'catalog': ['J/A+A/593/A68/ph12os', 'J/A+A/593/A68/ph13bvn'],
+        'bibcode': '2016A&A...593A..68F',
+        'name': ['PTF12os', 'iPTF13bvn'],
+        'time': 'JD',
+        'time_format': 'jd',
+        'band_column': 'Filter',
+        'columns': {PHOTOMETRY.TELESCOPE: 'Tel'}
+    })
     catalog.journal_entries()
 
     # 2016ApJ...825L..22F
-    result = viz.get_catalogs('J/ApJ/825/L22/table3')
-    table = result[list(result.keys())[0]]
-    table.convert_bytestring_to_unicode()
-    name, source = catalog.new_entry(
-        'iPTF13bvn', bibcode='2016ApJ...825L..22F')
-    for row in pbar(table, task_str):
-        row = convert_aq_output(row)
-        bands = [x for x in row if x.endswith(
-            'mag') and not x.startswith('e_')]
-        for bandtag in bands:
-            band = bandtag.replace('mag', '')
-            if (bandtag in row and is_number(row[bandtag]) and not isnan(float(row[bandtag]))):
-                photodict = {
-                    PHOTOMETRY.TIME: str(row['MJD']),
-                    PHOTOMETRY.U_TIME: 'MJD',
-                    PHOTOMETRY.BAND: band,
-                    PHOTOMETRY.MAGNITUDE: row[bandtag],
-                    PHOTOMETRY.SOURCE: source,
-                    PHOTOMETRY.TELESCOPE: row['Tel']
-                }
-                if row.get('l_' + bandtag, '') == '>':
-                    photodict[PHOTOMETRY.UPPER_LIMIT] = True
-                else:
-                    photodict[PHOTOMETRY.E_MAGNITUDE] = row['e_' + bandtag]
-                catalog.entries[name].add_photometry(**photodict)
+    ingest_photometry(catalog, viz, {
+        'catalog': 'J/ApJ/825/L22/table3',
+        'bibcode': '2016ApJ...825L..22F',
+        'name': 'iPTF13bvn',
+        'upper_limit': ['>'],
+        'columns': {PHOTOMETRY.TELESCOPE: 'Tel'}
+    })
     catalog.journal_entries()
 
     # 2016ApJ...826..144S
-    result = viz.get_catalogs('J/ApJ/826/144/table1')
-    table = result[list(result.keys())[0]]
-    table.convert_bytestring_to_unicode()
-    name, source = catalog.new_entry(
-        'ASASSN-14lp', bibcode='2016ApJ...826..144S')
-    for row in pbar(table, task_str):
-        row = convert_aq_output(row)
-        photodict = {
-            PHOTOMETRY.TIME:
-            jd_to_mjd(Decimal(row['JD']) + Decimal('2450000')),
-            PHOTOMETRY.U_TIME: 'MJD',
-            PHOTOMETRY.TELESCOPE: row['Tel'],
-            PHOTOMETRY.BAND: row['Band'],
-            PHOTOMETRY.MAGNITUDE: row['mag'],
-            PHOTOMETRY.SOURCE: source
-        }
-        if row['l_mag'] == '>':
-            photodict[PHOTOMETRY.UPPER_LIMIT] = True
-        else:
-            photodict[PHOTOMETRY.E_MAGNITUDE] = row['e_mag']
-        catalog.entries[name].add_photometry(**photodict)
+    ingest_photometry(catalog, viz, {
+        'catalog': 'J/ApJ/826/144/table1',
+        'bibcode': '2016ApJ...826..144S',
+        'name': 'ASASSN-14lp',
+        'time': 'JD',
+        'time_format': 'jd',
+        'time_offset': '2450000',
+        'band_column': 'Band',
+        'upper_limit': ['>'],
+        'columns': {PHOTOMETRY.TELESCOPE: 'Tel'}
+    })
     catalog.journal_entries()
 
     # 2012ApJ...756..173S
@@ -284,26 +217,16 @@ def _viz_1(catalog, viz):
     catalog.journal_entries()
 
     # 2016ApJ...819...35A
-    result = viz.get_catalogs('J/ApJ/819/35/table2')
-    table = result[list(result.keys())[0]]
-    table.convert_bytestring_to_unicode()
-    for row in pbar(table, task_str):
-        row = convert_aq_output(row)
-        name = row['ID']
-        name, source = catalog.new_entry(name, bibcode='2016ApJ...819...35A')
-        photodict = {
-            PHOTOMETRY.TIME: jd_to_mjd(Decimal(row['HJD'])),
-            PHOTOMETRY.U_TIME: 'MJD',
-            PHOTOMETRY.TELESCOPE: row['Tel'],
-            PHOTOMETRY.BAND: row['Filt'],
-            PHOTOMETRY.MAGNITUDE: row['mag'],
-            PHOTOMETRY.SOURCE: source
-        }
-        if row['l_mag'] == '>':
-            photodict[PHOTOMETRY.UPPER_LIMIT] = True
-        else:
-            photodict[PHOTOMETRY.E_MAGNITUDE] = row['e_mag']
-        catalog.entries[name].add_photometry(**photodict)
+    ingest_photometry(catalog, viz, {
+        'catalog': 'J/ApJ/819/35/table2',
+        'bibcode': '2016ApJ...819...35A',
+        'name_column': 'ID',
+        'time': 'HJD',
+        'time_format': 'jd',
+        'band_column': 'Filt',
+        'upper_limit': ['>'],
+        'columns': {PHOTOMETRY.TELESCOPE: 'Tel'}
+    })
     catalog.journal_entries()
 
     # 2013NewA...20...30M
@@ -341,28 +264,14 @@ def _viz_1(catalog, viz):
     catalog.journal_entries()
 
     # 2008ApJ...686..749K
-    result = viz.get_catalogs('J/ApJ/686/749/table10')
-    table = result[list(result.keys())[0]]
-    table.convert_bytestring_to_unicode()
-    for row in pbar(table, task_str):
-        row = convert_aq_output(row)
-        name, source = catalog.new_entry(
-            row['SN'], bibcode='2008ApJ...686..749K')
-        bands = [x for x in row if x.endswith(
-            'mag') and not x.startswith('e_')]
-        for bandtag in bands:
-            band = bandtag.replace('mag', '')
-            if (bandtag in row and is_number(row[bandtag]) and not isnan(float(row[bandtag]))):
-                photodict = {
-                    PHOTOMETRY.TIME: jd_to_mjd(Decimal(row['JD'])),
-                    PHOTOMETRY.U_TIME: 'MJD',
-                    PHOTOMETRY.BAND: band,
-                    PHOTOMETRY.MAGNITUDE: row[bandtag],
-                    PHOTOMETRY.E_MAGNITUDE: row['e_' + bandtag],
-                    PHOTOMETRY.SOURCE: source,
-                    PHOTOMETRY.TELESCOPE: row['Tel']
-                }
-                catalog.entries[name].add_photometry(**photodict)
+    ingest_photometry(catalog, viz, {
+        'catalog': 'J/ApJ/686/749/table10',
+        'bibcode': '2008ApJ...686..749K',
+        'name_column': 'SN',
+        'time': 'JD',
+        'time_format': 'jd',
+        'columns': {PHOTOMETRY.TELESCOPE: 'Tel'}
+    })
 
     result = viz.get_catalogs('J/ApJ/686/749/table12')
     table = result[list(result.keys())[0]]
@@ -824,29 +733,14 @@ def _viz_2(catalog, viz):
         catalog.entries[name].add_quantity(
             SUPERNOVA.CLAIMED_TYPE, 'Ia', source, kind='spectroscopic')
 
-    result = viz.get_catalogs('J/ApJ/795/44/table6')
-    table = result[list(result.keys())[0]]
-    table.convert_bytestring_to_unicode()
-    for row in pbar(table, task_str):
-        row = convert_aq_output(row)
-        name = row['SN']
-        name = catalog.add_entry(name)
-        source = catalog.entries[name].add_source(
-            bibcode='2014ApJ...795...44R')
-        catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, source)
-        if row['mag'] != '--':
-            photodict = {
-                PHOTOMETRY.TIME: str(row['MJD']),
-                PHOTOMETRY.U_TIME: 'MJD',
-                PHOTOMETRY.BAND: row['Filt'],
-                PHOTOMETRY.MAGNITUDE: str(row['mag']),
-                PHOTOMETRY.E_MAGNITUDE: str(row['e_mag']),
-                PHOTOMETRY.SOURCE: source,
-                PHOTOMETRY.SYSTEM: 'AB',
-                PHOTOMETRY.TELESCOPE: 'PS1',
-                PHOTOMETRY.INSTRUMENT: 'GPC'
-            }
-            catalog.entries[name].add_photometry(**photodict)
+    ingest_photometry(catalog, viz, {
+        'catalog': 'J/ApJ/795/44/table6',
+        'bibcode': '2014ApJ...795...44R',
+        'name_column': 'SN',
+        'band_column': 'Filt',
+        'constants': {PHOTOMETRY.SYSTEM: 'AB', PHOTOMETRY.TELESCOPE: 'PS1',
+                      PHOTOMETRY.INSTRUMENT: 'GPC'}
+    })
     catalog.journal_entries()
 
     # 1990A&AS...82..145C
@@ -976,39 +870,15 @@ def _viz_2(catalog, viz):
             SUPERNOVA.EBV, str(row['E_B-V_']), source)
     catalog.journal_entries()
 
-    viz_cat_name = 'J/MNRAS/442/844/table2'
-    result = viz.get_catalogs(viz_cat_name)
-    try:
-        table = result[list(result.keys())[0]]
-    except TypeError:
-        print("Failed on '{}'".format(viz_cat_name))
-        print("keys = ", result.keys())
-        print("try = ", list(result.keys())[0])
-        raise
-
-    table.convert_bytestring_to_unicode()
-    instr = 'KAIT'
-    for row in pbar(table, task_str):
-        row = convert_aq_output(row)
-        name = 'SN' + str(row['SN'])
-        name = catalog.add_entry(name)
-        source = catalog.entries[name].add_source(
-            bibcode='2014MNRAS.442..844F')
-        catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, source)
-        for band in ['B', 'V', 'R', 'I']:
-            bandtag = band + 'mag'
-            if (bandtag in row and is_number(row[bandtag]) and not isnan(float(row[bandtag]))):
-                photodict = {
-                    PHOTOMETRY.TIME: row['MJD'],
-                    PHOTOMETRY.U_TIME: 'MJD',
-                    PHOTOMETRY.BAND: band,
-                    PHOTOMETRY.MAGNITUDE: row[bandtag],
-                    PHOTOMETRY.E_MAGNITUDE: row['e_' + bandtag],
-                    PHOTOMETRY.SOURCE: source,
-                    PHOTOMETRY.TELESCOPE: instr,
-                    PHOTOMETRY.INSTRUMENT: instr
-                }
-                catalog.entries[name].add_photometry(**photodict)
+    ingest_photometry(catalog, viz, {
+        'catalog': 'J/MNRAS/442/844/table2',
+        'bibcode': '2014MNRAS.442..844F',
+        'name_column': 'SN',
+        'name_transform': lambda name: 'SN' + name,
+        'bands': ['B', 'V', 'R', 'I'],
+        'constants': {PHOTOMETRY.TELESCOPE: 'KAIT',
+                      PHOTOMETRY.INSTRUMENT: 'KAIT'}
+    })
     catalog.journal_entries()
 
     # 2012MNRAS.425.1789S
@@ -1142,52 +1012,26 @@ def _viz_3(catalog, viz):
     catalog.journal_entries()
 
     # 2011Natur.474..484Q
-    result = viz.get_catalogs('J/other/Nat/474.484/tables1')
-    table = result[list(result.keys())[0]]
-    table.convert_bytestring_to_unicode()
-    for row in pbar(table, task_str):
-        row = convert_aq_output(row)
-        name = str(row['Name'])
-        name = catalog.add_entry(name)
-        source = catalog.entries[name].add_source(
-            bibcode='2011Natur.474..484Q')
-        catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, source)
-        photodict = {
-            PHOTOMETRY.TIME: row['MJD'],
-            PHOTOMETRY.U_TIME: 'MJD',
-            PHOTOMETRY.BAND: row['Filt'],
-            PHOTOMETRY.TELESCOPE: row['Tel'],
-            PHOTOMETRY.MAGNITUDE: row['mag'],
-            PHOTOMETRY.E_MAGNITUDE: row['e_mag'],
-            PHOTOMETRY.SOURCE: source
-        }
-        catalog.entries[name].add_photometry(**photodict)
+    ingest_photometry(catalog, viz, {
+        'catalog': 'J/other/Nat/474.484/tables1',
+        'bibcode': '2011Natur.474..484Q',
+        'name_column': 'Name',
+        'band_column': 'Filt',
+        'columns': {PHOTOMETRY.TELESCOPE: 'Tel'}
+    })
     catalog.journal_entries()
 
     # 2011ApJ...736..159G
-    result = viz.get_catalogs('J/ApJ/736/159/table1')
-    table = result[list(result.keys())[0]]
-    table.convert_bytestring_to_unicode()
-    name = 'PTF10vdl'
-    name = catalog.add_entry(name)
-    source = catalog.entries[name].add_source(bibcode='2011ApJ...736..159G')
-    catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, source)
-    for row in pbar(table, task_str):
-        row = convert_aq_output(row)
-        photodict = {
-            PHOTOMETRY.TIME: str(jd_to_mjd(Decimal(row['JD']))),
-            PHOTOMETRY.U_TIME: 'MJD',
-            PHOTOMETRY.BAND: row['Filt'],
-            PHOTOMETRY.TELESCOPE: row['Tel'],
-            PHOTOMETRY.MAGNITUDE: row['mag'],
-            PHOTOMETRY.SOURCE: source
-        }
-        if is_number(row['e_mag']):
-            photodict[PHOTOMETRY.E_MAGNITUDE] = row['e_mag']
-        else:
-            photodict[PHOTOMETRY.UPPER_LIMIT] = True
-
-        catalog.entries[name].add_photometry(**photodict)
+    ingest_photometry(catalog, viz, {
+        'catalog': 'J/ApJ/736/159/table1',
+        'bibcode': '2011ApJ...736..159G',
+        'name': 'PTF10vdl',
+        'time': 'JD',
+        'time_format': 'jd',
+        'band_column': 'Filt',
+        'missing_error': 'upper_limit',
+        'columns': {PHOTOMETRY.TELESCOPE: 'Tel'}
+    })
     catalog.journal_entries()
 
     # 2012ApJ...760L..33B
@@ -2289,87 +2133,36 @@ def _viz_5(catalog, viz):
     catalog.journal_entries()
 
     # 2016ApJ...821...57D
-    name, source = catalog.new_entry('SN2013ge', bibcode="2016ApJ...821...57D")
-    result = viz.get_catalogs("J/ApJ/821/57/table1")
-    table = result[list(result.keys())[0]]
-    table.convert_bytestring_to_unicode()
-    for row in pbar(table, task_str):
-        row = convert_aq_output(row)
-        for band in ['UVW2', 'UVM2', 'UVW1', 'U', 'B', 'V']:
-            bandtag = band + 'mag'
-            if (bandtag in row and is_number(row[bandtag]) and not isnan(float(row[bandtag]))):
-                photodict = {
-                    PHOTOMETRY.TIME: str(row["MJD"]),
-                    PHOTOMETRY.U_TIME: 'MJD',
-                    PHOTOMETRY.BAND: band,
-                    PHOTOMETRY.MAGNITUDE: row[bandtag],
-                    PHOTOMETRY.E_MAGNITUDE: row["e_" + bandtag],
-                    PHOTOMETRY.TELESCOPE: 'Swift',
-                    PHOTOMETRY.INSTRUMENT: 'UVOT',
-                    PHOTOMETRY.SOURCE: source
-                }
-                catalog.entries[name].add_photometry(**photodict)
-    result = viz.get_catalogs("J/ApJ/821/57/table2")
-    table = result[list(result.keys())[0]]
-    table.convert_bytestring_to_unicode()
-    for row in pbar(table, task_str):
-        row = convert_aq_output(row)
-        for band in ['B', 'V', 'R', 'I']:
-            bandtag = band + 'mag'
-            if (bandtag in row and is_number(row[bandtag]) and not isnan(float(row[bandtag]))):
-                photodict = {
-                    PHOTOMETRY.TIME: str(row["MJD"]),
-                    PHOTOMETRY.U_TIME: 'MJD',
-                    PHOTOMETRY.BAND: band,
-                    PHOTOMETRY.MAGNITUDE: row[bandtag],
-                    PHOTOMETRY.E_MAGNITUDE: row["e_" + bandtag],
-                    PHOTOMETRY.INSTRUMENT: 'CAO',
-                    PHOTOMETRY.SOURCE: source
-                }
-                catalog.entries[name].add_photometry(**photodict)
-    result = viz.get_catalogs("J/ApJ/821/57/table3")
-    table = result[list(result.keys())[0]]
-    table.convert_bytestring_to_unicode()
-    for row in pbar(table, task_str):
-        row = convert_aq_output(row)
-        for band in ['B', 'V', "r'", "i'"]:
-            bandtag = band + 'mag'
-            if (bandtag in row and is_number(row[bandtag]) and not isnan(float(row[bandtag]))):
-                photodict = {
-                    PHOTOMETRY.TIME: str(row["MJD"]),
-                    PHOTOMETRY.U_TIME: 'MJD',
-                    PHOTOMETRY.BAND: band,
-                    PHOTOMETRY.MAGNITUDE: row[bandtag],
-                    PHOTOMETRY.E_MAGNITUDE: row["e_" + bandtag],
-                    PHOTOMETRY.INSTRUMENT: 'FLWO',
-                    PHOTOMETRY.SOURCE: source
-                }
-                catalog.entries[name].add_photometry(**photodict)
-    result = viz.get_catalogs("J/ApJ/821/57/table4")
-    table = result[list(result.keys())[0]]
-    table.convert_bytestring_to_unicode()
-    for row in pbar(table, task_str):
-        row = convert_aq_output(row)
-        for band in ['r', 'i', 'z']:
-            bandtag = band + 'mag'
-            if (bandtag in row and is_number(row[bandtag]) and not isnan(float(row[bandtag]))):
-                upp = False
-                if "l_" + bandtag in row and row["l_" + bandtag] == ">":
-                    upp = True
-                e_mag = row["e_" +
-                            bandtag] if is_number(row["e_" + bandtag]) else None
-                photodict = {
-                    PHOTOMETRY.TIME: str(row["MJD"]),
-                    PHOTOMETRY.U_TIME: 'MJD',
-                    PHOTOMETRY.BAND: band,
-                    PHOTOMETRY.MAGNITUDE: row[bandtag],
-                    PHOTOMETRY.UPPER_LIMIT: upp,
-                    PHOTOMETRY.INSTRUMENT: row["Inst"],
-                    PHOTOMETRY.SOURCE: source
-                }
-                if e_mag is not None:
-                    photodict[PHOTOMETRY.E_MAGNITUDE] = e_mag
-                catalog.entries[name].add_photometry(**photodict)
+    ingest_photometry(catalog, viz, {
+        'catalog': 'J/ApJ/821/57/table1',
+        'bibcode': '2016ApJ...821...57D',
+        'name': 'SN2013ge',
+        'bands': ['UVW2', 'UVM2', 'UVW1', 'U', 'B', 'V'],
+        'constants': {PHOTOMETRY.TELESCOPE: 'Swift',
+                      PHOTOMETRY.INSTRUMENT: 'UVOT'}
+    })
+    ingest_photometry(catalog, viz, {
+        'catalog': 'J/ApJ/821/57/table2',
+        'bibcode': '2016ApJ...821...57D',
+        'name': 'SN2013ge',
+        'bands': ['B', 'V', 'R', 'I'],
+        'constants': {PHOTOMETRY.INSTRUMENT: 'CAO'}
+    })
+    ingest_photometry(catalog, viz, {
+        'catalog': 'J/ApJ/821/57/table3',
+        'bibcode': '2016ApJ...821...57D',
+        'name': 'SN2013ge',
+        'bands': ['B', 'V', "r'", "i'"],
+        'constants': {PHOTOMETRY.INSTRUMENT: 'FLWO'}
+    })
+    ingest_photometry(catalog, viz, {
+        'catalog': 'J/ApJ/821/57/table4',
+        'bibcode': '2016ApJ...821...57D',
+        'name': 'SN2013ge',
+        'bands': ['r', 'i', 'z'],
+        'upper_limit': ['>'],
+        'columns': {PHOTOMETRY.INSTRUMENT: 'Inst'}
+    })
     catalog.journal_entries()
 
     # 2004ApJ...607..665R
@@ -2386,24 +2179,18 @@ def _viz_5(catalog, viz):
             SUPERNOVA.RA, row['RAJ2000'], source)
         catalog.entries[name].add_quantity(
             SUPERNOVA.DEC, row['DEJ2000'], source)
-    result = viz.get_catalogs("J/ApJ/607/665/table2")
-    table = result[list(result.keys())[0]]
-    table.convert_bytestring_to_unicode()
-    for row in pbar(table, task_str):
-        row = convert_aq_output(row)
-        name = row['Name'].replace('SN ', 'SN')
-        name, source = catalog.new_entry(name, bibcode="2004ApJ...607..665R")
-        mjd = str(jd_to_mjd(Decimal('2000') + Decimal(row['HJD'])))
-        photodict = {
-            PHOTOMETRY.TIME: mjd,
-            PHOTOMETRY.U_TIME: 'MJD',
-            PHOTOMETRY.BAND: row['Filt'],
-            PHOTOMETRY.MAGNITUDE: row['Vega'],
-            PHOTOMETRY.SYSTEM: 'Vega',
-            PHOTOMETRY.E_MAGNITUDE: row['e_Vega'],
-            PHOTOMETRY.SOURCE: source
-        }
-        catalog.entries[name].add_photometry(**photodict)
+    ingest_photometry(catalog, viz, {
+        'catalog': 'J/ApJ/607/665/table2',
+        'bibcode': '2004ApJ...607..665R',
+        'name_column': 'Name',
+        'name_transform': lambda name: name.replace('SN ', 'SN'),
+        'time': 'HJD',
+        'time_format': 'jd',
+        'time_offset': '2000',
+        'band_column': 'Filt',
+        'magnitude': 'Vega',
+        'constants': {PHOTOMETRY.SYSTEM: 'Vega'}
+    })
     result = viz.get_catalogs("J/ApJ/607/665/table5")
     table = result[list(result.keys())[0]]
     table.convert_bytestring_to_unicode()
@@ -2421,9 +2208,9 @@ def _viz_5(catalog, viz):
 def do_lennarz(catalog):
     """Import data from the Lennarz catalog."""
     task_str = catalog.get_current_task_str()
-    viz = Vizier(columns=['**'])
-    viz.ROW_LIMIT = -1
-    viz.VIZIER_SERVER = 'vizier.cfa.harvard.edu'
+    viz = VizierCache(
+        os.path.join(catalog.get_current_task_repo(), 'VizieR'), catalog.log,
+        server='vizier.cfa.harvard.edu')
     result = viz.get_catalogs('J/A+A/538/A120/usc')
     table = result[list(result.keys())[0]]
     table.convert_bytestring_to_unicode()
@@ -3,7 +3,6 @@
 """
 import json
 import os
-import warnings
 from glob import glob
 from html import unescape
 
@@ -13,9 +12,217 @@ from astrocats.structures.struct import SOURCE, SPECTRUM
 from astrocats.utils import is_number, pbar, uniq_cdl
 
 from ..supernova import SUPERNOVA
+from ..utils import atomic_write, parse_in_pool
+
+# Parsed folders and their index, hidden from the folder glob
+WISEREP_CACHE_DIR = '.wiserep-cache'
+# Bumped when the parsed form changes, invalidating the cache
+WISEREP_CACHE_VERSION = 1
+
+# These are known to be in error on the WISeREP page, either fix or ignore
+# them.
+WISEREP_BIB_CORRECTIONS = {
+    '2000AJ....120..367G]': '2000AJ....120..367G',
+    'Harutyunyan et al. 2008': '2008A&A...488..383H',
+    '0609268': '2007AJ....133...58K',
+    '2006ApJ...636...400Q': '2006ApJ...636..400Q',
+    '2011ApJ...741...76': '2011ApJ...741...76C',
+    '2016PASP...128...961': '2016PASP..128...961',
+    '2002AJ....1124..417H': '2002AJ....1124.417H',
+    '2013ApJ…774…58D': '2013ApJ...774...58D',
+    '2011Sci.333..856S': '2011Sci...333..856S',
+    '2014MNRAS.438,368': '2014MNRAS.438..368T',
+    '2012MNRAS.420.1135': '2012MNRAS.420.1135S',
+    '2012Sci..337..942D': '2012Sci...337..942D',
+    'stt1839': '2013MNRAS.436.3614S',
+    'arXiv:1605.03136': '2016MNRAS.460.3447T',
+    '10.1093/mnras/stt1839': '2013MNRAS.436.3614S'
+}
+
+
+def _folder_signature(folder):
+    """Names, sizes and modification times of the files of `folder`."""
+    return sorted([entry.name, entry.stat().st_size, entry.stat().st_mtime]
+                  for entry in os.scandir(folder) if entry.is_file())
+
+
+def _parse_wiserep_spectrum(fname, meta):
+    """Parse the spectrum file `fname` described by its README `meta`."""
+    with open(fname, 'r') as f:
+        data = [x.split() for x in f]
+
+    newdata = []
+    oldval = ''
+    for row in data:
+        if (not row) or ('#' in row[0]):
+            continue
+        if len(row) < 2:
+            continue
+        if is_number(row[0]) and is_number(row[1]) and (row[1] != oldval):
+            newdata.append(row)
+            oldval = row[1]
+    if not newdata:
+        return None
+
+    data = [list(i) for i in zip(*newdata)]
+    wavelengths = data[0]
+    fluxes = data[1]
+    errors = None
+    if len(data) == 3:
+        errors = data[1]
+
+    if max([float(x) for x in fluxes]) < 1.0e-5:
+        fluxunit = 'erg/s/cm^2/Angstrom'
+    else:
+        fluxunit = 'Uncalibrated'
+    return {
+        'wavelengths': wavelengths,
+        'fluxes': fluxes,
+        'errors': errors,
+        'fluxunit': fluxunit,
+        'time': str(astrotime(meta["Obs. Date"]).mjd)
+    }
+
+
+def _parse_wiserep_folder(folder, cache_path):
+    """Parse the README and spectra of an object folder.
+
+    Runs in the worker processes of `do_wiserep_spectra`; the result is also
+    written to `cache_path`.  Returns a dict with the ``readme`` metadata
+    (`None` if missing) and, for every spectrum file with metadata, its
+    ``specfile`` name and parsed ``spectrum`` (`None` if it has no data).
+    """
+    parsed = {'readme': None, 'spectra': [], 'missing': []}
+    readme_path = os.path.join(folder, 'README.json')
+    if os.path.exists(readme_path):
+        with open(readme_path, 'r') as f:
+            parsed['readme'] = json.loads(f.read())
+        for specfile in sorted(os.listdir(folder)):
+            fname = os.path.join(folder, specfile)
+            if specfile == 'README.json' or not os.path.isfile(fname):
+                continue
+            if specfile not in parsed['readme']:
+                parsed['missing'].append(fname)
+                continue
+            parsed['spectra'].append({
+                'specfile': specfile,
+                'spectrum': _parse_wiserep_spectrum(
+                    fname, parsed['readme'][specfile])
+            })
+    atomic_write(cache_path, json.dumps(parsed, separators=(',', ':')))
+    return parsed
+
+
+def _load_wiserep_folder(folder, cache_path, changed):
+    """Parse a changed folder, or read an unchanged one from its cache."""
+    if not changed:
+        try:
+            with open(cache_path, 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            pass
+    return _parse_wiserep_folder(folder, cache_path)
+
+
+def _wiserep_name(folder):
+    name = os.path.basename(folder).strip()
+    if name.startswith('sn'):
+        name = 'SN' + name[2:]
+    if name.startswith(('CSS', 'SSS', 'MLS')) and (':' not in name):
+        name = name.replace('-', ':', 1)
+    if name.startswith('MASTERJ'):
+        name = name.replace('MASTERJ', 'MASTER OT J')
+    if name.startswith('PSNJ'):
+        name = name.replace('PSNJ', 'PSN J')
+    return name
+
+
+def _add_wiserep_folder(catalog, name, parsed):
+    """Add the parsed contents of an object folder to entry `name`."""
+    secondarysource = catalog.entries[name].add_source(
+        name='WISeREP',
+        url='http://wiserep.weizmann.ac.il/',
+        bibcode='2012PASP..124..668Y',
+        secondary=True)
+    catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, secondarysource)
+
+    fileinfo = parsed['readme']
+    if fileinfo is None:
+        catalog.log.warning(
+            'Metadata file not found for event "{}"'.format(name))
+        return
+    for fname in parsed['missing']:
+        catalog.log.warning('Metadata not found for "{}"'.format(fname))
+
+    for item in parsed['spectra']:
+        specfile = item['specfile']
+        claimedtype = fileinfo[specfile]["Type"]
+        instrument = fileinfo[specfile]["Instrument"]
+        observer = fileinfo[specfile]["Observer"]
+        reducer = fileinfo[specfile]["Reducer"]
+        bibcode = fileinfo[specfile]["Bibcode"]
+        redshift = fileinfo[specfile]["Redshift"]
+        survey = fileinfo[specfile]["Program"]
+        reduction = fileinfo[specfile]["Reduction Status"]
+
+        if bibcode:
+            newbibcode = WISEREP_BIB_CORRECTIONS.get(bibcode, bibcode)
+            if newbibcode and len(newbibcode) == 19:
+                source = catalog.entries[name].add_source(bibcode=unescape(newbibcode))
+            else:
+                bibname = unescape(bibcode)
+                source = catalog.entries[name].add_source(name=bibname)
+                msg = 'Bibcode "{}" is invalid, using as `{}` instead'.format(
+                    bibname, SOURCE.NAME)
+                catalog.log.warning(msg)
+            sources = uniq_cdl([source, secondarysource])
+        else:
+            sources = secondarysource
+
+        if claimedtype not in ['Other']:
+            catalog.entries[name].add_quantity(
+                SUPERNOVA.CLAIMED_TYPE, claimedtype, secondarysource)
+        catalog.entries[name].add_quantity(SUPERNOVA.REDSHIFT, redshift, secondarysource)
+
+        parsedspec = item['spectrum']
+        if parsedspec is None:
+            catalog.log.warning('Skipped adding spectrum file ' + specfile)
+            continue
+
+        fluxunit = parsedspec['fluxunit']
+        spec = {
+            SPECTRUM.U_WAVELENGTHS: 'Angstrom',
+            SPECTRUM.U_FLUXES: fluxunit,
+            SPECTRUM.WAVELENGTHS: parsedspec['wavelengths'],
+            SPECTRUM.FLUXES: parsedspec['fluxes'],
+            SPECTRUM.U_TIME: 'MJD',
+            SPECTRUM.TIME: parsedspec['time'],
+            SPECTRUM.INSTRUMENT: instrument,
+            SPECTRUM.SOURCE: sources,
+            SPECTRUM.OBSERVER: observer,
+            SPECTRUM.REDUCER: reducer,
+            SPECTRUM.REDUCTION: reduction,
+            SPECTRUM.FILENAME: specfile,
+            SPECTRUM.REDSHIFT: redshift
+        }
+        if len(survey) > 0:
+            spec[SPECTRUM.SURVEY] = survey
+        if parsedspec['errors'] is not None:
+            spec[SPECTRUM.ERRORS] = parsedspec['errors']
+            spec[SPECTRUM.U_ERRORS] = fluxunit
+
+        catalog.entries[name].add_spectrum(**spec)
 
 
 def do_wiserep_spectra(catalog):
+    """Import the spectra of the WISeREP object folders.
+
+    `.wiserep-cache/index.json` records the names, sizes and modification
+    times of the files of every folder when it was last parsed.  Folders
+    that changed since are parsed again in a pool of processes, and their
+    parsed form cached; unchanged folders are replayed from that cache, or
+    skipped altogether in update mode.
+    """
     if not catalog.args.travis:
         from ..input.WISeWEBSpider.wisewebspider import spider
         try:
@@ -24,156 +231,44 @@ def do_wiserep_spectra(catalog):
             catalog.log.warning('Spider errored, continuing without letting it complete.')
 
     task_str = catalog.get_current_task_str()
-    secondaryreference = 'WISeREP'
-    secondaryrefurl = 'http://wiserep.weizmann.ac.il/'
-    secondarybibcode = '2012PASP..124..668Y'
-    wiserepcnt = 0
-
-    # These are known to be in error on the WISeREP page, either fix or ignore
-    # them.
-    wiserepbibcorrectdict = {'2000AJ....120..367G]': '2000AJ....120..367G',
-                             'Harutyunyan et al. 2008': '2008A&A...488..383H',
-                             '0609268': '2007AJ....133...58K',
-                             '2006ApJ...636...400Q': '2006ApJ...636..400Q',
-                             '2011ApJ...741...76': '2011ApJ...741...76C',
-                             '2016PASP...128...961': '2016PASP..128...961',
-                             '2002AJ....1124..417H': '2002AJ....1124.417H',
-                             '2013ApJ…774…58D': '2013ApJ...774...58D',
-                             '2011Sci.333..856S': '2011Sci...333..856S',
-                             '2014MNRAS.438,368': '2014MNRAS.438..368T',
-                             '2012MNRAS.420.1135': '2012MNRAS.420.1135S',
-                             '2012Sci..337..942D': '2012Sci...337..942D',
-                             'stt1839': '2013MNRAS.436.3614S',
-                             'arXiv:1605.03136': '2016MNRAS.460.3447T',
-                             '10.1093/mnras/stt1839': '2013MNRAS.436.3614S'}
-
-    file_names = list(glob(os.path.join(catalog.get_current_task_repo(), '*')))
-    for folder in pbar(file_names, task_str, sort=True):
-        if '.txt' in folder or '.json' in folder:
-            continue
-        name = os.path.basename(folder).strip()
-        if name.startswith('sn'):
-            name = 'SN' + name[2:]
-        if name.startswith(('CSS', 'SSS', 'MLS')) and (':' not in name):
-            name = name.replace('-', ':', 1)
-        if name.startswith('MASTERJ'):
-            name = name.replace('MASTERJ', 'MASTER OT J')
-        if name.startswith('PSNJ'):
-            name = name.replace('PSNJ', 'PSN J')
-        name = catalog.add_entry(name)
-
-        secondarysource = catalog.entries[name].add_source(
-            name=secondaryreference,
-            url=secondaryrefurl,
-            bibcode=secondarybibcode,
-            secondary=True)
-        catalog.entries[name].add_quantity(SUPERNOVA.ALIAS, name, secondarysource)
-
-        readme_path = os.path.join(folder, 'README.json')
-        if not os.path.exists(readme_path):
-            catalog.log.warning(
-                'Metadata file not found for event "{}"'.format(name))
-            continue
+    task_repo = catalog.get_current_task_repo()
+    cache_dir = os.path.join(task_repo, WISEREP_CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    index_path = os.path.join(cache_dir, 'index.json')
+    index = {}
+    if os.path.isfile(index_path):
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+    if index.get('version') != WISEREP_CACHE_VERSION:
+        index = {'version': WISEREP_CACHE_VERSION, 'folders': {}}
 
-        with open(readme_path, 'r') as f:
-            fileinfo = json.loads(f.read())
+    folders = [
+        folder for folder in sorted(glob(os.path.join(task_repo, '*')))
+        if '.txt' not in folder and '.json' not in folder and
+        os.path.isdir(folder)
+    ]
+    if catalog.args.travis:
+        folders = folders[:catalog.TRAVIS_QUERY_LIMIT]
 
-        files = list(set(glob(folder + '/*')) - set(glob(folder + '/README.json')))
-        for fname in pbar(files, task_str):
-            specfile = os.path.basename(fname)
-            if specfile not in fileinfo:
-                catalog.log.warning('Metadata not found for "{}"'.format(fname))
-                continue
-            claimedtype = fileinfo[specfile]["Type"]
-            instrument = fileinfo[specfile]["Instrument"]
-            epoch = fileinfo[specfile]["Obs. Date"]
-            observer = fileinfo[specfile]["Observer"]
-            reducer = fileinfo[specfile]["Reducer"]
-            bibcode = fileinfo[specfile]["Bibcode"]
-            redshift = fileinfo[specfile]["Redshift"]
-            survey = fileinfo[specfile]["Program"]
-            reduction = fileinfo[specfile]["Reduction Status"]
-
-            if bibcode:
-                newbibcode = bibcode
-                if bibcode in wiserepbibcorrectdict:
-                    newbibcode = wiserepbibcorrectdict[bibcode]
-                if newbibcode and len(newbibcode) == 19:
-                    source = catalog.entries[name].add_source(bibcode=unescape(newbibcode))
-                else:
-                    bibname = unescape(bibcode)
-                    source = catalog.entries[name].add_source(name=bibname)
-                    msg = 'Bibcode "{}" is invalid, using as `{}` instead'.format(
-                        bibname, SOURCE.NAME)
-                    catalog.log.warning(msg)
-                sources = uniq_cdl([source, secondarysource])
-            else:
-                sources = secondarysource
-
-            if claimedtype not in ['Other']:
-                catalog.entries[name].add_quantity(
-                    SUPERNOVA.CLAIMED_TYPE, claimedtype, secondarysource)
-            catalog.entries[name].add_quantity(SUPERNOVA.REDSHIFT, redshift, secondarysource)
-
-            with open(fname, 'r') as f:
-                data = [x.split() for x in f]
-
-            skipspec = False
-            newdata = []
-            oldval = ''
-            for row in data:
-                if (not row) or ('#' in row[0]):
-                    continue
-                if len(row) < 2:
-                    continue
-                if is_number(row[0]) and is_number(row[1]) and (row[1] != oldval):
-                    newdata.append(row)
-                    oldval = row[1]
-
-            if skipspec or not newdata:
-                warnings.warn('Skipped adding spectrum file ' + specfile)
-                continue
-
-            data = [list(i) for i in zip(*newdata)]
-            wavelengths = data[0]
-            fluxes = data[1]
-            errors = None
-            if len(data) == 3:
-                errors = data[1]
-            time = str(astrotime(epoch).mjd)
-
-            if max([float(x) for x in fluxes]) < 1.0e-5:
-                fluxunit = 'erg/s/cm^2/Angstrom'
-            else:
-                fluxunit = 'Uncalibrated'
-
-            spec = {
-                SPECTRUM.U_WAVELENGTHS: 'Angstrom',
-                SPECTRUM.U_FLUXES: fluxunit,
-                SPECTRUM.WAVELENGTHS: wavelengths,
-                SPECTRUM.FLUXES: fluxes,
-                SPECTRUM.U_TIME: 'MJD',
-                SPECTRUM.TIME: time,
-                SPECTRUM.INSTRUMENT: instrument,
-                SPECTRUM.SOURCE: sources,
-                SPECTRUM.OBSERVER: observer,
-                SPECTRUM.REDUCER: reducer,
-                SPECTRUM.REDUCTION: reduction,
-                SPECTRUM.FILENAME: specfile,
-                SPECTRUM.REDSHIFT: redshift
-            }
-            if len(survey) > 0:
-                spec[SPECTRUM.SURVEY] = survey
-            if errors is not None:
-                spec[SPECTRUM.ERRORS] = errors
-                spec[SPECTRUM.U_ERRORS] = fluxunit
-
-            catalog.entries[name].add_spectrum(**spec)
+    jobs = []
+    for folder in folders:
+        base = os.path.basename(folder)
+        signature = _folder_signature(folder)
+        changed = index['folders'].get(base) != signature
+        if changed or not catalog.args.update:
+            jobs.append((folder, signature, changed))
+    catalog.log.info('Parsing {} changed of {} WISeREP folders.'.format(
+        sum(job[2] for job in jobs), len(folders)))
 
+    results = parse_in_pool(catalog, _load_wiserep_folder, [
+        (folder, os.path.join(cache_dir, os.path.basename(folder) + '.json'),
+         changed) for folder, signature, changed in jobs])
+    for (folder, signature, changed), parsed in zip(
+            jobs, pbar(results, task_str, total=len(jobs))):
+        name = catalog.add_entry(_wiserep_name(folder))
+        _add_wiserep_folder(catalog, name, parsed)
         catalog.journal_entries()
+        index['folders'][os.path.basename(folder)] = signature
 
-        wiserepcnt = wiserepcnt + 1
-        if (catalog.args.travis and wiserepcnt >= catalog.TRAVIS_QUERY_LIMIT):
-            break
-
+    atomic_write(index_path, json.dumps(index, separators=(',', ':')))
     return
@@ -0,0 +1,289 @@
+"""Declarative, streaming ingestion of delimited ASCII photometry files.
+
+A dataset is described by a *spec*, a plain dict with the following keys
+(`path`, `bibcode` and one of `name`/`name_pattern` are required):
+
+``path``
+    File path relative to the task repository; may be a glob pattern, in
+    which case every matching file is a dataset of its own.
+``bibcode``
+    Bibcode of the source added to the entry of each file.
+``name``, ``name_pattern``
+    Event name, or a regular expression matched against the file name whose
+    first group is the event name.
+``delimiter``, ``skip_rows``, ``comment``
+    Field delimiter (default tab), number of leading rows to ignore, and the
+    prefix of comment/header rows (default ``'#'``).
+``layout``
+    ``'long'`` (default): one point per row, with the `band`, `magnitude`
+    and `e_magnitude` column indices.  ``'wide'``: one magnitude column per
+    band.  ``'pairs'``: a magnitude and an error column per band, side by
+    side from column `first_column` (default 1); `trailing` non-band
+    columns at the end of each row are never read as bands.
+``bands``, ``header``, ``header_columns``
+    For wide and pairs layouts, a list of band names, or ``'header'``
+    (default) to take them from the fields after the first of the header
+    row.  The header row is every row starting with `comment` (default), or
+    the first row if `header` is ``'first'``.  `header_columns` maps
+    photometry keys to fields of the header row (with `comment` removed)
+    copied to the points that follow it.
+``time``, ``time_format``, ``time_offset``
+    Time column (default 0), its format (``'mjd'`` or ``'jd'``), and a
+    decimal string added to it before conversion to MJD.
+``error_separator``, ``upper_limit``, ``e_magnitude_scale``
+    Separator between magnitude and error within one cell (e.g. ``'±'``, or
+    ``'('`` for ``'17.1 (0.05)'``); marker of an upper limit within a
+    magnitude cell (e.g. ``'>'``), whose error is dropped; and a decimal
+    string the errors are multiplied by (``'0.01'`` for centimagnitudes).
+``counts``, ``zero_point``
+    Dict of count-rate photometry key -> column; magnitudes are then derived
+    with `mags_from_counts` using `zero_point` (as a string).
+``columns``, ``transforms``, ``constants``
+    Dict of photometry key -> column copied to every point, dict of
+    photometry key -> callable applied to each distinct value of that key,
+    and dict of photometry key -> value added to every point.
+
+Files are read row by row with `csv` (the handle is closed as soon as the
+file is consumed) and cells are typed in batches with NumPy; only points
+with a valid time and a numeric magnitude (or count rate) are kept.  Files
+are parsed in a pool of processes, then added to the catalog in the order
+of the specs, one `add_photometry_many` call per batch.
+"""
+import csv
+import os
+import re
+from glob import glob
+
+import numpy as np
+from astrocats.structures.struct import PHOTOMETRY
+from astrocats.utils import pbar
+
+from .counts import mags_from_counts
+from .ingest import _floats, _scale, _to_mjd
+from .parallel import parse_in_pool
+
+__all__ = ['ingest_ascii', 'read_rows']
+
+# Points typed at once by a parser
+BATCH_SIZE = 10000
+
+# Spec keys only used in the main process (callables need not be picklable)
+MAIN_KEYS = ('name', 'name_pattern', 'bibcode', 'transforms', 'constants')
+
+
+def read_rows(path, delimiter='\t', skip_rows=0):
+    """Yield the non-empty rows of the delimited text file `path`."""
+    with open(path, 'r') as ff:
+        reader = csv.reader(ff, delimiter=delimiter, quotechar='"',
+                            skipinitialspace=True)
+        for ri, row in enumerate(reader):
+            if ri >= skip_rows and row:
+                yield row
+
+
+def _field(row, col):
+    """Stripped field `col` of `row`, or `''` if the row is too short."""
+    if col is None or not -len(row) <= col < len(row):
+        return ''
+    return row[col].strip()
+
+
+def _split_cell(cell, separator, limit):
+    """Split a magnitude cell into (magnitude, error, upper limit)."""
+    if limit and limit in cell:
+        return cell.replace(limit, '').strip(), None, True
+    if separator and separator in cell:
+        mag, err = cell.split(separator)[:2]
+        return mag.strip(), err.strip(' )'), False
+    return cell, None, False
+
+
+def _band_cells(row, spec, bands):
+    """List of (band, magnitude cell, error cell) of a data row."""
+    layout = spec.get('layout', 'long')
+    if layout == 'long':
+        return [(_field(row, spec.get('band')),
+                 _field(row, spec.get('magnitude')),
+                 _field(row, spec.get('e_magnitude')))]
+    first = spec.get('first_column', 1)
+    if layout == 'wide':
+        return [(band, _field(row, first + bi), '')
+                for bi, band in enumerate(bands) if first + bi < len(row)]
+    slots = len(range(first, len(row) - spec.get('trailing', 0), 2))
+    return [(band, _field(row, first + 2 * bi), _field(row, first + 2 * bi + 1))
+            for bi, band in enumerate(bands[:slots])]
+
+
+def _typed(raw, spec):
+    """Turn the raw strings of a batch into photometry columns.
+
+    Points without a valid time or a numeric magnitude (or count rate) are
+    dropped; missing values are `None`.
+    """
+    times = np.array(raw.pop('time'), dtype=str)
+    tval, valid = _floats(times)
+    counts = spec.get('counts')
+    ykey = PHOTOMETRY.COUNT_RATE if counts else PHOTOMETRY.MAGNITUDE
+    valid &= _floats(np.array(raw[ykey], dtype=str))[1]
+
+    columns = {}
+    if spec.get('time_format', 'mjd') == 'jd':
+        columns[PHOTOMETRY.TIME] = _to_mjd(
+            times[valid], tval[valid], spec.get('time_offset', '0'))
+    else:
+        columns[PHOTOMETRY.TIME] = times[valid].astype(object)
+    for key, values in raw.items():
+        values = np.array(values, dtype=object)[valid]
+        values[values == ''] = None
+        columns[key] = values
+
+    if PHOTOMETRY.E_MAGNITUDE in raw:
+        estr = np.array(raw[PHOTOMETRY.E_MAGNITUDE], dtype=str)[valid]
+        eval_, evalid = _floats(estr)
+        emags = np.full(len(estr), None, dtype=object)
+        emags[evalid] = estr[evalid]
+        if spec.get('e_magnitude_scale') and np.any(evalid):
+            emags[evalid] = _scale(estr[evalid], eval_[evalid],
+                                   spec['e_magnitude_scale'])
+        columns[PHOTOMETRY.E_MAGNITUDE] = emags
+
+    if counts:
+        count_keys = [PHOTOMETRY.COUNT_RATE, PHOTOMETRY.E_COUNT_RATE,
+                      PHOTOMETRY.E_LOWER_COUNT_RATE,
+                      PHOTOMETRY.E_UPPER_COUNT_RATE]
+        columns.update(mags_from_counts(
+            *[columns.get(key, '') for key in count_keys],
+            zp=spec.get('zero_point', '30'), sig=5.0))
+    return columns
+
+
+def parse_file(path, spec):
+    """Parse the file at `path` into a list of photometry column batches.
+
+    Runs in the worker processes of `ingest_ascii`, so `spec` must not hold
+    the main-process keys (`MAIN_KEYS`).
+    """
+    comment = spec.get('comment', '#')
+    layout = spec.get('layout', 'long')
+    bands = spec.get('bands', 'header')
+    header = None if layout == 'long' or bands != 'header' else spec.get(
+        'header', 'comment')
+    header_columns = spec.get('header_columns', {})
+    counts = spec.get('counts', {})
+    columns = spec.get('columns', {})
+    keys = (['time'] + list(header_columns) + list(columns) +
+            (list(counts) if counts else [
+                PHOTOMETRY.BAND, PHOTOMETRY.MAGNITUDE,
+                PHOTOMETRY.E_MAGNITUDE, PHOTOMETRY.UPPER_LIMIT]))
+
+    batches = []
+    raw = {key: [] for key in keys}
+    context = {key: '' for key in header_columns}
+    if isinstance(bands, str):
+        bands = []
+    for ri, row in enumerate(read_rows(
+            path, spec.get('delimiter', '\t'), spec.get('skip_rows', 0))):
+        if (header == 'first' and ri == 0) or (
+                row[0].startswith(comment) and header == 'comment'):
+            row = [row[0][len(comment):] if row[0].startswith(comment)
+                   else row[0]] + row[1:]
+            bands = [xx.strip() for xx in row[1:]]
+            context = {key: _field(row, col)
+                       for key, col in header_columns.items()}
+            continue
+        if row[0].startswith(comment):
+            continue
+
+        time = _field(row, spec.get('time', 0))
+        common = [(key, _field(row, col)) for key, col in columns.items()]
+        if counts:
+            points = [[(key, _field(row, col)) for key, col in counts.items()]]
+        else:
+            points = []
+            for band, cell, ecell in _band_cells(row, spec, bands):
+                mag, err, ul = _split_cell(
+                    cell, spec.get('error_separator'), spec.get('upper_limit'))
+                if ecell and not ul:
+                    err = ecell
+                points.append([(PHOTOMETRY.BAND, band),
+                               (PHOTOMETRY.MAGNITUDE, mag),
+                               (PHOTOMETRY.E_MAGNITUDE, err or ''),
+                               (PHOTOMETRY.UPPER_LIMIT, True if ul else '')])
+        for point in points:
+            raw['time'].append(time)
+            for key, val in list(context.items()) + common + point:
+                raw[key].append(val)
+        if len(raw['time']) >= BATCH_SIZE:
+            batches.append(_typed(raw, spec))
+            raw = {key: [] for key in keys}
+    if raw['time']:
+        batches.append(_typed(raw, spec))
+    return batches
+
+
+def _event_name(spec, path):
+    if 'name' in spec:
+        return spec['name']
+    match = re.match(spec['name_pattern'], os.path.basename(path))
+    return match.group(1) if match else None
+
+
+def _transform(values, func):
+    cache = {}
+    out = np.empty(len(values), dtype=object)
+    for ii, val in enumerate(values):
+        if val is None:
+            out[ii] = None
+            continue
+        if val not in cache:
+            cache[val] = func(val)
+        out[ii] = cache[val]
+    return out
+
+
+def _apply(catalog, spec, path, batches):
+    """Add the parsed `batches` of the file at `path` to the catalog."""
+    oname = _event_name(spec, path)
+    if not oname:
+        catalog.log.warning("No event name for '{}'.".format(path))
+        return
+    name, source = catalog.new_entry(oname, bibcode=spec['bibcode'])
+    for columns in batches:
+        if not len(columns[PHOTOMETRY.TIME]):
+            continue
+        for key, func in spec.get('transforms', {}).items():
+            if key in columns:
+                columns[key] = _transform(columns[key], func)
+        columns.update(spec.get('constants', {}))
+        columns[PHOTOMETRY.U_TIME] = 'MJD'
+        catalog.entries[name].add_photometry_many(columns, source=source)
+
+
+def ingest_ascii(catalog, specs):
+    """Add the photometry of the ASCII datasets described by `specs`.
+
+    Files are parsed concurrently (by up to the task's concurrency in worker
+    processes) and added in order, the entries being journaled after the
+    files of each spec.
+    """
+    task_str = catalog.get_current_task_str()
+    task_repo = catalog.get_current_task_repo()
+    jobs = []
+    for si, spec in enumerate(specs):
+        paths = sorted(glob(os.path.join(task_repo, spec['path'])))
+        if not paths:
+            catalog.log.warning("No files match '{}'.".format(spec['path']))
+        jobs.extend((si, path) for path in paths)
+    if not jobs:
+        return
+
+    worker_specs = [{kk: vv for kk, vv in spec.items() if kk not in MAIN_KEYS}
+                    for spec in specs]
+    results = parse_in_pool(
+        catalog, parse_file,
+        [(path, worker_specs[si]) for si, path in jobs])
+    for ji, batches in enumerate(pbar(results, task_str, total=len(jobs))):
+        si, path = jobs[ji]
+        _apply(catalog, specs[si], path, batches)
+        if ji + 1 == len(jobs) or jobs[ji + 1][0] != si:
+            catalog.journal_entries()
@@ -3,7 +3,33 @@ they are unique.
 '''
 from decimal import Decimal
 
-__all__ = ['same_tag_num', 'same_tag_str']
+__all__ = ['photometry_key', 'same_tag_num', 'same_tag_str']
+
+# Photometry fields astrocats declares with ``compare=False``, i.e. that
+# `is_duplicate_of` does not look at
+PHOTOMETRY_NO_COMPARE = frozenset([
+    'description', 'instrument', 'mode', 'model', 'observatory', 'observer',
+    'source', 'survey', 'telescope'])
+
+
+def _hashable(value):
+    if isinstance(value, list):
+        return tuple(_hashable(xx) for xx in value)
+    if isinstance(value, dict):
+        return tuple(sorted((kk, _hashable(vv)) for kk, vv in value.items()))
+    return value
+
+
+def photometry_key(photo):
+    '''Return the key under which duplicates of photometry `photo` match.
+
+    Two points have the same key if `is_duplicate_of` would find them equal:
+    they have the same compared fields, with equal values (no numerical
+    normalization, ``'17.10'`` differs from ``'17.1'``).  Lists and dicts
+    are made hashable.
+    '''
+    return tuple(sorted((key, _hashable(val)) for key, val in photo.items()
+                        if key not in PHOTOMETRY_NO_COMPARE))
 
 
 def same_tag_num(photo, val, tag, canbelist=False):
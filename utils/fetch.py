@@ -0,0 +1,375 @@
+"""Pooled, concurrent HTTP fetching with conditional requests.
+
+`FetchService` keeps one keep-alive `requests.Session` per host, limits the
+request rate per host, retries transient failures with exponential backoff,
+and stores the `ETag`/`Last-Modified` validators of every cached file in a
+JSON index (the catalog keeps it in its cache directory, out of the data
+repositories).  A later fetch of the same URL into the same path sends those
+validators back, so an unchanged page comes back as an empty ``304 Not
+Modified`` and is read from disk instead.  The index is written after every
+`fetch` and `fetch_many`, so it survives a crash.
+"""
+import codecs
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .journal import atomic_write
+
+__all__ = ['FetchService', 'FetchResult']
+
+FetchResult = namedtuple(
+    'FetchResult', ['url', 'path', 'text', 'status', 'modified', 'ok'])
+FetchResult.__doc__ = """Outcome of a fetch.
+
+`text` is `None` if neither the URL nor a cached copy could be read;
+`status` is the HTTP status (`None` if no request was made or it failed);
+`modified` is `False` when the cached copy was confirmed current; `ok` is
+`False` only if the request failed, i.e. `text` is a cached copy that may be
+stale, and `True` for downloads, ``304`` responses and files deliberately
+read from the cache.
+"""
+
+USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X '
+              '10_10_1) AppleWebKit/537.36 (KHTML, like Gecko) '
+              'Chrome/39.0.2171.95 Safari/537.36')
+
+# Status codes worth retrying; anything else is final.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Bytes written at a time by `FetchService.download_file`
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+
+class _HostLimiter(object):
+    """Enforce a minimum interval between request starts to one host."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.time()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class _ValidatorStore(object):
+    """Index of the HTTP validators of cached files, kept in one JSON file.
+
+    Files are keyed by their path relative to `root`.  Without a `path`, the
+    validators are only kept for the lifetime of the store.
+    """
+
+    def __init__(self, path=None, root=None):
+        self.path = path
+        self.root = root
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._data = {}
+        if path is not None and os.path.isfile(path):
+            try:
+                with codecs.open(path, 'r', encoding='utf8') as ff:
+                    self._data = json.load(ff)
+            except ValueError:
+                self._data = {}
+
+    def _key(self, path):
+        path = os.path.abspath(path)
+        return os.path.relpath(path, self.root) if self.root else path
+
+    def get(self, path, url):
+        with self._lock:
+            val = self._data.get(self._key(path))
+        # Validators are only meaningful for the URL they were issued by
+        if not val or val.get('url') != url:
+            return None
+        return val
+
+    def set(self, path, url, headers):
+        key = self._key(path)
+        val = {'url': url}
+        if headers.get('ETag'):
+            val['etag'] = headers['ETag']
+        if headers.get('Last-Modified'):
+            val['last_modified'] = headers['Last-Modified']
+        with self._lock:
+            if len(val) == 1:
+                if self._data.pop(key, None) is not None:
+                    self._dirty = True
+                return
+            if self._data.get(key) != val:
+                self._data[key] = val
+                self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty or self.path is None:
+                return
+            atomic_write(self.path, json.dumps(
+                self._data, indent='\t', separators=(',', ':'),
+                sort_keys=True))
+            self._dirty = False
+
+
+class FetchService(object):
+    """Shared HTTP client used by import tasks.
+
+    Arguments
+    ---------
+    log : logging.Logger
+    max_workers : int
+        Default number of concurrent requests in `fetch_many`.
+    retries : int
+        Number of retries after a failed attempt.
+    backoff : float
+        Seconds before the first retry; doubled on every further retry.
+    host_intervals : dict
+        Minimum number of seconds between two requests to a host, by host
+        name.  Hosts not listed use `default_interval`.
+    validators_path : str
+        JSON file the validators of cached files are kept in; they are not
+        saved if `None`.
+    root : str
+        Directory the paths of cached files are stored relative to.
+    """
+
+    def __init__(self, log, max_workers=4, retries=3, backoff=1.0,
+                 host_intervals=None, default_interval=0.0,
+                 validators_path=None, root=None):
+        self.log = log
+        self.max_workers = max(int(max_workers), 1)
+        self.retries = retries
+        self.backoff = backoff
+        self.host_intervals = dict(host_intervals or {})
+        self.default_interval = default_interval
+        self.validators = _ValidatorStore(validators_path, root)
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._limiters = {}
+        self._pool_size = self.max_workers
+
+    def _mount(self, session):
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=self._pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+    def reserve(self, workers):
+        """Make every host's connection pool hold `workers` connections.
+
+        Pools only grow, so that concurrent requests never have to discard
+        and reopen connections.
+        """
+        with self._lock:
+            if workers <= self._pool_size:
+                return
+            self._pool_size = workers
+            for session in self._sessions.values():
+                self._mount(session)
+
+    def session(self, url):
+        """Return the keep-alive session used for the host of `url`."""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                self._mount(session)
+                session.headers['User-Agent'] = USER_AGENT
+                self._sessions[host] = session
+                self._limiters[host] = _HostLimiter(
+                    self.host_intervals.get(host, self.default_interval))
+            return self._sessions[host], self._limiters[host]
+
+    def request(self, url, timeout=120, post=None, verify=True, headers=None,
+                stream=False):
+        """Issue a request with rate limiting and retries.
+
+        Returns the final `requests.Response`; raises the last error if every
+        attempt failed.  With `stream`, the body of a GET response is only
+        read as it is iterated over.
+        """
+        session, limiter = self.session(url)
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            limiter.wait()
+            try:
+                if post:
+                    response = session.post(
+                        url, data=post, timeout=timeout, verify=verify,
+                        headers=headers)
+                else:
+                    response = session.get(
+                        url, timeout=timeout, verify=verify, headers=headers,
+                        stream=stream)
+                if (response.status_code not in RETRY_STATUSES or
+                        attempt == self.retries):
+                    return response
+                wait = _retry_after(response, delay)
+                self.log.debug("'{}' returned {}, retrying in {}s.".format(
+                    url, response.status_code, wait))
+            except (requests.ConnectionError, requests.Timeout) as err:
+                if attempt == self.retries:
+                    raise
+                wait = delay
+                self.log.debug("'{}' failed ('{}'), retrying in {}s.".format(
+                    url, err, wait))
+            time.sleep(wait)
+            delay *= 2
+        return response
+
+    def download(self, url, timeout=120, post=None, verify=True):
+        """Return the text at `url`; raise on any failure."""
+        response = self.request(url, timeout=timeout, post=post, verify=verify)
+        response.raise_for_status()
+        for xx in response.history:
+            xx.raise_for_status()
+        return response.text
+
+    def fetch(self, url, path, timeout=120, post=None, verify=True,
+              write=True):
+        """Fetch `url` into the cache file `path`, conditionally if possible.
+
+        On failure the existing cached file (if any) is returned instead.
+        The validators of the file are saved before returning.
+        """
+        try:
+            return self._fetch(url, path, timeout=timeout, post=post,
+                               verify=verify, write=write)
+        finally:
+            self.validators.save()
+
+    def _fetch(self, url, path, timeout=120, post=None, verify=True,
+               write=True):
+        cached = None
+        if os.path.isfile(path):
+            with codecs.open(path, 'r', encoding='utf8') as ff:
+                cached = ff.read()
+
+        headers = {}
+        val = self.validators.get(path, url) if cached is not None else None
+        if val and not post:
+            if 'etag' in val:
+                headers['If-None-Match'] = val['etag']
+            if 'last_modified' in val:
+                headers['If-Modified-Since'] = val['last_modified']
+
+        try:
+            response = self.request(url, timeout=timeout, post=post,
+                                    verify=verify, headers=headers)
+            if response.status_code == 304 and cached is not None:
+                self.log.debug("'{}' not modified.".format(url))
+                return FetchResult(url, path, cached, 304, False, True)
+            response.raise_for_status()
+            for xx in response.history:
+                xx.raise_for_status()
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except Exception as err:
+            self.log.warning("URL Download of '{}' failed ('{}').".format(
+                url, err))
+            return FetchResult(url, path, cached, None, False, False)
+
+        text = response.text
+        modified = text != cached
+        if write:
+            if modified:
+                dirname = os.path.dirname(os.path.abspath(path))
+                if not os.path.isdir(dirname):
+                    os.makedirs(dirname, exist_ok=True)
+                atomic_write(path, text)
+            self.validators.set(path, url, response.headers)
+        return FetchResult(url, path, text, response.status_code, modified,
+                           True)
+
+    def download_file(self, url, path, size=None, timeout=120, verify=True):
+        """Download the (binary) file at `url` to `path`, resumably.
+
+        The data is streamed to `path` + ``.part``, which is left behind if
+        the download is interrupted: the next call then only requests the
+        missing bytes.  The file is renamed to `path` once complete, i.e.
+        when the server has sent everything or, if `size` is given, once it
+        is `size` bytes long.  Raises on failure.
+        """
+        part = path + '.part'
+        offset = os.path.getsize(part) if os.path.isfile(part) else 0
+        if size is not None and offset > size:
+            offset = 0
+        if size is None or offset < size:
+            headers = {'Range': 'bytes={}-'.format(offset)} if offset else None
+            response = self.request(url, timeout=timeout, verify=verify,
+                                    headers=headers, stream=True)
+            try:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    # Range not honored: the whole file is sent
+                    offset = 0
+                with open(part, 'ab' if offset else 'wb') as ff:
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        ff.write(chunk)
+            finally:
+                response.close()
+        if size is not None and os.path.getsize(part) != size:
+            raise IOError("Download of '{}' is incomplete ({} of {} "
+                          "bytes).".format(url, os.path.getsize(part), size))
+        os.replace(part, path)
+        return path
+
+    def fetch_many(self, urls, paths, max_workers=None, **kwargs):
+        """Fetch every `urls[i]` into `paths[i]` concurrently.
+
+        At most `max_workers` requests are in flight at once.  Results are
+        returned as a list of `FetchResult`, in the order of `urls`.
+        """
+        if len(urls) != len(paths):
+            raise ValueError("`urls` and `paths` must have the same length.")
+        workers = max(int(max_workers or self.max_workers), 1)
+        self.reserve(workers)
+        try:
+            if workers == 1 or len(urls) <= 1:
+                return [self._fetch(url, path, **kwargs)
+                        for url, path in zip(urls, paths)]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(
+                    lambda up: self._fetch(up[0], up[1], **kwargs),
+                    zip(urls, paths)))
+        finally:
+            self.validators.save()
+
+    def close(self):
+        """Persist validators and close all sessions."""
+        self.validators.save()
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+            self._limiters = {}
+
+
+def _retry_after(response, default):
+    """Seconds to wait before retrying, honoring a `Retry-After` header."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(),
+                   0.0)
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,216 @@
+"""Extraction of the cells of HTML tables for scraping tasks.
+
+Pages are read in a single pass of the standard library's `HTMLParser`,
+which is much faster than building a full `BeautifulSoup` tree with
+html5lib.  Only the parts of the document that the import tasks use are
+kept: for every table row, one `TableCell` per ``td`` (and optionally
+``th``) cell holding
+
+``text``
+    All the text of the cell, like BeautifulSoup's ``td.text``.
+``href``
+    The ``href`` of the first link in the cell, or `None`.
+``links``
+    A `TableLink` (text, href, attributes) for every ``a`` in the cell.
+``parts``
+    The text of every direct child of the cell, like ``td.contents``.
+
+Rows are kept even when they have no cells (header rows of ``th``), so
+row indices match those of ``findAll('tr')``.
+"""
+from collections import namedtuple
+from html.parser import HTMLParser
+
+__all__ = ['TableCell', 'TableLink', 'extract_rows', 'extract_tables',
+           'fix_html']
+
+TableCell = namedtuple('TableCell', ['text', 'href', 'links', 'parts'])
+TableLink = namedtuple('TableLink', ['text', 'href', 'attrs'])
+
+# Elements without an end tag
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+                 'link', 'meta', 'param', 'source', 'track', 'wbr'}
+SECTIONS = ('thead', 'tbody', 'tfoot')
+
+
+def fix_html(html):
+    """Repair the HTML manglings common on the scraped pages."""
+    return html.replace('ahref=', 'a href=')
+
+
+class _Cell(object):
+    """A table cell being parsed."""
+
+    def __init__(self):
+        self.parts = []
+        self.links = []
+        self._open = []
+        self._text_part = False
+
+    def start(self, tag, attrs):
+        if not self._open:
+            self.parts.append('')
+            self._text_part = False
+        if tag == 'a':
+            self.links.append([[], dict(attrs)])
+        if tag not in VOID_ELEMENTS:
+            self._open.append(tag)
+
+    def end(self, tag):
+        if tag not in self._open:
+            return
+        while self._open.pop() != tag:
+            pass
+
+    def data(self, text):
+        if self._open:
+            self.parts[-1] += text
+        elif self._text_part:
+            self.parts[-1] += text
+        else:
+            self.parts.append(text)
+            self._text_part = True
+        if 'a' in self._open:
+            self.links[-1][0].append(text)
+
+    def finish(self):
+        links = [TableLink(''.join(text), attrs.get('href'), attrs)
+                 for text, attrs in self.links]
+        return TableCell(''.join(self.parts),
+                         links[0].href if links else None, links,
+                         self.parts)
+
+
+class _Table(object):
+    """A table being parsed."""
+
+    def __init__(self, attrs):
+        self.attrs = dict(attrs)
+        self.rows = []
+        self.row = None
+        self.cell = None
+        self.section = 'tbody'
+
+    def close_cell(self):
+        if self.cell is not None and self.row is not None:
+            self.row.append(self.cell.finish())
+        self.cell = None
+
+    def close_row(self):
+        self.close_cell()
+        self.row = None
+
+
+class _TableParser(HTMLParser):
+
+    def __init__(self, headers, sections):
+        super(_TableParser, self).__init__(convert_charrefs=True)
+        self.headers = headers
+        self.sections = sections
+        self.tables = []
+        self.rows = []
+        self._open = []
+
+    def _new_row(self, table):
+        table.close_row()
+        table.row = []
+        if self.sections is None or table.section in self.sections:
+            table.rows.append(table.row)
+            self.rows.append(table.row)
+
+    def handle_starttag(self, tag, attrs):
+        table = self._open[-1] if self._open else None
+        if tag == 'table':
+            if table is not None and table.cell is not None:
+                table.cell.start(tag, attrs)
+            elif table is not None:
+                # Tables only nest within cells
+                self.handle_endtag('table')
+            table = _Table(attrs)
+            self.tables.append(table)
+            self._open.append(table)
+        elif table is None:
+            return
+        elif tag == 'tr':
+            self._new_row(table)
+        elif tag in ('td', 'th'):
+            table.close_cell()
+            if table.row is None:
+                self._new_row(table)
+            if tag == 'td' or self.headers:
+                table.cell = _Cell()
+        elif tag in SECTIONS:
+            table.close_row()
+            table.section = tag
+        elif table.cell is not None:
+            table.cell.start(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if not self._open:
+            return
+        table = self._open[-1]
+        if tag == 'table':
+            table.close_row()
+            self._open.pop()
+            if self._open and self._open[-1].cell is not None:
+                self._open[-1].cell.end(tag)
+        elif tag in ('td', 'th'):
+            table.close_cell()
+        elif tag == 'tr':
+            table.close_row()
+        elif tag in SECTIONS:
+            table.close_row()
+            table.section = 'tbody'
+        elif table.cell is not None:
+            table.cell.end(tag)
+
+    def handle_data(self, data):
+        # Text of nested tables is also text of the enclosing cells
+        for table in self._open:
+            if table.cell is not None:
+                table.cell.data(data)
+
+
+def _parse(html, headers, sections):
+    parser = _TableParser(headers, sections)
+    parser.feed(fix_html(html))
+    parser.close()
+    return parser
+
+
+def _matches(table, attrs):
+    for key, val in attrs.items():
+        if key == 'class':
+            if val not in (table.attrs.get('class') or '').split():
+                return False
+        elif table.attrs.get(key) != val:
+            return False
+    return True
+
+
+def extract_tables(html, headers=False, sections=None, attrs=None):
+    """Return the tables of `html` as lists of rows of `TableCell`s.
+
+    Tables are in the order they start in, nested tables included.  ``th``
+    cells are only kept if `headers`; rows are only kept if they belong to
+    one of `sections` (``'thead'``, ``'tbody'`` and/or ``'tfoot'``, rows
+    outside of any being in ``'tbody'``).  If `attrs` is given, only the
+    tables with those attribute values (or class) are returned.
+    """
+    tables = _parse(html, headers, sections).tables
+    return [table.rows for table in tables
+            if attrs is None or _matches(table, attrs)]
+
+
+def extract_rows(html, headers=False, sections=None):
+    """Return the rows of all tables of `html`, in document order.
+
+    Equivalent to `BeautifulSoup.findAll('tr')` followed by
+    ``findAll('td')`` on every row; see `extract_tables`.
+    """
+    return _parse(html, headers, sections).rows
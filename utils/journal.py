@@ -0,0 +1,172 @@
+"""Background writer pool used when journaling entries to disk."""
+import codecs
+import gzip
+import json
+import os
+import queue
+import subprocess
+import threading
+from collections import OrderedDict, defaultdict
+
+__all__ = ['JournalWriter', 'atomic_write']
+
+
+def atomic_write(path, data, gz=False):
+    """Write `data` (str) to `path` via a temporary file and a rename.
+
+    Readers either see the previous complete file or the new complete file,
+    never a partially written one.
+    """
+    tmp_path = '{}.tmp{}'.format(path, threading.get_ident())
+    try:
+        if gz:
+            with gzip.open(tmp_path, 'wb') as ff:
+                ff.write(data.encode('utf8'))
+        else:
+            with codecs.open(tmp_path, 'w', encoding='utf8') as ff:
+                ff.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+class JournalWriter(object):
+    """Bounded pool of threads that serialize, compress and write entries.
+
+    The main process hands over finished entries with `submit`; a worker
+    renders the JSON, optionally gzips it, and writes it atomically.  The
+    queue is bounded so that a producer outrunning the disk blocks instead of
+    accumulating entries in memory.  `flush` is the barrier that must be
+    crossed before any written file is read back (e.g. at the end of a task).
+
+    Threads are used rather than processes so that entries never need to be
+    pickled; compression and file I/O release the GIL.
+
+    Git bookkeeping for compressed files (``git rm --cached`` of the plain
+    file, ``git add -f`` of the ``.gz``) is collected by the workers and run
+    in batches from the calling thread during `flush`, so that concurrent
+    workers never contend for a repository's index lock.
+    """
+
+    def __init__(self, log, num_workers=4, max_pending=64,
+                 compress_above=None):
+        self.log = log
+        self.num_workers = max(int(num_workers), 1)
+        self.compress_above = compress_above
+        self._queue = queue.Queue(maxsize=max(int(max_pending), 1))
+        self._threads = []
+        self._lock = threading.Lock()
+        self._pending = defaultdict(int)
+        self._idle = threading.Condition(self._lock)
+        self._errors = []
+        self._gz_files = OrderedDict()
+
+    def _start(self):
+        if self._threads:
+            return
+        for ii in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._work, name='journal-writer-{}'.format(ii))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, name, entry, outdir, filename, gz=False):
+        """Queue `entry` to be written as `outdir/filename.json[.gz]`.
+
+        Blocks while `max_pending` entries are already waiting.  The caller
+        must not modify `entry` after handing it over.  A previous write of
+        the same entry is allowed to finish first so writes land in order.
+        """
+        self._start()
+        self.wait(name)
+        with self._lock:
+            self._pending[name] += 1
+        self._queue.put((name, entry, outdir, filename, gz))
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            name = item[0]
+            try:
+                self._write(*item)
+            except Exception as err:
+                with self._lock:
+                    self._errors.append((name, err))
+            finally:
+                with self._lock:
+                    self._pending[name] -= 1
+                    if not self._pending[name]:
+                        del self._pending[name]
+                    self._idle.notify_all()
+                self._queue.task_done()
+
+    def _write(self, name, entry, outdir, filename, gz):
+        if not os.path.isdir(outdir):
+            raise RuntimeError("Output directory '{}' for event '{}' does "
+                               "not exist.".format(outdir, name))
+        jsonstring = json.dumps(
+            {entry[entry._KEYS.NAME]: entry._ordered(entry)},
+            indent='\t', separators=(',', ':'), ensure_ascii=False)
+        save_name = os.path.join(outdir, filename + '.json')
+        # Size in bytes, as astrocats compares the size of the written file
+        compress = (gz and self.compress_above is not None and
+                    len(jsonstring.encode('utf-8')) > self.compress_above)
+        if compress:
+            atomic_write(save_name + '.gz', jsonstring, gz=True)
+            if os.path.exists(save_name):
+                os.remove(save_name)
+            with self._lock:
+                self._gz_files.setdefault(outdir, []).append(filename)
+            self.log.debug("Compressed '{}' to '{}'".format(
+                name, save_name + '.gz'))
+        else:
+            atomic_write(save_name, jsonstring)
+            self.log.info("Saved {} to '{}'.".format(
+                name.ljust(20), save_name))
+
+    def wait(self, name):
+        """Block until no write for entry `name` is outstanding."""
+        with self._lock:
+            while self._pending.get(name):
+                self._idle.wait()
+
+    def flush(self):
+        """Barrier: wait for every queued write, then update git indices.
+
+        Raises `RuntimeError` if any write failed since the last flush.
+        """
+        if self._threads:
+            self._queue.join()
+        with self._lock:
+            errors, self._errors = self._errors, []
+            gz_files, self._gz_files = self._gz_files, OrderedDict()
+        for outdir, filenames in gz_files.items():
+            subprocess.call(
+                ['git', 'rm', '--cached', '--quiet', '--ignore-unmatch'] +
+                [ff + '.json' for ff in filenames], cwd=outdir)
+            subprocess.call(
+                ['git', 'add', '-f'] + [ff + '.json.gz' for ff in filenames],
+                cwd=outdir)
+        if errors:
+            for name, err in errors:
+                self.log.error("Failed to write '{}': {}".format(name, err))
+            raise RuntimeError("{} entries failed to be written.".format(
+                len(errors)))
+        return
+
+    def close(self):
+        """Flush outstanding writes and stop the worker threads."""
+        try:
+            self.flush()
+        finally:
+            for thread in self._threads:
+                self._queue.put(None)
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
@@ -0,0 +1,138 @@
+"""Incremental reading of large entry JSON files.
+
+`json.load` decodes a whole file at once, so every item of the arrays of an
+entry (e.g. the photometry of thousands of model realizations) is held in
+memory before any of them can be dropped.  `read_entry_json` instead reads
+the file in chunks and decodes the arrays of the entry one item at a time,
+items rejected by a filter being discarded as soon as they are decoded.
+`iter_json_array` likewise yields the items of a file holding an array one
+at a time.
+"""
+import codecs
+import gzip
+import json
+from collections import OrderedDict
+
+__all__ = ['iter_json_array', 'read_entry_json']
+
+# Characters read from the file at a time
+READ_SIZE = 1 << 20
+WHITESPACE = ' \t\n\r'
+DELIMITERS = WHITESPACE + ',:]}'
+
+
+class _Reader(object):
+    """Buffered reader of the JSON values of a text stream."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder(object_pairs_hook=OrderedDict)
+
+    def _fill(self):
+        """Read more of the stream, dropping what was already consumed."""
+        chunk = self.stream.read(READ_SIZE)
+        if not chunk:
+            self.eof = True
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self):
+        """Return the next non-whitespace character (`''` at the end)."""
+        while True:
+            while (self.pos < len(self.buffer) and
+                   self.buffer[self.pos] in WHITESPACE):
+                self.pos += 1
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self._fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError('Expected {!r} at {!r}.'.format(
+                char, self.buffer[self.pos:self.pos + 20]))
+        self.pos += 1
+
+    def value(self):
+        """Decode the next JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if self.eof:
+                    raise
+            else:
+                # A number cut by the end of the buffer may continue in the
+                # stream: values are always followed by one of `DELIMITERS`
+                if ((end < len(self.buffer) and
+                     self.buffer[end] in DELIMITERS) or self.eof):
+                    self.pos = end
+                    return value
+            self._fill()
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return codecs.open(path, 'r', encoding='utf-8')
+
+
+def read_entry_json(path, keep=None):
+    """Read the entry file at `path` (gzipped if it ends with ``.gz``).
+
+    Returns the name of the entry and its data, an `OrderedDict`, as
+    `json.load` would.  `keep` maps keys of the entry to a function called
+    on every item of their array, which is only kept if it returns `True`.
+    """
+    keep = keep or {}
+    with _open(path) as ff:
+        reader = _Reader(ff)
+        reader.expect('{')
+        name = reader.value()
+        reader.expect(':')
+        reader.expect('{')
+        data = OrderedDict()
+        while reader.peek() != '}':
+            if data:
+                reader.expect(',')
+            key = reader.value()
+            reader.expect(':')
+            if reader.peek() != '[':
+                data[key] = reader.value()
+                continue
+            reader.expect('[')
+            items = []
+            first = True
+            while reader.peek() != ']':
+                if not first:
+                    reader.expect(',')
+                first = False
+                item = reader.value()
+                if key not in keep or keep[key](item):
+                    items.append(item)
+            reader.expect(']')
+            data[key] = items
+        reader.expect('}')
+        if reader.peek() != '}':
+            raise ValueError("'{}' holds more than one entry.".format(path))
+    return name, data
+
+
+def iter_json_array(path):
+    """Yield the items of the JSON array in the file at `path`, in order.
+
+    The file (gzipped if its name ends with ``.gz``) is read in chunks, so
+    only one item is held in memory at a time.
+    """
+    with _open(path) as ff:
+        reader = _Reader(ff)
+        reader.expect('[')
+        first = True
+        while reader.peek() != ']':
+            if not first:
+                reader.expect(',')
+            first = False
+            yield reader.value()
@@ -0,0 +1,45 @@
+"""Parsing of independent input files in a pool of processes.
+
+Import tasks that read many independent files are split into a *parse* step,
+a module-level function that turns one file into picklable data (typically
+photometry columns, see `points_to_columns`) and runs in worker processes,
+and an *apply* step that adds the parsed data to `catalog.entries` in the
+main process, in the order of the files, so that results do not depend on
+the number of workers.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+__all__ = ['parse_in_pool', 'points_to_columns']
+
+
+def parse_in_pool(catalog, parser, jobs):
+    """Yield `parser(*job)` for every tuple of arguments in `jobs`, in order.
+
+    `parser` must be a module-level function and its arguments and results
+    picklable.  Up to the task's concurrency of workers are used; with a
+    single worker (or job) the jobs are parsed in the calling process.
+    """
+    jobs = list(jobs)
+    workers = min(catalog.get_current_task_concurrency(), len(jobs))
+    if workers < 2:
+        for job in jobs:
+            yield parser(*job)
+        return
+    # Spawned rather than forked: the catalog runs journal and fetch threads
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=get_context('spawn')) as executor:
+        for result in executor.map(parser, *zip(*jobs)):
+            yield result
+
+
+def points_to_columns(points):
+    """Turn a list of photometry dicts into a dict of columns.
+
+    Keys missing from a point are `None` in its column, which
+    `add_photometry_many` leaves out of that point.
+    """
+    keys = []
+    for point in points:
+        keys.extend(key for key in point if key not in keys)
+    return {key: [point.get(key) for point in points] for key in keys}
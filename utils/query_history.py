@@ -0,0 +1,81 @@
+"""Per-object history of remote queries, with explicit expiry times."""
+import json
+import os
+import sqlite3
+import time
+
+__all__ = ['QueryHistory']
+
+
+class QueryHistory(object):
+    """Results of remote queries by object name, stored in SQLite.
+
+    Every record holds the time of the query, its time to live in seconds
+    (`None` if it never expires) and a JSON-serializable result.  Records
+    are read and written individually through the name index, so a run that
+    re-queries a few objects neither loads nor rewrites the whole history.
+    A store must only be used from the thread that opened it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        dirname = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS history (name TEXT PRIMARY KEY, '
+                'queried REAL NOT NULL, ttl REAL, result TEXT NOT NULL)')
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM history').fetchone()[0]
+
+    def __contains__(self, name):
+        return self._conn.execute('SELECT 1 FROM history WHERE name = ?',
+                                  (name,)).fetchone() is not None
+
+    def get(self, name, now=None):
+        """Return the result stored for `name`, or `None` if it expired."""
+        row = self._conn.execute(
+            'SELECT queried, ttl, result FROM history WHERE name = ?',
+            (name,)).fetchone()
+        if row is None or not self._fresh(row[0], row[1], now):
+            return None
+        return json.loads(row[2])
+
+    def stale(self, names, now=None):
+        """Return the names in `names` without an unexpired record."""
+        now = time.time() if now is None else now
+        fresh = {row[0] for row in self._conn.execute(
+            'SELECT name FROM history WHERE ttl IS NULL OR queried + ttl > ?',
+            (now,))}
+        return [name for name in names if name not in fresh]
+
+    def put(self, name, result, ttl, queried=None):
+        """Store `result` for `name`, valid for `ttl` seconds."""
+        self.put_many([(name, result, ttl, queried)])
+
+    def put_many(self, records):
+        """Store (name, result, ttl[, queried]) `records` in one transaction.
+
+        The query time defaults to now.
+        """
+        now = time.time()
+        rows = []
+        for record in records:
+            name, result, ttl = record[:3]
+            queried = record[3] if len(record) > 3 else None
+            rows.append((name, now if queried is None else queried, ttl,
+                         json.dumps(result)))
+        with self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?)', rows)
+
+    def close(self):
+        self._conn.close()
+
+    @staticmethod
+    def _fresh(queried, ttl, now=None):
+        now = time.time() if now is None else now
+        return ttl is None or queried + ttl > now
@@ -0,0 +1,110 @@
+"""Fast readers for spectrum files."""
+import io
+import re
+import warnings
+
+import numpy as np
+from astropy.io import fits
+from astropy.utils.exceptions import AstropyUserWarning
+
+__all__ = ['load_spectrum_text', 'read_fits_spectrum']
+
+# Fortran double-precision exponents, e.g. ``1.5D-15``
+FORTRAN_EXPONENT = re.compile(r'(?<=[0-9.])[dD](?=[+-]?[0-9])')
+
+
+def load_spectrum_text(fname, skip_rows=0, comments='#', text=None):
+    """Read the columns of a whitespace-separated spectrum file.
+
+    Returns a 2-D array of strings with one row per column of the file (so
+    ``wavelengths, fluxes = load_spectrum_text(path)[:2]``), values being
+    kept verbatim except for Fortran ``D`` exponents, which become ``E``.
+    Fields may be separated by any run of spaces and tabs; blank lines, the
+    first `skip_rows` lines and `comments` are ignored.  If rows have
+    different numbers of fields, all are truncated to the shortest, as
+    ``zip(*rows)`` does.  If `text` is given it is parsed instead of the
+    contents of `fname`.
+    """
+    if text is None:
+        with open(fname, 'r') as ff:
+            text = ff.read()
+    text = FORTRAN_EXPONENT.sub('E', text)
+    try:
+        with warnings.catch_warnings():
+            # Raised by NumPy for blank lines and empty files
+            warnings.simplefilter('ignore', UserWarning)
+            data = np.loadtxt(io.StringIO(text), dtype=str, comments=comments,
+                              skiprows=skip_rows, ndmin=2)
+    except ValueError:
+        # Ragged rows
+        rows = [line.split() for line in text.splitlines()[skip_rows:]]
+        rows = [row for row in rows
+                if row and not (comments and row[0].startswith(comments))]
+        ncols = min(len(row) for row in rows) if rows else 0
+        data = np.array([row[:ncols] for row in rows], dtype=str)
+    return data.T
+
+
+def _fits_wavelengths(header, num):
+    """Wavelength grid of the `num` pixels of a spectrum from its WCS keys.
+
+    The grid is linear, unless ``DC-FLAG`` is 1 (IRAF log10-linear) or
+    ``CTYPE1`` is ``WAVE-LOG`` (FITS logarithmic), and starts at reference
+    pixel ``CRPIX1``.  The CSP and external FITS readers this replaced used
+    ``CRVAL1 + CDELT1 * x`` from pixel 0 for every file, so spectra with
+    ``CRPIX1`` other than 1 or with log-spaced pixels get different (now
+    correct) wavelengths than before.
+    """
+    if 'CRVAL1' in header:
+        w0 = header['CRVAL1']
+    elif header.get('CTYPE1') == 'MULTISPE':
+        w0 = float(header['WAT2_001'].split('"')[-1].split()[3])
+    else:
+        raise ValueError('Unsupported spectrum format.')
+    wd = header['CDELT1'] if header['NAXIS'] == 1 else header['CD1_1']
+    pix = np.arange(num) + (1 - header.get('CRPIX1', 1))
+    if header.get('DC-FLAG') == 1:
+        return 10.0**(w0 + wd * pix)
+    if str(header.get('CTYPE1', '')).startswith('WAVE-LOG'):
+        return w0 * np.exp(wd * pix / w0)
+    return w0 + wd * pix
+
+
+def read_fits_spectrum(path, error_plane=-1):
+    """Read the spectrum in the primary HDU of the FITS file at `path`.
+
+    Returns a dict with the primary ``header`` (as a dict, keys containing
+    ``.`` or ``/`` removed), the ``wavelengths``, ``fluxes`` and ``errors``
+    (plane `error_plane` of 3-D data, `None` for 1-D data) arrays, and the
+    ``verify`` error message of the header, if any; `None` is returned for
+    data that is neither 1-D nor 3-D.  The data is memory mapped and copied
+    out before the file is closed, so the result can be pickled.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', AstropyUserWarning)
+        with fits.open(path, memmap=True) as hdulist:
+            hdu = hdulist[0]
+            for key in [kk for kk in hdu.header if '.' in kk or '/' in kk]:
+                del hdu.header[key]
+            verify = None
+            try:
+                hdu.verify('silentfix')
+            except Exception as err:
+                verify = str(err)
+            header = dict(hdu.header.items())
+            if not header['SIMPLE']:
+                raise ValueError('Non-simple FITS import not yet supported.')
+            if header['NAXIS'] == 1:
+                fluxes, errors = np.array(hdu.data), None
+            elif header['NAXIS'] == 3:
+                fluxes = np.array(hdu.data[0][0])
+                errors = np.array(hdu.data[error_plane][0])
+            else:
+                return None
+    return {
+        'header': header,
+        'wavelengths': _fits_wavelengths(header, len(fluxes)),
+        'fluxes': fluxes,
+        'errors': errors,
+        'verify': verify
+    }
@@ -0,0 +1,153 @@
+"""Local cache of VizieR catalogs stored as binary VOTables."""
+import codecs
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from astropy.table import Table
+from astroquery.utils import TableList
+from astroquery.vizier import Vizier
+
+from .journal import atomic_write
+
+__all__ = ['VizierCache']
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as ff:
+        for chunk in iter(lambda: ff.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class VizierCache(object):
+    """Stand-in for `astroquery.vizier.Vizier` that keeps tables on disk.
+
+    Every table returned for a catalog ID is written to `path` as a binary
+    VOTable, and `index.json` in the same folder records, per catalog ID, the
+    table names, file names and SHA-256 checksums.  `get_catalogs` serves
+    tables from disk when all files of an ID are present and match their
+    checksums, and only queries VizieR otherwise, so a warm cache works
+    fully offline.  Published VizieR tables are not expected to change, so
+    cached tables never expire; delete a file to force it to be refreshed.
+    """
+
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, path, log, columns=['**'], row_limit=-1, server=None):
+        self.path = path
+        self.log = log
+        self.columns = columns
+        self.row_limit = row_limit
+        self.server = server
+        self._lock = threading.Lock()
+        self._index = None
+
+    def _vizier(self):
+        # `Vizier` instances are not shared between threads
+        viz = Vizier(columns=self.columns)
+        viz.ROW_LIMIT = self.row_limit
+        if self.server:
+            viz.VIZIER_SERVER = self.server
+        return viz
+
+    def _load_index(self):
+        if self._index is None:
+            ipath = os.path.join(self.path, self.INDEX_FILE)
+            self._index = {}
+            if os.path.isfile(ipath):
+                with codecs.open(ipath, 'r', encoding='utf8') as ff:
+                    self._index = json.load(ff)
+        return self._index
+
+    def _save_index(self):
+        atomic_write(os.path.join(self.path, self.INDEX_FILE), json.dumps(
+            self._index, indent='\t', separators=(',', ':'), sort_keys=True))
+
+    def _load(self, catalog_id):
+        """Return the cached tables of `catalog_id`, or `None`."""
+        with self._lock:
+            tables = self._load_index().get(catalog_id)
+        if not tables:
+            return None
+        result = OrderedDict()
+        for tab in tables:
+            fpath = os.path.join(self.path, tab['file'])
+            if not os.path.isfile(fpath) or _sha256(fpath) != tab['sha256']:
+                self.log.warning("Cached VizieR table '{}' is missing or "
+                                 "corrupt.".format(tab['file']))
+                return None
+            result[tab['name']] = Table.read(fpath, format='votable')
+        return result
+
+    def _download(self, catalog_id):
+        """Query VizieR for `catalog_id` and store the result."""
+        self.log.info("Querying VizieR for '{}'.".format(catalog_id))
+        result = self._vizier().get_catalogs(catalog_id)
+        if not len(result):
+            return OrderedDict()
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path, exist_ok=True)
+        base = catalog_id.replace('/', '_').replace('+', 'p')
+        tables = []
+        stored = OrderedDict()
+        for ti, name in enumerate(result.keys()):
+            table = result[name]
+            fname = '{}.{}.vot'.format(base, ti)
+            fpath = os.path.join(self.path, fname)
+            tmp_path = fpath + '.tmp'
+            table.write(tmp_path, format='votable',
+                        tabledata_format='binary2', overwrite=True)
+            os.replace(tmp_path, fpath)
+            tables.append({'name': name, 'file': fname,
+                           'sha256': _sha256(fpath)})
+            stored[name] = table
+        with self._lock:
+            self._load_index()[catalog_id] = tables
+            self._save_index()
+        return stored
+
+    def is_cached(self, catalog_id):
+        """Whether every table of `catalog_id` is present on disk."""
+        with self._lock:
+            tables = self._load_index().get(catalog_id)
+        return bool(tables) and all(
+            os.path.isfile(os.path.join(self.path, tab['file']))
+            for tab in tables)
+
+    def get_catalogs(self, catalog):
+        """Return a `TableList` for one catalog ID or a list of IDs."""
+        catalog_ids = [catalog] if isinstance(catalog, str) else catalog
+        tables = OrderedDict()
+        for catalog_id in catalog_ids:
+            result = self._load(catalog_id)
+            if result is None:
+                result = self._download(catalog_id)
+            tables.update(result)
+        return TableList(tables)
+
+    def prefetch(self, catalog_ids, max_workers=4):
+        """Download every uncached ID in `catalog_ids` concurrently."""
+        todo = [cid for cid in OrderedDict.fromkeys(catalog_ids)
+                if not self.is_cached(cid)]
+        self.log.warning("VizieR cache: {} of {} catalogs to download.".format(
+            len(todo), len(catalog_ids)))
+        if not todo:
+            return
+
+        def _fetch(catalog_id):
+            try:
+                self._download(catalog_id)
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except Exception as err:
+                # Retried (and reported) when the table is actually used
+                self.log.warning("Prefetch of '{}' failed ('{}').".format(
+                    catalog_id, err))
+
+        with ThreadPoolExecutor(max_workers=max(int(max_workers), 1)) as ex:
+            list(ex.map(_fetch, todo))